@@ -0,0 +1,23 @@
+# app/api/admin.py
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends, Query
+from app.dependencies import verify_api_key
+from app.services import executors, retention_service
+
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.get("/retention")
+async def retention_status(authorized: bool = Depends(verify_api_key)) -> Dict[str, Any]:
+    return retention_service.stats()
+
+
+@router.post("/retention/sweep")
+async def retention_sweep(
+    dry_run: bool = Query(True, description="Only report what would be removed"),
+    authorized: bool = Depends(verify_api_key),
+) -> Dict[str, Any]:
+    # waits for a background sweep already in progress; runs off the event loop
+    return await executors.io().run(retention_service.get_sweeper().sweep, dry_run)
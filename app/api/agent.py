@@ -1,11 +1,12 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Header, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any, List
-from pathlib import Path
-import json
+from typing import Dict, Any, Optional
 
 from app.services.agent_orchestrator import SimpleAgentOrchestrator
-from app.services.storage_service import UPLOAD_DIR
+from app.services.job_events import stream_job_events
+from app.services.job_store import InvalidCursor
+from app.services.storage_service import get_uploaded_file_path
 
 router = APIRouter()
 agent = SimpleAgentOrchestrator()
@@ -19,31 +20,49 @@ class JobCreateRequest(BaseModel):
 @router.post("/agent/jobs")
 def create_job(req: JobCreateRequest) -> Dict[str, Any]:
     # validate that uploaded doc exists
-    folder = UPLOAD_DIR / req.doc_id
-    if not folder.exists():
+    if get_uploaded_file_path(req.doc_id) is None:
         raise HTTPException(status_code=404, detail="Document not found")
     job_id = agent.create_job(req.doc_id, req.goal)
     return {"job_id": job_id}
 
 
 @router.get("/agent/jobs/{job_id}")
-def get_job(job_id: str) -> Dict[str, Any]:
-    job_file = UPLOAD_DIR / "_jobs" / f"{job_id}.json"
-    if not job_file.exists():
+def get_job(job_id: str, since: int = Query(0, ge=0, description="Only return log entries with seq > since")) -> Dict[str, Any]:
+    job = agent.store.get_job(job_id, since=since)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
-    return json.loads(job_file.read_text())
+    return job
+
+
+@router.get("/agent/jobs/{job_id}/events")
+async def job_events(
+    job_id: str,
+    request: Request,
+    since: int = Query(0, ge=0),
+    last_event_id: Optional[str] = Header(None),
+) -> StreamingResponse:
+    # SSE stream of status changes and log lines; reconnects resume via Last-Event-ID
+    if agent.store.get_status(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if last_event_id and last_event_id.isdigit():
+        since = max(since, int(last_event_id))
+    return StreamingResponse(
+        stream_job_events(agent.store, job_id, since=since, is_disconnected=request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/agent/jobs")
-def list_jobs() -> List[Dict[str, Any]]:
-    jobs = []
-    folder = UPLOAD_DIR / "_jobs"
-    if not folder.exists():
-        return jobs
-    for f in folder.iterdir():
-        if f.suffix.lower() == ".json":
-            try:
-                jobs.append(json.loads(f.read_text()))
-            except Exception:
-                continue
-    return jobs
+def list_jobs(
+    status: Optional[str] = None,
+    doc_id: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    # newest first; pass `next_cursor` back as `cursor` for the following page
+    try:
+        jobs, next_cursor = agent.store.list_jobs(status=status, doc_id=doc_id, limit=limit, cursor=cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"jobs": jobs, "next_cursor": next_cursor}
@@ -1,24 +1,133 @@
 ﻿# app/api/fix.py
-from fastapi import APIRouter, HTTPException, Depends
+import asyncio
+import logging
+import time
+from pathlib import Path
+from typing import AsyncIterator, Literal
+
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from app.config import REQUEST_TIMEOUT_SECONDS, MISTRAL_API_KEY
 from app.dependencies import verify_api_key
-from app.services.storage_service import get_uploaded_file_path, save_fixed_doc
-from app.services.extraction_service import extract_text
-from app.services.rewrite_service import rewrite_text
+from app.services import executors, tracing
+from app.services.job_events import format_sse
+from app.services.autofix_service import autofix_pages
+from app.services.compliance_service import check_pages
+from app.services.storage_service import FixedDocWriter, get_uploaded_file_path, save_fixed_doc
+from app.services.extraction_service import iter_pages
+from app.services.rewrite_service import (
+    arewrite_pages,
+    arewrite_targeted,
+    astream_rewrite_pages,
+    astream_rewrite_targeted,
+    record_stream,
+)
+
+_LOGGER = logging.getLogger(__name__)
 
 
 router = APIRouter(prefix="/fix", tags=["fix"])
 
 @router.post("/{doc_id}")
-async def fix(doc_id: str, authorized: bool = Depends(verify_api_key)):
-    path = get_uploaded_file_path(doc_id)
+async def fix(
+    doc_id: str,
+    request: Request,
+    stream: bool = Query(False, description="Stream corrected paragraphs as Server-Sent Events"),
+    mode: Literal["full", "targeted", "fast"] = Query(
+        "full",
+        description="`targeted` only rewrites paragraphs with LanguageTool issues; `fast` applies LanguageTool suggestions locally",
+    ),
+    escalate: bool = Query(False, description="mode=fast: send issues without a usable suggestion to Mistral"),
+    authorized: bool = Depends(verify_api_key),
+):
+    # a manifest miss reads (or rebuilds) it from disk: off the event loop
+    path = await executors.io().run(get_uploaded_file_path, doc_id)
     if not path:
         raise HTTPException(404, "Document not found")
 
-    text = extract_text(path)
-    corrected = rewrite_text(text)
-    out_path = save_fixed_doc(doc_id, corrected)
+    if stream:
+        return StreamingResponse(
+            _stream_fix(doc_id, path, mode, escalate),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    # rewriting starts on the first pages while later ones are still being extracted;
+    # building the DOCX is CPU work and goes to the process pool
+    scope = executors.RequestScope(REQUEST_TIMEOUT_SECONDS, request.is_disconnected)
+    if mode == "fast":
+        corrected, unresolved = await scope.run(executors.io().run(autofix_pages, scope.guard(iter_pages(path))))
+        if escalate and unresolved and MISTRAL_API_KEY:
+            corrected = await scope.run(arewrite_targeted(corrected, unresolved))
+    elif mode == "targeted":
+        text, issues = await scope.run(executors.io().run(check_pages, scope.guard(iter_pages(path))))
+        corrected = await scope.run(arewrite_targeted(text, issues))
+    else:
+        corrected = await scope.run(arewrite_pages(scope.guard(iter_pages(path))))
+    with tracing.stage("save"):
+        out_path = await scope.run(executors.cpu().run(save_fixed_doc, doc_id, corrected))
 
     return {
         "doc_id": doc_id,
         "fixed_filename": out_path.name
     }
+
+
+async def _targeted_lines(scope: executors.RequestScope, path: Path) -> AsyncIterator[str]:
+    text, issues = await executors.io().run(check_pages, scope.guard(iter_pages(path)))
+    async for line in astream_rewrite_targeted(text, issues):
+        yield line
+
+
+async def _fast_lines(scope: executors.RequestScope, path: Path, escalate: bool) -> AsyncIterator[str]:
+    fixed, unresolved = await executors.io().run(autofix_pages, scope.guard(iter_pages(path)))
+    if escalate and unresolved and MISTRAL_API_KEY:
+        async for line in astream_rewrite_targeted(fixed, unresolved):
+            yield line
+    elif fixed.strip():
+        for line in fixed.split("\n"):
+            yield line
+
+
+async def _stream_fix(doc_id: str, path: Path, mode: str = "full", escalate: bool = False) -> AsyncIterator[str]:
+    # `paragraph` events as lines complete (each one is appended to the DOCX), then `done` or `error`
+    scope = executors.RequestScope(REQUEST_TIMEOUT_SECONDS)
+    writer = FixedDocWriter(doc_id)
+    started = time.monotonic()
+    first_paragraph = None
+    if mode == "fast":
+        lines = _fast_lines(scope, path, escalate)
+    elif mode == "targeted":
+        lines = _targeted_lines(scope, path)
+    else:
+        lines = astream_rewrite_pages(scope.guard(iter_pages(path)))
+    try:
+        while True:
+            try:
+                line = await asyncio.wait_for(lines.__anext__(), timeout=max(0.0, scope.deadline - time.monotonic()))
+            except StopAsyncIteration:
+                break
+            if first_paragraph is None:
+                first_paragraph = time.monotonic() - started
+            writer.append(line)
+            yield format_sse({"index": writer.paragraphs - 1, "text": line}, event="paragraph")
+
+        with tracing.stage("save"):
+            out_path = await executors.io().run(writer.save)
+        total = time.monotonic() - started
+        record_stream(first_paragraph, total)
+        yield format_sse({
+            "doc_id": doc_id,
+            "fixed_filename": out_path.name,
+            "paragraphs": writer.paragraphs,
+            "time_to_first_paragraph_ms": round(first_paragraph * 1000) if first_paragraph is not None else None,
+            "total_ms": round(total * 1000),
+        }, event="done")
+    except asyncio.TimeoutError:
+        yield format_sse({"status_code": 504, "detail": "Processing deadline exceeded"}, event="error")
+    except Exception as e:
+        _LOGGER.exception("Streaming fix failed for %s", doc_id)
+        yield format_sse({"status_code": 500, "detail": str(e)}, event="error")
+    finally:
+        scope.cancelled.set()
+        await lines.aclose()
@@ -1,5 +1,7 @@
 ﻿# app/api/health.py
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.services import autofix_service, compliance_service, executors, extraction_service, job_store, llm_cache, mistral_client, retention_service, rewrite_service, storage_service
 
 
 router = APIRouter(prefix="/health", tags=["health"])
@@ -8,3 +10,45 @@ router = APIRouter(prefix="/health", tags=["health"])
 @router.get("/")
 async def health():
     return {"status": "ok"}
+
+
+@router.get("/ready")
+async def ready():
+    # liveness stays on /health/; this flips to 200 once the local analyzers are warm.
+    # It stays 503 while local servers are down, even if the public API fallback is serving checks.
+    pool = compliance_service.pool_stats()
+    is_ready = pool is not None and pool["backend"] == "local" and pool["healthy"] > 0
+    if is_ready:
+        status = "ready"
+    elif pool is not None and pool["error"]:
+        status = "unavailable"
+    else:
+        status = "warming"
+    body = {"status": status, "languagetool": pool}
+    return JSONResponse(body, status_code=200 if is_ready else 503)
+
+
+@router.get("/stats")
+async def stats():
+    return collect_stats()
+
+
+def collect_stats() -> dict:
+    llm = llm_cache.get_cache()
+    scheduler = mistral_client.get_client().scheduler
+    return {
+        "caches": {
+            "extraction": extraction_service.cache_stats(),
+            "paragraph_issues": compliance_service.cache_stats(),
+            "llm_responses": llm.stats() if llm else None,
+            "manifests": storage_service.manifest_cache_stats(),
+        },
+        "mistral_scheduler": scheduler.stats() if scheduler else None,
+        "languagetool": compliance_service.pool_stats(),
+        "executors": executors.stats(),
+        "fix_stream": rewrite_service.stream_stats(),
+        "fix_targeted": rewrite_service.targeted_stats(),
+        "fix_fast": autofix_service.stats(),
+        "agent_queue": job_store.get_store().stats(),
+        "retention": retention_service.stats(),
+    }
@@ -0,0 +1,14 @@
+# app/api/metrics.py
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.api.health import collect_stats
+from app.services import tracing
+
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # stage/Mistral histograms and counters, plus every numeric /health/stats value as a counter or gauge
+    return PlainTextResponse(tracing.render(collect_stats()), media_type="text/plain; version=0.0.4")
@@ -1,20 +1,44 @@
 ﻿# app/api/report.py
-from fastapi import APIRouter, HTTPException, Depends
+from typing import Awaitable, Callable, Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
+from app.config import REQUEST_TIMEOUT_SECONDS, BATCH_CONCURRENCY, BATCH_MAX_ITEMS
 from app.dependencies import verify_api_key
-from app.services.extraction_service import extract_text
-from app.services.compliance_service import analyze_text
+from app.models.report_models import BatchReportRequest
+from app.services import executors
+from app.services.batch_service import stream_ndjson
+from app.services.extraction_service import iter_pages
+from app.services.compliance_service import analyze_pages
 from app.services.storage_service import get_uploaded_file_path
 
 
 router = APIRouter(prefix="/report", tags=["report"])
 
 
-@router.get("/{doc_id}")
-async def report(doc_id: str, authorized: bool = Depends(verify_api_key)):
-    path = get_uploaded_file_path(doc_id)
+async def build_report(doc_id: str, is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None) -> dict:
+    # a manifest miss reads (or rebuilds) it from disk: off the event loop
+    path = await executors.io().run(get_uploaded_file_path, doc_id)
     if not path:
         raise HTTPException(404, "Document not found")
 
-    text = extract_text(path)
-    report = analyze_text(text, doc_id=doc_id)
-    return report
\ No newline at end of file
+    # blocking LanguageTool/Mistral work runs on the I/O pool (PDF pages are parsed on the
+    # CPU pool underneath); pages are checked as they come out of extraction
+    scope = executors.RequestScope(REQUEST_TIMEOUT_SECONDS, is_disconnected)
+    return await scope.run(executors.io().run(analyze_pages, scope.guard(iter_pages(path)), doc_id=doc_id))
+
+
+@router.post("/batch")
+async def report_batch(req: BatchReportRequest, authorized: bool = Depends(verify_api_key)):
+    # one NDJSON line per document, in completion order; `index` points back into doc_ids
+    if len(req.doc_ids) > BATCH_MAX_ITEMS:
+        raise HTTPException(400, f"At most {BATCH_MAX_ITEMS} documents per batch")
+    return StreamingResponse(
+        stream_ndjson(req.doc_ids, build_report, BATCH_CONCURRENCY, describe=lambda doc_id: {"doc_id": doc_id}),
+        media_type="application/x-ndjson",
+    )
+
+
+@router.get("/{doc_id}")
+async def report(doc_id: str, request: Request, authorized: bool = Depends(verify_api_key)):
+    return await build_report(doc_id, request.is_disconnected)
@@ -1,8 +1,12 @@
 ﻿# app/api/upload.py
 from fastapi import APIRouter, File, UploadFile, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from typing import List
 import logging
 
+from app.config import BATCH_CONCURRENCY, BATCH_MAX_ITEMS
 from app.dependencies import verify_api_key
+from app.services.batch_service import stream_ndjson
 from app.services.storage_service import save_upload_file
 from app.models.upload_models import UploadResponse
 
@@ -19,7 +23,7 @@ async def upload(
 ):
     try:
         _LOGGER.debug("Received upload request: filename=%s, content_type=%s", file.filename, file.content_type)
-        saved = save_upload_file(file)
+        saved = await save_upload_file(file)
     except HTTPException as e:
         _LOGGER.warning("Upload failed: %s", e.detail)
         # Re-raise to preserve status code and detail
@@ -28,4 +32,23 @@ async def upload(
         _LOGGER.exception("Unexpected error during upload")
         raise HTTPException(status_code=500, detail=str(e))
 
-    return UploadResponse(doc_id=saved["doc_id"], filename=saved["filename"])
\ No newline at end of file
+    return UploadResponse(doc_id=saved["doc_id"], filename=saved["filename"], sha256=saved.get("sha256"))
+
+
+@router.post("/batch")
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    authorized: bool = Depends(verify_api_key)
+):
+    # one NDJSON line per file as soon as it is stored; `index` is the file's position in the form
+    if len(files) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_ITEMS} files per batch")
+
+    async def store(file: UploadFile) -> dict:
+        saved = await save_upload_file(file)
+        return {"doc_id": saved["doc_id"], "sha256": saved.get("sha256")}
+
+    return StreamingResponse(
+        stream_ndjson(files, store, BATCH_CONCURRENCY, describe=lambda f: {"filename": f.filename}),
+        media_type="application/x-ndjson",
+    )
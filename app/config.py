@@ -7,9 +7,105 @@ BASE_DIR = Path(os.environ.get("BASE_DIR", "."))
 UPLOAD_DIR = Path(os.environ.get("UPLOAD_DIR", str(BASE_DIR / "static")))
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 MAX_FILE_SIZE = int(os.environ.get("MAX_FILE_SIZE_BYTES", 20 * 1024 * 1024))
+# Request bodies of non-upload endpoints (JSON); uploads are bounded by MAX_FILE_SIZE
+MAX_REQUEST_BODY_BYTES = int(os.environ.get("MAX_REQUEST_BODY_BYTES", 1024 * 1024))
+# Per-document manifests kept in memory (entries); old upload folders get one at startup
+MANIFEST_CACHE_ITEMS = int(os.environ.get("MANIFEST_CACHE_ITEMS", 10000))
+MANIFEST_BACKFILL = os.environ.get("MANIFEST_BACKFILL", "1") != "0"
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 64 * 1024))
 MISTRAL_API_KEY = os.environ.get("MISTRAL_API_KEY") or os.environ.get("OPENAI_API_KEY")
 MISTRAL_BASE_URL = os.environ.get("MISTRAL_BASE_URL", "https://api.mistral.ai")
 LANGUAGE_TOOL_LANG = os.environ.get("LANGUAGE_TOOL_LANG", "en-US")
+# LanguageTool backends (one local JVM server each) checking paragraphs in parallel
+LANGUAGE_TOOL_POOL_SIZE = int(os.environ.get("LANGUAGE_TOOL_POOL_SIZE", 2))
+# Start the pool in the background at startup instead of on the first report
+LANGUAGE_TOOL_WARMUP = os.environ.get("LANGUAGE_TOOL_WARMUP", "1") != "0"
+# Seconds between attempts to start the local servers after a failure (e.g. no Java)
+LANGUAGE_TOOL_RETRY_SECONDS = float(os.environ.get("LANGUAGE_TOOL_RETRY_SECONDS", 60))
+# Opt-in: while local servers are down, send paragraphs to the public languagetool.org API.
+# Off by default because it ships document text off-host.
+LANGUAGE_TOOL_PUBLIC_API_FALLBACK = os.environ.get("LANGUAGE_TOOL_PUBLIC_API_FALLBACK", "0") == "1"
+# Per-paragraph LanguageTool results kept for incremental re-analysis (LRU, entries)
+ANALYSIS_CACHE_MAX_PARAGRAPHS = int(os.environ.get("ANALYSIS_CACHE_MAX_PARAGRAPHS", 50000))
+
+# Mistral HTTP client: one pooled AsyncClient per process
+MISTRAL_TIMEOUT = float(os.environ.get("MISTRAL_TIMEOUT", 30.0))
+MISTRAL_MAX_CONNECTIONS = int(os.environ.get("MISTRAL_MAX_CONNECTIONS", 20))
+MISTRAL_MAX_KEEPALIVE = int(os.environ.get("MISTRAL_MAX_KEEPALIVE", 10))
+MISTRAL_KEEPALIVE_EXPIRY = float(os.environ.get("MISTRAL_KEEPALIVE_EXPIRY", 30.0))
+MISTRAL_HTTP2 = os.environ.get("MISTRAL_HTTP2", "1") != "0"
+MISTRAL_MAX_ATTEMPTS = int(os.environ.get("MISTRAL_MAX_ATTEMPTS", 5))
+MISTRAL_BACKOFF_BASE = float(os.environ.get("MISTRAL_BACKOFF_BASE", 1.0))
+# Process-wide request rate towards Mistral (free tier is ~30 req/min); 0 disables throttling
+MISTRAL_RATE_PER_MINUTE = float(os.environ.get("MISTRAL_RATE_PER_MINUTE", 30))
+MISTRAL_BURST = int(os.environ.get("MISTRAL_BURST", 5))
+
+# Response cache for deterministic (temperature 0) Mistral calls
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "1") != "0"
+LLM_CACHE_PATH = Path(os.environ.get("LLM_CACHE_PATH", str(UPLOAD_DIR / "_cache" / "llm_responses.sqlite3")))
+LLM_CACHE_MEMORY_ITEMS = int(os.environ.get("LLM_CACHE_MEMORY_ITEMS", 512))
+LLM_CACHE_MAX_ROWS = int(os.environ.get("LLM_CACHE_MAX_ROWS", 20000))
+LLM_CACHE_TTL_SECONDS = float(os.environ.get("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+
+# Chunked rewriting of long documents
+REWRITE_CHUNK_TOKENS = int(os.environ.get("REWRITE_CHUNK_TOKENS", 1500))
+REWRITE_CONCURRENCY = int(os.environ.get("REWRITE_CONCURRENCY", 4))
+REWRITE_OVERLAP_CHARS = int(os.environ.get("REWRITE_OVERLAP_CHARS", 400))
+REWRITE_CHUNK_ATTEMPTS = int(os.environ.get("REWRITE_CHUNK_ATTEMPTS", 3))
+# mode=fast: LanguageTool issue types whose suggestion is applied without review
+AUTOFIX_RULE_TYPES = {t.strip() for t in os.environ.get("AUTOFIX_RULE_TYPES", "misspelling,grammar").split(",") if t.strip()}
+# mode=targeted: read-only text shown on each side of a flagged paragraph
+REWRITE_TARGET_CONTEXT_CHARS = int(os.environ.get("REWRITE_TARGET_CONTEXT_CHARS", 300))
+
+# Extraction cache: in-memory LRU bound (characters of text) and on-disk tier toggle
+EXTRACT_CACHE_MAX_BYTES = int(os.environ.get("EXTRACT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+EXTRACT_CACHE_DISK = os.environ.get("EXTRACT_CACHE_DISK", "1") != "0"
+# PDF extraction: pages parsed per process-pool task
+EXTRACT_PAGES_PER_TASK = int(os.environ.get("EXTRACT_PAGES_PER_TASK", 8))
+# Stage pools: processes for CPU-bound work (PDF parsing, OCR, DOCX build), threads for blocking I/O
+CPU_WORKERS = int(os.environ.get("CPU_WORKERS", os.environ.get("EXTRACT_WORKERS", min(4, os.cpu_count() or 1))))
+IO_WORKERS = int(os.environ.get("IO_WORKERS", 8))
+# Per-request processing deadline for /report and /fix, and client-disconnect polling
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("REQUEST_TIMEOUT_SECONDS", 300))
+DISCONNECT_POLL_SECONDS = float(os.environ.get("DISCONNECT_POLL_SECONDS", 0.5))
+# Batch endpoints: documents processed concurrently and max documents per request
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", 4))
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 500))
+# Per-page OCR for scanned pages and unusable text layers
+OCR_ENABLED = os.environ.get("OCR_ENABLED", "1") != "0"
+OCR_DPI = int(os.environ.get("OCR_DPI", 200))
+OCR_LANG = os.environ.get("OCR_LANG", "eng")
+OCR_MIN_CHARS = int(os.environ.get("OCR_MIN_CHARS", 20))
+OCR_MIN_QUALITY = float(os.environ.get("OCR_MIN_QUALITY", 0.6))
+OCR_CACHE_DIR = Path(os.environ.get("OCR_CACHE_DIR", str(UPLOAD_DIR / "_cache" / "ocr")))
+
+
+# Agent job workers: threads per process, lease length and retry budget
+AGENT_WORKERS = int(os.environ.get("AGENT_WORKERS", 2))
+AGENT_LEASE_SECONDS = float(os.environ.get("AGENT_LEASE_SECONDS", 60))
+AGENT_MAX_ATTEMPTS = int(os.environ.get("AGENT_MAX_ATTEMPTS", 3))
+AGENT_POLL_INTERVAL = float(os.environ.get("AGENT_POLL_INTERVAL", 1.0))
+# Reuse planner output for the same (normalized) goal on the same document content
+AGENT_PLAN_CACHE = os.environ.get("AGENT_PLAN_CACHE", "1") != "0"
+# Job event streams: keep-alive comment interval and cross-process poll fallback
+JOB_EVENTS_HEARTBEAT_SECONDS = float(os.environ.get("JOB_EVENTS_HEARTBEAT_SECONDS", 15.0))
+JOB_EVENTS_POLL_SECONDS = float(os.environ.get("JOB_EVENTS_POLL_SECONDS", 2.0))
+
+# Retention sweeper: TTLs per artefact (seconds, 0 keeps forever) and a disk quota
+# (bytes, 0 = unlimited) enforced by evicting the least recently accessed documents
+RETENTION_ENABLED = os.environ.get("RETENTION_ENABLED", "1") != "0"
+RETENTION_INTERVAL_SECONDS = float(os.environ.get("RETENTION_INTERVAL_SECONDS", 3600))
+RETENTION_DOCUMENT_TTL_SECONDS = float(os.environ.get("RETENTION_DOCUMENT_TTL_SECONDS", 30 * 24 * 3600))
+RETENTION_FIXED_TTL_SECONDS = float(os.environ.get("RETENTION_FIXED_TTL_SECONDS", 7 * 24 * 3600))
+RETENTION_JOB_TTL_SECONDS = float(os.environ.get("RETENTION_JOB_TTL_SECONDS", 30 * 24 * 3600))
+RETENTION_CACHE_TTL_SECONDS = float(os.environ.get("RETENTION_CACHE_TTL_SECONDS", 30 * 24 * 3600))
+RETENTION_MAX_BYTES = int(os.environ.get("RETENTION_MAX_BYTES", 0))
+# Work is done in batches of this many entries with a pause in between
+RETENTION_BATCH_SIZE = int(os.environ.get("RETENTION_BATCH_SIZE", 200))
+RETENTION_BATCH_PAUSE_SECONDS = float(os.environ.get("RETENTION_BATCH_PAUSE_SECONDS", 0.05))
+
+# Add a Server-Timing header (per-stage durations) to every response
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") != "0"
 
 
 # Allowed extensions
@@ -2,11 +2,53 @@
 from dotenv import load_dotenv
 load_dotenv()  # Load environment variables from .env file
 
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from app.api import upload_router, report_router, fix_router, download_router, health_router
 from fastapi.middleware.cors import CORSMiddleware
+from app.config import (
+    BATCH_MAX_ITEMS,
+    LANGUAGE_TOOL_WARMUP,
+    MANIFEST_BACKFILL,
+    MAX_FILE_SIZE,
+    MAX_REQUEST_BODY_BYTES,
+    RETENTION_ENABLED,
+    SERVER_TIMING,
+)
+from app.services import compliance_service, executors, mistral_client, retention_service, storage_service, tracing
+from app.api.agent import agent
+from app.utils.body_limit import BodySizeLimitMiddleware
+
+# multipart framing around each uploaded file (boundary, part headers)
+_FORM_OVERHEAD = 64 * 1024
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # the pooled Mistral client lives for the application lifetime
+    mistral_client.get_client().start()
+    # agent workers claim queued jobs (and re-queue expired leases) from the durable queue
+    agent.start()
+    # LanguageTool servers take seconds to boot; /health/ready reports when they are up
+    if LANGUAGE_TOOL_WARMUP:
+        compliance_service.start_warm_up()
+    # folders uploaded before manifests existed get one in the background
+    if MANIFEST_BACKFILL:
+        storage_service.start_backfill()
+    # expired documents, jobs and caches are removed in the background
+    if RETENTION_ENABLED:
+        retention_service.get_sweeper().start()
+    yield
+    retention_service.get_sweeper().stop()
+    agent.stop()
+    compliance_service.close_pool()
+    mistral_client.close_client()
+    executors.shutdown()
 
-app = FastAPI(title="DocCompliance API")
+
+app = FastAPI(title="DocCompliance API", lifespan=lifespan)
 
 # CORS — tune origins in production
 app.add_middleware(
@@ -17,12 +59,50 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+def _body_limit(path: str) -> int:
+    if path.startswith("/upload/batch"):
+        return BATCH_MAX_ITEMS * (MAX_FILE_SIZE + _FORM_OVERHEAD)
+    if path.startswith("/upload"):
+        return MAX_FILE_SIZE + _FORM_OVERHEAD
+    return MAX_REQUEST_BODY_BYTES
+
+
+# oversized bodies get 413 before Starlette spools them to memory or disk
+app.add_middleware(BodySizeLimitMiddleware, limit_for=_body_limit)
+
+
+@app.exception_handler(compliance_service.LanguageToolUnavailable)
+async def languagetool_unavailable(request: Request, exc: compliance_service.LanguageToolUnavailable):
+    # no silent fallback to the public API: say the analyzer is down
+    return JSONResponse({"detail": str(exc)}, status_code=503)
+
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    # stages run for this request add their durations to `timings` (see app.services.tracing)
+    with tracing.collect() as timings:
+        t0 = time.perf_counter()
+        response = await call_next(request)
+        elapsed = time.perf_counter() - t0
+    route = request.scope.get("route")
+    tracing.HTTP_REQUEST_SECONDS.observe(
+        elapsed, method=request.method, route=getattr(route, "path", "unmatched"), status=response.status_code
+    )
+    if SERVER_TIMING:
+        # streamed responses only carry the stages finished before the first byte
+        timings["total"] = elapsed
+        response.headers["Server-Timing"] = tracing.server_timing(timings)
+    return response
+
 # include routers
 from app.api.upload import router as _upload
 from app.api.report import router as _report
 from app.api.fix import router as _fix
 from app.api.download import router as _download
 from app.api.health import router as _health
+from app.api.metrics import router as _metrics
+from app.api.admin import router as _admin
 from app.api.agent import router as _agent
 
 app.include_router(_upload)
@@ -30,6 +110,8 @@ app.include_router(_report)
 app.include_router(_fix)
 app.include_router(_download)
 app.include_router(_health)
+app.include_router(_metrics)
+app.include_router(_admin)
 app.include_router(_agent)
 
 
@@ -10,6 +10,8 @@ class ComplianceIssue(BaseModel):
     suggestion: Optional[str]
     offset_start: Optional[int]
     offset_end: Optional[int]
+    suggestion_count: int = 0
+    rule_type: Optional[str] = None  # LanguageTool issue type, e.g. "misspelling", "grammar", "style"
 
 class ComplianceReport(BaseModel):
     doc_id: Optional[str]
@@ -17,3 +19,5 @@ class ComplianceReport(BaseModel):
     summary: str
     issues: List[ComplianceIssue]
 
+class BatchReportRequest(BaseModel):
+    doc_ids: List[str]
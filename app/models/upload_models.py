@@ -1,7 +1,9 @@
 ﻿# app/models/upload_models.py
 from pydantic import BaseModel
+from typing import Optional
 
 class UploadResponse(BaseModel):
     doc_id: str
     filename: str
+    sha256: Optional[str] = None
 
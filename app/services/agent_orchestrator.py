@@ -1,73 +1,278 @@
+import contextvars
+import hashlib
+import re
 import uuid
-import json
+import logging
+import os
+import socket
 import threading
-import time
-from typing import Dict, Any
-from pathlib import Path
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Any, List, NamedTuple, Optional, Tuple
 
+from app.services import tracing
+from app.services.compliance_service import check_text
 from app.services.extraction_service import extract_text
-from app.services.rewrite_service import rewrite_text
-from app.services.storage_service import save_fixed_doc, UPLOAD_DIR
+from app.services.mistral_client import generate_text
+from app.services.rewrite_service import rewrite_text, DEFAULT_INSTRUCTIONS
+from app.services.mistral_scheduler import BACKGROUND
+from app.services.job_store import JobStore, get_store
+from app.services.storage_service import get_manifest, get_uploaded_file_path, save_fixed_doc
+from app.config import AGENT_WORKERS, AGENT_POLL_INTERVAL, AGENT_PLAN_CACHE
 
-JOBS_DIR = UPLOAD_DIR / "_jobs"
-JOBS_DIR.mkdir(parents=True, exist_ok=True)
+_LOGGER = logging.getLogger(__name__)
 
+# flagged problems passed on to the correction step, and how much of the plan
+_MAX_FLAGGED = 15
+_MAX_PLAN_CHARS = 1500
 
-def _persist(job_id: str, data: Dict[str, Any]):
-    (JOBS_DIR / f"{job_id}.json").write_text(json.dumps(data, indent=2))
+
+class Step(NamedTuple):
+    name: str
+    deps: Tuple[str, ...]
+    # called with the job and the results of `deps`; the result must be JSON-serializable
+    run: Callable[[Dict[str, Any], Dict[str, Any]], Any]
+
+
+def run_graph(
+    steps: List[Step],
+    results: Dict[str, Any],
+    on_done: Callable[[str, Any], None],
+    job: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Run the steps missing from ``results``, each as soon as its dependencies are done.
+
+    Independent steps run concurrently on their own threads (with the caller's
+    context, so tracing stages are attributed to the job). ``on_done`` sees
+    every result as it completes. If a step fails, steps already running are
+    allowed to finish (and reported to ``on_done``) before the error is raised.
+    """
+    pending = {s.name: s for s in steps if s.name not in results}
+    running = {}
+    error: Optional[BaseException] = None
+    with ThreadPoolExecutor(max_workers=max(1, len(pending)), thread_name_prefix=f"agent-step-{job['id'][:8]}") as pool:
+        while pending or running:
+            if error is None:
+                for name, step in list(pending.items()):
+                    if all(d in results for d in step.deps):
+                        ctx = contextvars.copy_context()
+                        running[pool.submit(ctx.run, step.run, job, {d: results[d] for d in step.deps})] = name
+                        del pending[name]
+                if not running:
+                    raise RuntimeError(f"Steps with unmet dependencies: {', '.join(sorted(pending))}")
+            elif not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except BaseException as e:
+                    error = error or e
+                    continue
+                on_done(name, results[name])
+    if error is not None:
+        raise error
+    return results
+
+
+def normalize_goal(goal: str) -> str:
+    return re.sub(r"\s+", " ", goal).strip(" .!?").casefold()
+
+
+def plan_key(goal: str, fingerprint: str) -> str:
+    return hashlib.sha256(f"{normalize_goal(goal)}\0{fingerprint}".encode("utf-8")).hexdigest()
 
 
 class SimpleAgentOrchestrator:
-    """A minimal orchestrator that runs simple agent jobs in background threads.
+    """A minimal orchestrator that runs simple agent jobs on a bounded worker pool.
 
-    This is intentionally small and synchronous per-step; it provides a job
-    lifecycle and logs so clients can poll progress. Use as a starting point
-    for a more robust queue/worker solution.
+    Jobs are queued durably in SQLite (see `JobStore`) and claimed under a
+    lease by `workers` threads per process, so several uvicorn workers share
+    the load and jobs interrupted by a restart are picked up again. A job is a
+    small graph of steps (`steps`): LanguageTool analysis runs alongside
+    planning, and each step's result is stored so a retried job resumes after
+    its last completed step. Plans are cached per goal and document content.
     """
 
-    def __init__(self, model: str = "open-mistral-7b"):
+    def __init__(self, model: str = "open-mistral-7b", workers: int = AGENT_WORKERS, store: Optional[JobStore] = None):
         self.model = model
+        self.workers = workers
+        self._store = store
+        self._owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._threads: List[threading.Thread] = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def store(self) -> JobStore:
+        if self._store is None:
+            self._store = get_store()
+        return self._store
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            # leases left behind by a crashed or restarted process go back in the queue
+            requeued = self.store.requeue_expired()
+            if requeued:
+                _LOGGER.info("Re-queued %d agent jobs with expired leases", requeued)
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker_loop, name=f"agent-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            self._stop.set()
+            self._wake.set()
+            for t in self._threads:
+                t.join(timeout=timeout)
+            self._threads = []
 
     def create_job(self, doc_id: str, goal: str) -> str:
         job_id = str(uuid.uuid4())
-        job = {"id": job_id, "doc_id": doc_id, "goal": goal, "status": "queued", "logs": []}
-        _persist(job_id, job)
-        threading.Thread(target=self._run_job, args=(job_id,), daemon=True).start()
+        self.store.enqueue(job_id, doc_id, goal)
+        self.start()
+        self._wake.set()
         return job_id
 
-    def _append_log(self, job: Dict[str, Any], msg: str):
-        job.setdefault("logs", []).append({"ts": time.time(), "msg": msg})
-        _persist(job["id"], job)
-
-    def _run_job(self, job_id: str):
-        job_file = JOBS_DIR / f"{job_id}.json"
-        job = json.loads(job_file.read_text())
-        job["status"] = "running"
-        _persist(job_id, job)
+    def _worker_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.store.requeue_expired()
+                claimed = self.store.claim(self._owner)
+            except Exception:
+                _LOGGER.exception("Agent worker failed to poll the job queue")
+                claimed = None
+            if claimed is None:
+                self._wake.wait(AGENT_POLL_INTERVAL)
+                self._wake.clear()
+                continue
+            self._run_claimed(claimed)
+
+    def _run_claimed(self, claimed: Dict[str, Any]) -> None:
+        job_id = claimed["id"]
+        done = threading.Event()
+
+        def _heartbeat():
+            while not done.wait(self.store.lease_seconds / 3):
+                if not self.store.heartbeat(job_id, self._owner):
+                    _LOGGER.warning("Lost lease on agent job %s", job_id)
+                    return
+
+        hb = threading.Thread(target=_heartbeat, name=f"agent-heartbeat-{job_id[:8]}", daemon=True)
+        hb.start()
         try:
-            self._append_log(job, "Extracting text from document")
-            text = extract_text(UPLOAD_DIR / job["doc_id"] / "") if False else None
-            # fallback: try to locate uploaded file and extract text
-            from app.services.storage_service import get_uploaded_file_path
+            status = self._run_job(job_id)
+        finally:
+            done.set()
+            hb.join()
+        if status == "failed" and claimed["attempts"] < self.store.max_attempts:
+            self._append_log(claimed, f"Retrying (attempt {claimed['attempts'] + 1} of {self.store.max_attempts})")
+            self.store.release(job_id, self._owner)
+            self._wake.set()
+            return
+        self.store.finish(job_id, self._owner, status)
 
-            path = get_uploaded_file_path(job["doc_id"])
-            if not path:
-                raise RuntimeError("Uploaded file not found")
-            text = extract_text(path)
+    def _append_log(self, job: Dict[str, Any], msg: str):
+        self.store.append_log(job["id"], msg)
 
-            self._append_log(job, "Requesting plan from model")
-            planner_prompt = f"Goal: {job['goal']}\nDocument excerpt:\n{text[:2000]}\nProvide an ordered plan (steps)."
-            plan = rewrite_text(planner_prompt)
-            self._append_log(job, f"Planner output: {plan[:500]}")
-
-            self._append_log(job, "Applying corrections based on goal")
-            corrected = rewrite_text(f"Make the document comply with: {job['goal']}\n\n{text}")
-            out = save_fixed_doc(job["doc_id"], corrected)
-            self._append_log(job, f"Fixed document saved: {out.name}")
-            job["status"] = "completed"
+    def _run_job(self, job_id: str) -> str:
+        # the claim already marked the job running; the final status is
+        # recorded by `JobStore.finish` once this returns
+        job = self.store.get_job(job_id)
+        with tracing.collect() as timings:
+            status = self._run_steps(job)
+        self._append_log(job, f"Stage timings: {tracing.format_timings(timings)}")
+        if status == "completed":
             self._append_log(job, "Job completed successfully")
+        return status
+
+    def steps(self) -> List[Step]:
+        return [
+            Step("extract", (), self._extract),
+            Step("analyze", ("extract",), self._analyze),
+            Step("plan", ("extract",), self._plan),
+            Step("correct", ("extract", "analyze", "plan"), self._correct),
+            Step("save", ("correct",), self._save),
+        ]
+
+    def _run_steps(self, job: Dict[str, Any]) -> str:
+        results = self.store.get_steps(job["id"])
+        if results:
+            self._append_log(job, f"Resuming after completed steps: {', '.join(results)}")
+
+        def on_done(name: str, result: Any) -> None:
+            self.store.save_step(job["id"], name, result)
+
+        try:
+            run_graph(self.steps(), results, on_done, job)
+            job["status"] = "completed"
         except Exception as e:
             job["status"] = "failed"
             self._append_log(job, f"Error: {e}")
-        finally:
-            _persist(job_id, job)
+        return job["status"]
+
+    # -- steps -----------------------------------------------------------
+    def _extract(self, job: Dict[str, Any], deps: Dict[str, Any]) -> Dict[str, Any]:
+        self._append_log(job, "Extracting text from document")
+        path = get_uploaded_file_path(job["doc_id"])
+        if not path:
+            raise RuntimeError("Uploaded file not found")
+        manifest = get_manifest(job["doc_id"]) or {}
+        return {"text": extract_text(path), "sha256": manifest.get("sha256")}
+
+    def _analyze(self, job: Dict[str, Any], deps: Dict[str, Any]) -> Dict[str, Any]:
+        self._append_log(job, "Checking document with LanguageTool")
+        text = deps["extract"]["text"]
+        try:
+            with tracing.stage("analyze"):
+                issues = check_text(text)
+        except Exception as e:
+            # analysis only sharpens the plan and the prompt; the rewrite works without it
+            self._append_log(job, f"LanguageTool unavailable, continuing without analysis: {e}")
+            return {"issues": 0, "flagged": []}
+        flagged = []
+        for issue in issues:
+            line = f"\"{text[issue['offset_start']:issue['offset_end']]}\": {issue['message']}"
+            if line not in flagged:
+                flagged.append(line)
+            if len(flagged) == _MAX_FLAGGED:
+                break
+        self._append_log(job, f"LanguageTool flagged {len(issues)} issues")
+        return {"issues": len(issues), "flagged": flagged}
+
+    def _plan(self, job: Dict[str, Any], deps: Dict[str, Any]) -> str:
+        extracted = deps["extract"]
+        key = plan_key(job["goal"], extracted["sha256"]) if AGENT_PLAN_CACHE and extracted["sha256"] else None
+        plan = self.store.get_plan(key) if key else None
+        if plan is not None:
+            self._append_log(job, "Reusing cached plan for this goal and document")
+        else:
+            self._append_log(job, "Requesting plan from model")
+            planner_prompt = f"Goal: {job['goal']}\nDocument excerpt:\n{extracted['text'][:2000]}\nProvide an ordered plan (steps)."
+            with tracing.stage("plan"):
+                plan = generate_text(planner_prompt, max_tokens=500, priority=BACKGROUND)
+            if key and plan:
+                self.store.save_plan(key, plan)
+        self._append_log(job, f"Planner output: {plan[:500]}")
+        return plan
+
+    def _correct(self, job: Dict[str, Any], deps: Dict[str, Any]) -> str:
+        self._append_log(job, "Applying corrections based on goal")
+        instructions = f"{DEFAULT_INSTRUCTIONS} Make the document comply with: {job['goal']}"
+        if deps["plan"]:
+            instructions += f"\nFollow this plan:\n{deps['plan'][:_MAX_PLAN_CHARS]}"
+        if deps["analyze"]["flagged"]:
+            instructions += "\nAlso fix these flagged problems where they occur:\n" + "\n".join(deps["analyze"]["flagged"])
+        with tracing.stage("correct"):
+            return rewrite_text(deps["extract"]["text"], instructions=instructions, priority=BACKGROUND)
+
+    def _save(self, job: Dict[str, Any], deps: Dict[str, Any]) -> str:
+        with tracing.stage("save"):
+            out = save_fixed_doc(job["doc_id"], deps["correct"])
+        self._append_log(job, f"Fixed document saved: {out.name}")
+        return out.name
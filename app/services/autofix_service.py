@@ -0,0 +1,133 @@
+# app/services/autofix_service.py
+import bisect
+import threading
+from typing import Any, Dict, Iterable, List, Tuple
+
+from app.config import AUTOFIX_RULE_TYPES
+from .compliance_service import check_pages
+from .extraction_service import Page
+
+_SEVERITY_RANK = {"high": 0, "medium": 1, "low": 2}
+
+# apply_suggestions runs on I/O pool threads
+_STATS_LOCK = threading.Lock()
+_STATS = {"fixes": 0, "applied": 0, "overlapping": 0, "no_suggestion": 0, "not_allowed": 0}
+
+
+def _starts_sentence(text: str, pos: int) -> bool:
+    before = text[:pos].rstrip(" \t")
+    return not before or before.endswith((".", "!", "?", "\n"))
+
+
+def _is_safe(text: str, issue: Dict[str, Any]) -> bool:
+    """Whether an issue's suggestion can be applied without review.
+
+    Only allowlisted issue types qualify, and grammar rules only when they
+    offer a single replacement. Casing- and whitespace-only changes are left
+    alone, as are misspellings of capitalized words inside a sentence, which
+    are usually proper nouns.
+    """
+    rule_type = issue.get("rule_type")
+    if rule_type not in AUTOFIX_RULE_TYPES:
+        return False
+    original = text[issue["offset_start"]:issue["offset_end"]]
+    suggestion = issue["suggestion"]
+    if suggestion.lower() == original.lower() or suggestion.split() == original.split():
+        return False
+    if rule_type == "grammar" and issue.get("suggestion_count", 1) != 1:
+        return False
+    if rule_type == "misspelling" and original[:1].isupper() and not _starts_sentence(text, issue["offset_start"]):
+        return False
+    return True
+
+
+def apply_suggestions(text: str, issues: Iterable[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+    """Apply each issue's LanguageTool suggestion to ``text`` locally.
+
+    When issues overlap, the more severe one wins, then the one that starts
+    first, then the shorter one. The accepted edits are applied in a single
+    left-to-right pass. Returns the fixed text and the issues that were not
+    applied, with their offsets moved to where that text now sits in the
+    fixed document.
+
+    Only suggestions that pass ``_is_safe`` are applied; the rest are
+    returned unresolved so the caller can escalate them.
+    """
+    counts = {"no_suggestion": 0, "not_allowed": 0, "overlapping": 0}
+    candidates = []
+    unresolved = []
+    for issue in issues:
+        start, end = issue.get("offset_start"), issue.get("offset_end")
+        if start is None or end is None or not 0 <= start <= end <= len(text):
+            continue
+        if issue.get("suggestion") is None:
+            counts["no_suggestion"] += 1
+            unresolved.append(issue)
+        elif not _is_safe(text, issue):
+            counts["not_allowed"] += 1
+            unresolved.append(issue)
+        else:
+            candidates.append(issue)
+
+    candidates.sort(key=lambda i: (
+        _SEVERITY_RANK.get(i.get("severity"), len(_SEVERITY_RANK)),
+        i["offset_start"],
+        i["offset_end"] - i["offset_start"],
+    ))
+    # accepted edits, kept sorted by start; none of them overlap
+    starts: List[int] = []
+    accepted: List[Dict[str, Any]] = []
+    for issue in candidates:
+        start, end = issue["offset_start"], issue["offset_end"]
+        i = bisect.bisect_left(starts, start)
+        before = accepted[i - 1] if i > 0 else None
+        after = accepted[i] if i < len(accepted) else None
+        if (before and before["offset_end"] > start) or (after and (after["offset_start"] < end or after["offset_start"] == start)):
+            counts["overlapping"] += 1
+            unresolved.append(issue)
+            continue
+        starts.insert(i, start)
+        accepted.insert(i, issue)
+
+    parts: List[str] = []
+    ends: List[int] = []  # old end of each edit
+    deltas: List[int] = []  # cumulative length change once that edit is applied
+    last = delta = 0
+    for issue in accepted:
+        start, end = issue["offset_start"], issue["offset_end"]
+        parts.append(text[last:start])
+        parts.append(issue["suggestion"])
+        delta += len(issue["suggestion"]) - (end - start)
+        ends.append(end)
+        deltas.append(delta)
+        last = end
+    parts.append(text[last:])
+
+    def moved(pos: int) -> int:
+        i = bisect.bisect_right(ends, pos)
+        return pos + (deltas[i - 1] if i else 0)
+
+    remaining = []
+    for issue in unresolved:
+        shifted = dict(issue)
+        shifted["offset_start"] = moved(issue["offset_start"])
+        shifted["offset_end"] = max(shifted["offset_start"], moved(issue["offset_end"]))
+        remaining.append(shifted)
+
+    with _STATS_LOCK:
+        _STATS["fixes"] += 1
+        _STATS["applied"] += len(accepted)
+        for key, n in counts.items():
+            _STATS[key] += n
+    return "".join(parts), remaining
+
+
+def autofix_pages(pages: Iterable[Page]) -> Tuple[str, List[Dict[str, Any]]]:
+    """Check a document with LanguageTool and apply its suggestions; no Mistral call."""
+    text, issues = check_pages(pages)
+    return apply_suggestions(text, issues)
+
+
+def stats() -> Dict[str, Any]:
+    with _STATS_LOCK:
+        return dict(_STATS)
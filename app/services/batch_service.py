@@ -0,0 +1,50 @@
+# app/services/batch_service.py
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Sequence, TypeVar
+
+from fastapi import HTTPException
+
+_LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+async def stream_ndjson(
+    items: Sequence[T],
+    handler: Callable[[T], Awaitable[Dict[str, Any]]],
+    concurrency: int,
+    describe: Callable[[T], Dict[str, Any]] = lambda _item: {},
+) -> AsyncIterator[str]:
+    """Run ``handler`` over ``items`` and yield one NDJSON line per item as it finishes.
+
+    At most ``concurrency`` items are in flight. Every line carries the
+    item's ``index`` in the request plus ``describe(item)``. Successful
+    items get ``"status": "ok"`` and the handler's result. A failure only
+    affects its own line, which gets ``"status": "error"`` with
+    ``status_code`` and ``detail``. If the client goes away, unfinished
+    items are cancelled.
+    """
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(index: int, item: T) -> Dict[str, Any]:
+        line = {"index": index, **describe(item)}
+        async with sem:
+            try:
+                line.update(await handler(item))
+                line["status"] = "ok"
+            except HTTPException as e:
+                line.update(status="error", status_code=e.status_code, detail=e.detail)
+            except Exception as e:
+                _LOGGER.exception("Batch item %d failed", index)
+                line.update(status="error", status_code=500, detail=str(e))
+        return line
+
+    tasks = [asyncio.ensure_future(run(i, item)) for i, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield json.dumps(await next_done) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
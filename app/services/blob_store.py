@@ -0,0 +1,81 @@
+# app/services/blob_store.py
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+from app.config import UPLOAD_DIR
+
+_LOGGER = logging.getLogger(__name__)
+
+# Content-addressed store: every distinct upload is kept once under
+# _blobs/<aa>/<sha256>; per-document folders only hold links to it.
+# Work derived from the content (extracted text, ...) is stored beside the
+# blob as <sha256>.<name> so every doc_id with the same bytes reuses it.
+BLOBS_DIR = UPLOAD_DIR / "_blobs"
+
+
+def blob_path(digest: str) -> Path:
+    return BLOBS_DIR / digest[:2] / digest
+
+
+def has_blob(digest: str) -> bool:
+    return blob_path(digest).exists()
+
+
+def artefact_path(digest: str, name: str) -> Path:
+    return blob_path(digest).with_name(f"{digest}.{name}")
+
+
+class BlobWriter:
+    """Stream bytes into the store: hash as data arrives, publish atomically on commit.
+
+    Data goes to a temp file beside the blobs (same filesystem, so the final
+    ``os.replace`` is atomic). If a blob with the same hash already exists the
+    temp file is discarded instead.
+    """
+
+    def __init__(self):
+        tmp_dir = BLOBS_DIR / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.tmp_path = tmp_dir / f"{uuid.uuid4().hex}.part"
+        self._fh = self.tmp_path.open("wb")
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes) -> None:
+        self._fh.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> str:
+        self._fh.close()
+        digest = self._hash.hexdigest()
+        if has_blob(digest):
+            self.tmp_path.unlink(missing_ok=True)
+            return digest
+        target = blob_path(digest)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.tmp_path, target)
+        return digest
+
+    def abort(self) -> None:
+        self._fh.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+
+def link_blob(digest: str, dest: Path) -> Path:
+    """Expose the blob at ``dest`` without copying it when the filesystem allows."""
+    src = blob_path(digest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(src, dest)
+    except OSError:
+        try:
+            os.symlink(src.resolve(), dest)
+        except OSError:
+            _LOGGER.debug("Hard/soft links unavailable for %s, copying blob", dest)
+            shutil.copyfile(src, dest)
+    return dest
@@ -1,41 +1,238 @@
 ﻿# app/services/compliance_service.py
+import hashlib
 import logging
-from typing import Any, Dict, List
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
-import language_tool_python
-
-from app.config import MISTRAL_API_KEY, LANGUAGE_TOOL_LANG
+from app.config import (
+	MISTRAL_API_KEY,
+	LANGUAGE_TOOL_LANG,
+	LANGUAGE_TOOL_POOL_SIZE,
+	LANGUAGE_TOOL_PUBLIC_API_FALLBACK,
+	LANGUAGE_TOOL_RETRY_SECONDS,
+	ANALYSIS_CACHE_MAX_PARAGRAPHS,
+)
+from app.utils.lru_cache import LRUCache
+from . import tracing
+from .extraction_service import Page
+from .languagetool_pool import LanguageToolPool, split_paragraphs
 from .mistral_client import generate_text
 
 
 _LOGGER = logging.getLogger(__name__)
 
-# initialize LanguageTool (local by default)
-try:
-	_tool = language_tool_python.LanguageTool(LANGUAGE_TOOL_LANG)
-except Exception:
-	# fallback to public API instance if local initialization fails
-	_tool = language_tool_python.LanguageTool(LANGUAGE_TOOL_LANG)
+class LanguageToolUnavailable(RuntimeError):
+	"""The local LanguageTool servers are not running (and the public API is not allowed)."""
+
+
+# LanguageTool servers are JVMs: started on first use (or by warm_up), not at import
+_pool: Optional[LanguageToolPool] = None
+_pool_lock = threading.Lock()
+# True while _pool talks to languagetool.org (LANGUAGE_TOOL_PUBLIC_API_FALLBACK)
+_public_api = False
+# monotonic time and error of the last failed local start; retried after LANGUAGE_TOOL_RETRY_SECONDS
+_failed_at: Optional[float] = None
+_failure: Optional[str] = None
+_stop_warm_up = threading.Event()
+
+
+def _public_api_tool() -> Any:
+	import language_tool_python
+
+	return language_tool_python.LanguageToolPublicAPI(LANGUAGE_TOOL_LANG)
+
+
+def get_pool() -> LanguageToolPool:
+	"""The local server pool, started on first use.
+
+	If the servers cannot start (e.g. no Java) this raises
+	LanguageToolUnavailable until a retry succeeds; retries happen at most
+	every LANGUAGE_TOOL_RETRY_SECONDS. Only with LANGUAGE_TOOL_PUBLIC_API_FALLBACK
+	are paragraphs sent to the public API meanwhile.
+	"""
+	global _pool, _public_api, _failed_at, _failure
+	pool = _pool
+	if pool is not None and not _public_api:
+		return pool
+	with _pool_lock:
+		if _pool is not None and not _public_api:
+			return _pool
+		if _failed_at is not None and time.monotonic() - _failed_at < LANGUAGE_TOOL_RETRY_SECONDS:
+			if _pool is not None:
+				return _pool
+			raise LanguageToolUnavailable(_failure)
+		try:
+			local = LanguageToolPool(LANGUAGE_TOOL_POOL_SIZE, LANGUAGE_TOOL_LANG)
+		except Exception as e:
+			_failed_at = time.monotonic()
+			_failure = f"Local LanguageTool failed to start: {e}"
+			_LOGGER.exception("Local LanguageTool failed to start; retrying in %.0fs", LANGUAGE_TOOL_RETRY_SECONDS)
+			if _pool is not None:
+				return _pool
+			if not LANGUAGE_TOOL_PUBLIC_API_FALLBACK:
+				raise LanguageToolUnavailable(_failure) from e
+			_LOGGER.warning("LANGUAGE_TOOL_PUBLIC_API_FALLBACK is set: sending document text to the public LanguageTool API")
+			_pool, _public_api = LanguageToolPool(1, LANGUAGE_TOOL_LANG, factory=_public_api_tool), True
+			return _pool
+		previous, _pool, _public_api = _pool, local, False
+		_failed_at = _failure = None
+	if previous is not None:
+		_LOGGER.info("Local LanguageTool is up; no longer using the public API")
+		previous.close()
+	return local
+
+
+def warm_up() -> None:
+	"""Start the LanguageTool servers and load their rules with a tiny check.
+
+	Keeps retrying until the local servers are up (or the pool is closed).
+	"""
+	while True:
+		try:
+			pool = get_pool()
+			if not _public_api:
+				pool.check("Warm up.")
+				_LOGGER.info("LanguageTool pool is warm")
+				return
+		except LanguageToolUnavailable:
+			pass  # logged by get_pool
+		except Exception:
+			_LOGGER.exception("LanguageTool warm-up failed")
+		if _stop_warm_up.wait(LANGUAGE_TOOL_RETRY_SECONDS):
+			return
+
+
+def start_warm_up() -> threading.Thread:
+	_stop_warm_up.clear()
+	thread = threading.Thread(target=warm_up, name="languagetool-warmup", daemon=True)
+	thread.start()
+	return thread
+
+
+def close_pool() -> None:
+	global _pool, _public_api
+	_stop_warm_up.set()
+	with _pool_lock:
+		pool, _pool, _public_api = _pool, None, False
+	if pool is not None:
+		pool.close()
+
+
+def pool_stats() -> Optional[Dict[str, Any]]:
+	if _pool is None:
+		return {"backend": None, "error": _failure} if _failure else None
+	return {**_pool.stats(), "backend": "public_api" if _public_api else "local", "error": _failure}
+
+
+# paragraph fingerprint -> issues with offsets relative to the paragraph
+_PARAGRAPH_CACHE = LRUCache(max_items=ANALYSIS_CACHE_MAX_PARAGRAPHS)
+
+
+def _fingerprint(paragraph: str) -> str:
+	return hashlib.sha256(f"{LANGUAGE_TOOL_LANG}\0{paragraph}".encode("utf-8")).hexdigest()
+
+
+def _match_to_issue(m: Any) -> Dict[str, Any]:
+	offset = getattr(m, "offset", None) or 0
+	return {
+		"category": "grammar/style",
+		"severity": "high" if getattr(m, "ruleIssueType", None) == "grammar" else "medium",
+		"sentence": getattr(m, "context", "") or "",
+		"message": getattr(m, "message", ""),
+		"suggestion": (m.replacements[0] if getattr(m, "replacements", None) else None),
+		"suggestion_count": len(getattr(m, "replacements", None) or ()),
+		"rule_type": getattr(m, "ruleIssueType", None),
+		"offset_start": offset,
+		"offset_end": offset + (getattr(m, "errorLength", 0) or 0),
+	}
+
+
+def _check_paragraphs(segments: Iterable[Tuple[int, str]]) -> List[Dict[str, Any]]:
+	"""LanguageTool issues for ``(offset, paragraph)`` segments, re-checking only paragraphs not seen before.
+
+	Each paragraph's issues are cached under its fingerprint with
+	paragraph-relative offsets and shifted to where the paragraph sits now,
+	so an edited re-upload only pays for the paragraphs that changed. Checks
+	are submitted as segments arrive, so a streamed document is checked while
+	its later pages are still being extracted.
+	"""
+	placed: List[Tuple[int, str]] = []
+	known: Dict[str, List[Dict[str, Any]]] = {}
+	pending: Dict[str, Future] = {}
+	for base, segment in segments:
+		key = _fingerprint(segment)
+		placed.append((base, key))
+		if key in known or key in pending:
+			continue
+		cached = _PARAGRAPH_CACHE.get(key)
+		if cached is None:
+			pending[key] = get_pool().submit(segment)
+		else:
+			known[key] = cached
+	# traced as the time spent waiting for LanguageTool once every segment is submitted
+	t0 = time.perf_counter()
+	for key, future in pending.items():
+		known[key] = [_match_to_issue(m) for m in future.result()]
+		_PARAGRAPH_CACHE.set(key, known[key])
+	tracing.record("languagetool", time.perf_counter() - t0)
+
+	issues: List[Dict[str, Any]] = []
+	for base, key in placed:
+		for issue in known[key]:
+			shifted = dict(issue)
+			shifted["offset_start"] += base
+			shifted["offset_end"] += base
+			issues.append(shifted)
+	return issues
+
+
+def cache_stats() -> Dict[str, Any]:
+	return _PARAGRAPH_CACHE.stats()
 
 
 def analyze_text(text: str, doc_id: str = None) -> Dict[str, Any]:
 	if not text or not text.strip():
 		return {"doc_id": doc_id, "filename": None, "summary": "No extractable text", "issues": []}
 
-	# LanguageTool matches
-	matches = _tool.check(text)
-	issues: List[Dict[str, Any]] = []
-	for m in matches:
-		issues.append({
-			"category": "grammar/style",
-			"severity": "high" if getattr(m, "ruleIssueType", None) == "grammar" else "medium",
-			"sentence": getattr(m, "context", "") or "",
-			"message": getattr(m, "message", ""),
-			"suggestion": (m.replacements[0] if getattr(m, "replacements", None) else None),
-			"offset_start": getattr(m, "offset", None),
-			"offset_end": (getattr(m, "offset", None) or 0) + (getattr(m, "errorLength", 0) or 0),
-		})
+	issues = check_text(text)
+	return {"doc_id": doc_id, "summary": _summarize(text), "issues": issues}
+
 
+def check_text(text: str) -> List[Dict[str, Any]]:
+	"""LanguageTool issues only (no Mistral summary); one paragraph per pooled backend call."""
+	return _check_paragraphs(split_paragraphs(text))
+
+
+def check_pages(pages: Iterable[Page]) -> Tuple[str, List[Dict[str, Any]]]:
+	"""LanguageTool issues for a document that is still being extracted, plus its joined text.
+
+	Each page is checked as soon as it is extracted; issue offsets point into
+	the returned text. No Mistral summary is made.
+	"""
+	texts: List[str] = []
+
+	def segments() -> Iterator[Tuple[int, str]]:
+		for page in pages:
+			if page.text:
+				texts.append(page.text)
+			for offset, paragraph in split_paragraphs(page.text):
+				yield page.offset_start + offset, paragraph
+
+	issues = _check_paragraphs(segments())
+	return "\n".join(texts), issues
+
+
+def analyze_pages(pages: Iterable[Page], doc_id: str = None) -> Dict[str, Any]:
+	"""Like `analyze_text`, but starts checking each page as soon as it is extracted."""
+	text, issues = check_pages(pages)
+	if not text.strip():
+		return {"doc_id": doc_id, "filename": None, "summary": "No extractable text", "issues": []}
+	return {"doc_id": doc_id, "summary": _summarize(text), "issues": issues}
+
+
+def _summarize(text: str) -> str:
 	summary = "LanguageTool analysis completed."
 
 	# optionally ask Mistral to summarize high-level issues & suggestions
@@ -51,5 +248,4 @@ def analyze_text(text: str, doc_id: str = None) -> Dict[str, Any]:
 		except Exception as e:
 			_LOGGER.exception("Mistral summary failed")
 			summary = f"LanguageTool done. Mistral summary failed: {e}"
-
-	return {"doc_id": doc_id, "summary": summary, "issues": issues}
+	return summary
@@ -0,0 +1,187 @@
+# app/services/executors.py
+import asyncio
+import contextvars
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, Optional, TypeVar
+
+from fastapi import HTTPException
+
+from app.config import CPU_WORKERS, IO_WORKERS, DISCONNECT_POLL_SECONDS
+
+_LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class StageExecutor:
+    """A named worker pool with saturation counters.
+
+    ``kind`` is ``"process"`` for CPU-bound work (PDF parsing, OCR, DOCX
+    building) or ``"thread"`` for blocking I/O. The pool is created on first
+    use; process pools use ``spawn`` because this process runs JVM clients
+    and event-loop threads that must not be forked.
+    """
+
+    def __init__(self, name: str, kind: str, max_workers: int):
+        self.name = name
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.peak_in_flight = 0
+
+    def submit(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> "Future[T]":
+        if self.kind == "thread":
+            # carry the caller's context (request stage timings) into the worker thread
+            fn, args = contextvars.copy_context().run, (fn, *args)
+        future = self._get_executor().submit(fn, *args, **kwargs)
+        with self._lock:
+            self.submitted += 1
+            self.peak_in_flight = max(self.peak_in_flight, self._in_flight())
+        future.add_done_callback(self._record)
+        return future
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Await ``fn`` on this pool; cancelling the caller drops it if it has not started."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = self._in_flight()
+            active = min(in_flight, self.max_workers)
+            return {
+                "kind": self.kind,
+                "max_workers": self.max_workers,
+                "active": active,
+                "queued": in_flight - active,
+                "saturation": active / self.max_workers,
+                "peak_in_flight": self.peak_in_flight,
+                "completed": self.completed,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "process":
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"stage-{self.name}")
+            return self._executor
+
+    def _in_flight(self) -> int:
+        return self.submitted - self.completed - self.failed - self.cancelled
+
+    def _record(self, future: Future) -> None:
+        with self._lock:
+            if future.cancelled():
+                self.cancelled += 1
+            elif future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+
+_STAGES: Dict[str, StageExecutor] = {
+    "cpu": StageExecutor("cpu", "process", CPU_WORKERS),
+    "io": StageExecutor("io", "thread", IO_WORKERS),
+}
+_REQUESTS = {"deadline_exceeded": 0, "client_disconnected": 0}
+
+
+def cpu() -> StageExecutor:
+    return _STAGES["cpu"]
+
+
+def io() -> StageExecutor:
+    return _STAGES["io"]
+
+
+def stats() -> Dict[str, Any]:
+    out: Dict[str, Any] = {name: stage.stats() for name, stage in _STAGES.items()}
+    out["requests"] = dict(_REQUESTS)
+    return out
+
+
+def shutdown() -> None:
+    for stage in _STAGES.values():
+        stage.shutdown()
+
+
+class RequestCancelled(Exception):
+    """Raised inside worker threads once the request they serve is abandoned."""
+
+
+class RequestScope:
+    """Deadline and disconnect handling for one request's blocking work.
+
+    ``run`` awaits work within whatever is left of the request deadline
+    (504 when it runs out) and cancels it when ``is_disconnected`` reports
+    the client gone (499). Threads cannot be killed, so blocking loops wrap
+    their input in ``guard`` and stop at the next item once cancelled.
+    """
+
+    def __init__(self, timeout: float, is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None):
+        self.deadline = time.monotonic() + timeout
+        self.cancelled = threading.Event()
+        self._is_disconnected = is_disconnected
+        self._disconnected = False
+
+    def guard(self, items: Iterable[T]) -> Iterator[T]:
+        try:
+            for item in items:
+                if self.cancelled.is_set():
+                    raise RequestCancelled()
+                yield item
+        finally:
+            close = getattr(items, "close", None)
+            if close is not None:
+                close()
+
+    async def run(self, work: Awaitable[T]) -> T:
+        task = asyncio.ensure_future(work)
+        watcher = asyncio.ensure_future(self._watch(task)) if self._is_disconnected else None
+        try:
+            return await asyncio.wait_for(task, timeout=max(0.0, self.deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            self.cancelled.set()
+            _REQUESTS["deadline_exceeded"] += 1
+            raise HTTPException(status_code=504, detail="Processing deadline exceeded")
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            if not self._disconnected:
+                raise
+            _REQUESTS["client_disconnected"] += 1
+            raise HTTPException(status_code=499, detail="Client closed request")
+        except BaseException:
+            self.cancelled.set()
+            raise
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+
+    async def _watch(self, task: "asyncio.Future[Any]") -> None:
+        while not task.done():
+            await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+            if await self._is_disconnected():
+                _LOGGER.info("Client disconnected, cancelling request work")
+                self._disconnected = True
+                task.cancel()
+                return
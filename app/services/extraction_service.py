@@ -1,40 +1,241 @@
 ﻿# app/services/extraction_service.py
+import itertools
+import json
+import logging
+import os
+import time
+from collections import deque
 from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
 import pdfplumber
 import docx
-from app.utils.ocr_utils import ocr_pdf_if_needed
+from app.config import EXTRACT_CACHE_MAX_BYTES, EXTRACT_CACHE_DISK, EXTRACT_PAGES_PER_TASK, OCR_ENABLED
+from app.services import blob_store, executors, tracing
+from app.utils.lru_cache import LRUCache
+from app.utils.ocr_utils import needs_ocr, ocr_page
+from app.utils.security import hash_file
+
+_LOGGER = logging.getLogger(__name__)
+
+# Bump whenever extraction output changes (new library, OCR settings, joining rules)
+# so cached text produced by an older extractor is ignored and rebuilt.
+EXTRACTOR_VERSION = "3"
+CACHE_FILENAME = ".extracted.json"
+
+def _encoded_size(pages: Tuple[str, ...]) -> int:
+    # the budget is in bytes: non-ASCII characters take more than one
+    return sum(len(page.encode("utf-8")) for page in pages)
+
+
+# page texts keyed by (version, sha256); digests keyed by (path, size, mtime)
+# so an unchanged file is not re-hashed on every request
+_TEXT_CACHE = LRUCache(max_bytes=EXTRACT_CACHE_MAX_BYTES, sizeof=_encoded_size)
+_DIGEST_CACHE = LRUCache(max_items=4096)
+
+
+class Page(NamedTuple):
+    number: int  # 1-based
+    text: str
+    # where this page's text sits in the joined document (see join_pages)
+    offset_start: int
+    offset_end: int
+
+
+def extract_text(path: Path, use_cache: bool = True) -> str:
+    return join_pages(iter_pages(path, use_cache=use_cache))
+
+
+def join_pages(pages: Iterable[Page]) -> str:
+    return "\n".join(page.text for page in pages if page.text)
+
+
+def iter_pages(path: Path, use_cache: bool = True) -> Iterator[Page]:
+    """Yield the document's pages in order as soon as each one is extracted.
+
+    PDF page ranges are parsed in worker processes, so consumers can work on
+    early pages while later ones are still being parsed. DOCX files come out
+    as a single page. The caches are filled once the last page has been read.
+    Time spent producing pages is traced as the ``extract`` stage.
+    """
+    return tracing.timed_iter("extract", _iter_pages(path, use_cache))
+
+
+def _iter_pages(path: Path, use_cache: bool) -> Iterator[Page]:
+    if not use_cache:
+        yield from _with_offsets(_iter_uncached(path))
+        return
+
+    digest = file_digest(path)
+    key = (EXTRACTOR_VERSION, digest)
+    texts = _TEXT_CACHE.get(key)
+    if texts is None:
+        texts = _read_disk_cache(path, digest)
+        if texts is not None:
+            _TEXT_CACHE.set(key, texts)
+    if texts is not None:
+        yield from _with_offsets(texts)
+        return
+
+    collected: List[str] = []
+    for page in _with_offsets(_iter_uncached(path)):
+        collected.append(page.text)
+        yield page
+    texts = tuple(collected)
+    _write_disk_cache(path, digest, texts)
+    _TEXT_CACHE.set(key, texts)
 
 
-def extract_text(path: Path) -> str:
+def file_digest(path: Path) -> str:
+    st = path.stat()
+    key = (str(path), st.st_size, st.st_mtime_ns)
+    digest = _DIGEST_CACHE.get(key)
+    if digest is None:
+        digest = hash_file(path)
+        _DIGEST_CACHE.set(key, digest)
+    return digest
+
+
+def cache_stats() -> dict:
+    return _TEXT_CACHE.stats()
+
+
+def _with_offsets(texts: Iterable[str]) -> Iterator[Page]:
+    pos = 0
+    first = True
+    for number, text in enumerate(texts, start=1):
+        if not text:
+            yield Page(number, "", pos, pos)
+            continue
+        if not first:
+            pos += 1  # the newline join_pages puts between pages
+        first = False
+        yield Page(number, text, pos, pos + len(text))
+        pos += len(text)
+
+
+def _iter_uncached(path: Path) -> Iterator[str]:
     ext = path.suffix.lower()
 
     if ext == ".pdf":
-        text = _extract_pdf(path)
-        if not text.strip():
-            # attempt OCR fallback
-            text = ocr_pdf_if_needed(path)
-        return text
+        yield from _iter_pdf_texts(path)
 
     elif ext in (".docx", ".doc"):
-        return _extract_docx(path)
+        yield _extract_docx(path)
+
+
+def disk_cache_path(path: Path, digest: str) -> Path:
+    # blob-backed uploads share one cache entry across every doc_id with the
+    # same content; legacy per-folder uploads keep theirs next to the file
+    if blob_store.has_blob(digest):
+        return blob_store.artefact_path(digest, "extracted.json")
+    return path.parent / CACHE_FILENAME
+
+
+def _read_disk_cache(path: Path, digest: str) -> Optional[Tuple[str, ...]]:
+    if not EXTRACT_CACHE_DISK:
+        return None
+    cache_file = disk_cache_path(path, digest)
+    try:
+        data = json.loads(cache_file.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    except Exception:
+        _LOGGER.warning("Ignoring unreadable extraction cache %s", cache_file)
+        return None
+    if data.get("version") != EXTRACTOR_VERSION or data.get("sha256") != digest:
+        return None
+    pages = data.get("pages")
+    if not isinstance(pages, list) or not all(isinstance(t, str) for t in pages):
+        return None
+    return tuple(pages)
 
-    else:
-        return ""
 
+def _write_disk_cache(path: Path, digest: str, pages: Tuple[str, ...]) -> None:
+    if not EXTRACT_CACHE_DISK:
+        return
+    cache_file = disk_cache_path(path, digest)
+    tmp = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    try:
+        tmp.write_text(
+            json.dumps({"version": EXTRACTOR_VERSION, "sha256": digest, "pages": list(pages)}),
+            encoding="utf-8",
+        )
+        os.replace(tmp, cache_file)
+    except OSError:
+        _LOGGER.warning("Could not write extraction cache %s", cache_file, exc_info=True)
+        tmp.unlink(missing_ok=True)
 
 
-def _extract_pdf(path: Path) -> str:
-    text_chunks = []
+def _iter_pdf_texts(path: Path) -> Iterator[str]:
+    """Page texts in page order, parsed EXTRACT_PAGES_PER_TASK pages per task.
+
+    Ranges run on the shared CPU process pool with at most twice its worker
+    count in flight, so memory stays bounded however long the document is.
+    """
     with pdfplumber.open(path) as pdf:
+        total = len(pdf.pages)
+    per_task = max(1, EXTRACT_PAGES_PER_TASK)
+    ranges = [(start, min(start + per_task, total)) for start in range(0, total, per_task)]
+    pool = executors.cpu()
+    if pool.max_workers <= 1 or len(ranges) <= 1:
+        for start, stop in ranges:
+            yield from _traced(_extract_page_range(str(path), start, stop))
+        return
+
+    todo = iter(ranges)
+    pending = deque(
+        pool.submit(_extract_page_range, str(path), start, stop)
+        for start, stop in itertools.islice(todo, 2 * pool.max_workers)
+    )
+    try:
+        while pending:
+            result = pending.popleft().result()
+            nxt = next(todo, None)
+            if nxt is not None:
+                pending.append(pool.submit(_extract_page_range, str(path), *nxt))
+            yield from _traced(result)
+    finally:
+        # the consumer stopped early or a range failed: drop queued work
+        for future in pending:
+            future.cancel()
+
+
+def _traced(result: Tuple[List[str], List[float]]) -> List[str]:
+    # OCR ran in a worker process: record its timings here, in the caller's trace
+    texts, ocr_seconds = result
+    for seconds in ocr_seconds:
+        tracing.record("ocr", seconds)
+    return texts
+
+
+def _extract_page_range(path: str, start: int, stop: int) -> Tuple[List[str], List[float]]:
+    # runs in a worker process; pages are 0-based here, 1-based for pdfplumber.
+    # Returns the page texts and the duration of each page OCR.
+    texts, ocr_seconds = [], []
+    with pdfplumber.open(path, pages=list(range(start + 1, stop + 1))) as pdf:
         for page in pdf.pages:
-            txt = page.extract_text()
-            if txt:
-                text_chunks.append(txt)
-    return "\n".join(text_chunks)
+            text = page.extract_text() or ""
+            page.close()
+            if OCR_ENABLED and needs_ocr(text):
+                t0 = time.perf_counter()
+                text = _ocr_page(Path(path), page.page_number, text)
+                ocr_seconds.append(time.perf_counter() - t0)
+            texts.append(text)
+    return texts, ocr_seconds
+
+
+def _ocr_page(path: Path, page_number: int, fallback: str) -> str:
+    # scanned page or unusable text layer: OCR just this page, keep the text layer if that fails
+    try:
+        text = ocr_page(path, page_number)
+    except Exception as e:
+        _LOGGER.warning("OCR failed for page %d of %s: %s", page_number, path.name, e)
+        return fallback
+    return text if text.strip() else fallback
 
 
 def _extract_docx(path: Path) -> str:
     doc = docx.Document(path)
     paras = [p.text for p in doc.paragraphs if p.text]
     return "\n".join(paras)
-
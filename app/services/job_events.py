@@ -0,0 +1,72 @@
+# app/services/job_events.py
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import JOB_EVENTS_HEARTBEAT_SECONDS, JOB_EVENTS_POLL_SECONDS
+from app.services.job_store import JobStore
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+def format_sse(data: dict, event: Optional[str] = None, event_id: Optional[int] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream_job_events(
+    store: JobStore,
+    job_id: str,
+    since: int = 0,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    heartbeat: float = JOB_EVENTS_HEARTBEAT_SECONDS,
+    poll: float = JOB_EVENTS_POLL_SECONDS,
+) -> AsyncIterator[str]:
+    """Server-Sent Events for one job: status transitions and new log lines.
+
+    Log lines carry their ``seq`` as the SSE id, so a reconnecting client
+    sending ``Last-Event-ID`` resumes after the last line it saw. The stream
+    wakes on in-process job changes, falls back to polling every ``poll``
+    seconds for workers in other processes, sends a keep-alive comment after
+    ``heartbeat`` idle seconds, and ends after the job reaches a final state.
+    """
+    wake = store.notifier.subscribe(job_id)
+    last_status = None
+    last_sent = time.monotonic()
+    try:
+        while True:
+            wake.clear()
+            job = await run_in_threadpool(store.get_job, job_id, since)
+            if job is None:
+                yield format_sse({"detail": "Job not found"}, event="error")
+                return
+            for entry in job["logs"]:
+                since = entry["seq"]
+                yield format_sse(entry, event="log", event_id=entry["seq"])
+                last_sent = time.monotonic()
+            if job["status"] != last_status:
+                last_status = job["status"]
+                yield format_sse({"status": last_status}, event="status")
+                last_sent = time.monotonic()
+            if last_status in TERMINAL_STATUSES:
+                yield format_sse({"status": last_status}, event="end")
+                return
+            if is_disconnected is not None and await is_disconnected():
+                return
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=min(poll, heartbeat))
+            except asyncio.TimeoutError:
+                pass
+            if time.monotonic() - last_sent >= heartbeat:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+    finally:
+        store.notifier.unsubscribe(job_id, wake)
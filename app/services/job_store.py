@@ -0,0 +1,429 @@
+# app/services/job_store.py
+import asyncio
+import base64
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.config import UPLOAD_DIR, AGENT_LEASE_SECONDS, AGENT_MAX_ATTEMPTS
+
+_LOGGER = logging.getLogger(__name__)
+
+JOBS_DIR = UPLOAD_DIR / "_jobs"
+STORE_PATH = JOBS_DIR / "jobs.sqlite3"
+
+_JOB_COLUMNS = "id, doc_id, goal, status, created_at, started_at, finished_at, attempts"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_cursor(created_at: float, job_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([created_at, job_id]).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        created_at, job_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(created_at), str(job_id)
+    except Exception as e:
+        raise InvalidCursor(cursor) from e
+
+
+class JobNotifier:
+    """Wakes in-process watchers (e.g. SSE streams) when a job changes.
+
+    Workers publish from their own threads; each subscriber is an
+    ``asyncio.Event`` set on the watcher's loop. Changes made by other
+    processes are not seen here, so watchers still poll on a timeout.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+
+    def subscribe(self, job_id: str) -> asyncio.Event:
+        event = asyncio.Event()
+        with self._lock:
+            self._subs.setdefault(job_id, set()).add((asyncio.get_running_loop(), event))
+        return event
+
+    def unsubscribe(self, job_id: str, event: asyncio.Event) -> None:
+        with self._lock:
+            subs = self._subs.get(job_id, set())
+            for entry in [e for e in subs if e[1] is event]:
+                subs.discard(entry)
+            if not subs:
+                self._subs.pop(job_id, None)
+
+    def publish(self, job_id: str) -> None:
+        with self._lock:
+            subs = list(self._subs.get(job_id, ()))
+        for loop, event in subs:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # watcher's loop already closed
+                pass
+
+
+class JobStore:
+    """Durable agent job queue and append-only job log in SQLite.
+
+    One row per job holds its state; log lines are appended to ``job_logs``
+    with a per-job sequence number and never rewritten, so writing a log line
+    costs the same at line 10 as at line 10,000 and readers can ask for
+    entries after a given ``seq``.
+
+    Workers claim the oldest queued job under a lease that they keep alive
+    with heartbeats. A job whose lease runs out (worker crashed or the
+    process was restarted) goes back to ``queued`` until it has used up
+    ``max_attempts``, then it is marked ``failed``. The database is shared by
+    every worker process on the host.
+    """
+
+    def __init__(self, path: Path, lease_seconds: float = AGENT_LEASE_SECONDS, max_attempts: int = AGENT_MAX_ATTEMPTS):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        self.notifier = JobNotifier()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, doc_id TEXT NOT NULL, goal TEXT NOT NULL,"
+            " status TEXT NOT NULL, created_at REAL NOT NULL, started_at REAL,"
+            " finished_at REAL, lease_owner TEXT, lease_expires REAL,"
+            " attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_logs ("
+            " job_id TEXT NOT NULL, seq INTEGER NOT NULL, ts REAL NOT NULL, msg TEXT NOT NULL,"
+            " PRIMARY KEY (job_id, seq))"
+        )
+        # results of finished pipeline steps, so a retried job resumes where it stopped
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_steps ("
+            " job_id TEXT NOT NULL, step TEXT NOT NULL, result TEXT NOT NULL, finished_at REAL NOT NULL,"
+            " PRIMARY KEY (job_id, step))"
+        )
+        # planner output per (normalized goal, document content), shared by all jobs
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS agent_plans (key TEXT PRIMARY KEY, plan TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        conn.execute("DROP INDEX IF EXISTS jobs_status_created")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created_doc ON jobs(status, created_at, doc_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_doc_created ON jobs(doc_id, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_created ON jobs(created_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite connections are per-thread; busy timeout covers other processes' writes
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    # -- queue ---------------------------------------------------------
+    def enqueue(self, job_id: str, doc_id: str, goal: str) -> None:
+        self._conn().execute(
+            "INSERT INTO jobs (id, doc_id, goal, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+            (job_id, doc_id, goal, time.time()),
+        )
+
+    def claim(self, owner: str) -> Optional[Dict[str, Any]]:
+        """Lease the oldest queued job to ``owner``; None when the queue is empty."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, doc_id, goal, created_at, attempts FROM jobs"
+                " WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', lease_owner = ?, lease_expires = ?,"
+                " started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (owner, now + self.lease_seconds, now, row[0]),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.notifier.publish(row[0])
+        return {"id": row[0], "doc_id": row[1], "goal": row[2], "created_at": row[3], "attempts": row[4] + 1}
+
+    def heartbeat(self, job_id: str, owner: str) -> bool:
+        """Extend the lease; False means it was lost (expired and re-queued)."""
+        now = time.time()
+        cur = self._conn().execute(
+            "UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_owner = ?"
+            " AND status = 'running' AND lease_expires >= ?",
+            (now + self.lease_seconds, job_id, owner, now),
+        )
+        return cur.rowcount == 1
+
+    def finish(self, job_id: str, owner: str, status: str) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            updated = conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, lease_owner = NULL, lease_expires = NULL"
+                " WHERE id = ? AND lease_owner = ?",
+                (status, time.time(), job_id, owner),
+            ).rowcount
+            if updated:
+                # a finished job is never resumed
+                conn.execute("DELETE FROM job_steps WHERE job_id = ?", (job_id,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.notifier.publish(job_id)
+
+    def release(self, job_id: str, owner: str) -> None:
+        """Put a running job back in the queue to be retried; its step results are kept."""
+        self._conn().execute(
+            "UPDATE jobs SET status = 'queued', lease_owner = NULL, lease_expires = NULL"
+            " WHERE id = ? AND lease_owner = ?",
+            (job_id, owner),
+        )
+        self.notifier.publish(job_id)
+
+    def requeue_expired(self) -> int:
+        """Return jobs with dead leases to the queue (or fail them after max_attempts)."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            failed = conn.execute(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, lease_owner = NULL, lease_expires = NULL"
+                " WHERE status = 'running' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            ).rowcount
+            requeued = conn.execute(
+                "UPDATE jobs SET status = 'queued', lease_owner = NULL, lease_expires = NULL"
+                " WHERE status = 'running' AND lease_expires < ?",
+                (now,),
+            ).rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return requeued + failed
+
+    # -- logs ----------------------------------------------------------
+    def append_log(self, job_id: str, msg: str) -> int:
+        """Append one log line and return its per-job sequence number."""
+        conn = self._conn()
+        ts = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM job_logs WHERE job_id = ?", (job_id,)
+            ).fetchone()[0]
+            conn.execute("INSERT INTO job_logs (job_id, seq, ts, msg) VALUES (?, ?, ?, ?)", (job_id, seq, ts, msg))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.notifier.publish(job_id)
+        return seq
+
+    # -- steps and plans -----------------------------------------------
+    def save_step(self, job_id: str, step: str, result: Any) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO job_steps (job_id, step, result, finished_at) VALUES (?, ?, ?, ?)",
+            (job_id, step, json.dumps(result), time.time()),
+        )
+
+    def get_steps(self, job_id: str) -> Dict[str, Any]:
+        """Results of the job's completed steps, by step name."""
+        rows = self._conn().execute("SELECT step, result FROM job_steps WHERE job_id = ?", (job_id,))
+        return {step: json.loads(result) for step, result in rows}
+
+    def get_plan(self, key: str) -> Optional[str]:
+        row = self._conn().execute("SELECT plan FROM agent_plans WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def save_plan(self, key: str, plan: str) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO agent_plans (key, plan, created_at) VALUES (?, ?, ?)", (key, plan, time.time())
+        )
+
+    # -- reads ---------------------------------------------------------
+    def get_job(self, job_id: str, since: int = 0) -> Optional[Dict[str, Any]]:
+        """Job state plus log entries with ``seq > since``."""
+        conn = self._conn()
+        row = conn.execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = _row_to_job(row)
+        job["logs"] = [
+            {"seq": seq, "ts": ts, "msg": msg}
+            for seq, ts, msg in conn.execute(
+                "SELECT seq, ts, msg FROM job_logs WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, since)
+            )
+        ]
+        return job
+
+    def get_status(self, job_id: str) -> Optional[str]:
+        row = self._conn().execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def list_jobs(
+        self,
+        status: Optional[str] = None,
+        doc_id: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Newest-first page of job summaries and the cursor for the next page."""
+        where, params = [], []
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        if doc_id:
+            where.append("doc_id = ?")
+            params.append(doc_id)
+        if cursor:
+            created_at, last_id = _decode_cursor(cursor)
+            where.append("(created_at < ? OR (created_at = ? AND id < ?))")
+            params.extend([created_at, created_at, last_id])
+        sql = f"SELECT {_JOB_COLUMNS} FROM jobs"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        rows = self._conn().execute(sql, (*params, limit + 1)).fetchall()
+        jobs = [_row_to_job(r) for r in rows[:limit]]
+        next_cursor = _encode_cursor(jobs[-1]["created_at"], jobs[-1]["id"]) if len(rows) > limit else None
+        return jobs, next_cursor
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        now = time.time()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        oldest = conn.execute("SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        # queue wait of the last 100 claimed jobs
+        waits = [r[0] for r in conn.execute(
+            "SELECT started_at - created_at FROM jobs WHERE started_at IS NOT NULL"
+            " ORDER BY started_at DESC LIMIT 100"
+        ).fetchall()]
+        return {
+            "depth": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "completed": counts.get("completed", 0),
+            "failed": counts.get("failed", 0),
+            "oldest_queued_age_seconds": (now - oldest) if oldest else 0.0,
+            "wait_seconds_avg": (sum(waits) / len(waits)) if waits else 0.0,
+            "wait_seconds_max": max(waits) if waits else 0.0,
+        }
+
+    # -- retention -----------------------------------------------------
+    def active_doc_ids(self) -> Set[str]:
+        """Documents that queued or running jobs still need."""
+        rows = self._conn().execute("SELECT DISTINCT doc_id FROM jobs WHERE status IN ('queued', 'running')")
+        return {r[0] for r in rows}
+
+    def has_active_job(self, doc_id: str) -> bool:
+        return self._conn().execute(
+            "SELECT 1 FROM jobs WHERE doc_id = ? AND status IN ('queued', 'running') LIMIT 1", (doc_id,)
+        ).fetchone() is not None
+
+    def count_finished(self, before: float) -> int:
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN ('completed', 'failed') AND finished_at < ?", (before,)
+        ).fetchone()[0]
+
+    def purge_finished(self, before: float, limit: int) -> int:
+        """Delete up to ``limit`` jobs (and their logs) that finished before ``before``."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ids = [r[0] for r in conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('completed', 'failed') AND finished_at < ?"
+                " ORDER BY finished_at LIMIT ?",
+                (before, limit),
+            )]
+            conn.executemany("DELETE FROM job_logs WHERE job_id = ?", [(i,) for i in ids])
+            conn.executemany("DELETE FROM job_steps WHERE job_id = ?", [(i,) for i in ids])
+            conn.executemany("DELETE FROM jobs WHERE id = ?", [(i,) for i in ids])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(ids)
+
+    def purge_plans(self, before: float) -> int:
+        return self._conn().execute("DELETE FROM agent_plans WHERE created_at < ?", (before,)).rowcount
+
+    # -- migration -----------------------------------------------------
+    def import_legacy_json(self, folder: Path) -> int:
+        """Import pre-SQLite ``<job_id>.json`` files once; unfinished jobs are queued again."""
+        imported = 0
+        for f in folder.glob("*.json"):
+            try:
+                data = json.loads(f.read_text())
+                logs = data.get("logs") or []
+                created = logs[0]["ts"] if logs else f.stat().st_mtime
+                status = data.get("status") if data.get("status") in ("completed", "failed") else "queued"
+                conn = self._conn()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute(
+                        "INSERT OR IGNORE INTO jobs (id, doc_id, goal, status, created_at) VALUES (?, ?, ?, ?, ?)",
+                        (data["id"], data["doc_id"], data.get("goal", ""), status, created),
+                    )
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO job_logs (job_id, seq, ts, msg) VALUES (?, ?, ?, ?)",
+                        [(data["id"], i, entry["ts"], entry["msg"]) for i, entry in enumerate(logs, start=1)],
+                    )
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            except Exception:
+                _LOGGER.warning("Skipping unreadable legacy job file %s", f, exc_info=True)
+                continue
+            f.rename(f.with_name(f.name + ".migrated"))
+            imported += 1
+        return imported
+
+
+def _row_to_job(row) -> Dict[str, Any]:
+    job_id, doc_id, goal, status, created_at, started_at, finished_at, attempts = row
+    return {
+        "id": job_id,
+        "doc_id": doc_id,
+        "goal": goal,
+        "status": status,
+        "created_at": created_at,
+        "started_at": started_at,
+        "finished_at": finished_at,
+        "attempts": attempts,
+    }
+
+
+_store: Optional[JobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> JobStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = JobStore(STORE_PATH)
+            imported = _store.import_legacy_json(JOBS_DIR)
+            if imported:
+                _LOGGER.info("Imported %d legacy job files into %s", imported, STORE_PATH)
+        return _store
@@ -0,0 +1,164 @@
+# app/services/languagetool_pool.py
+import logging
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+_LOGGER = logging.getLogger(__name__)
+
+
+# a paragraph longer than this is cut at a line boundary, after a sentence end when possible
+MAX_PARAGRAPH_CHARS = 4000
+_SENTENCE_END = (".", "!", "?", ":", ";")
+
+
+def split_paragraphs(text: str, max_chars: int = MAX_PARAGRAPH_CHARS) -> List[Tuple[int, str]]:
+    """Split text into ``(offset, paragraph)`` pairs at blank lines.
+
+    Consecutive non-blank lines form one paragraph, line breaks included, so
+    a sentence wrapped over several lines (as PDF text is) is checked whole.
+    ``offset`` is the paragraph's start in ``text``, so a match at position
+    ``p`` inside a paragraph sits at ``offset + p`` in the document.
+    """
+    segments: List[Tuple[int, str]] = []
+    # (start, end) of each non-blank line of the current paragraph, end without the line break
+    lines: List[Tuple[int, int]] = []
+
+    def flush() -> None:
+        while lines:
+            cut = len(lines)
+            if lines[-1][1] - lines[0][0] > max_chars:
+                fitting = [i for i in range(1, len(lines)) if lines[i - 1][1] - lines[0][0] <= max_chars] or [1]
+                ends = [i for i in fitting if text[lines[i - 1][0]:lines[i - 1][1]].rstrip().endswith(_SENTENCE_END)]
+                cut = (ends or fitting)[-1]
+            start, end = lines[0][0], lines[cut - 1][1]
+            segments.append((start, text[start:end]))
+            del lines[:cut]
+
+    pos = 0
+    for line in text.splitlines(keepends=True):
+        body = line.rstrip("\r\n")
+        if body.strip():
+            lines.append((pos, pos + len(body)))
+        else:
+            flush()
+        pos += len(line)
+    flush()
+    return segments
+
+
+def _local_tool(language: str) -> Any:
+    # imported lazily: the package itself is slow to import
+    import language_tool_python
+
+    return language_tool_python.LanguageTool(language)
+
+
+class LanguageToolPool:
+    """Fixed set of LanguageTool backends shared by all callers.
+
+    Each backend is its own local server process. ``check_many`` spreads
+    segments over the backends in parallel; a backend whose process died is
+    replaced on its next checkout, or when a check fails because of it.
+    """
+
+    def __init__(self, size: int, language: str, factory: Optional[Callable[[], Any]] = None):
+        self.size = max(1, size)
+        self._factory = factory or (lambda: _local_tool(language))
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="languagetool")
+        self._idle: "queue.Queue[Any]" = queue.Queue()
+        self._lock = threading.Lock()
+        self.restarts = 0
+        self.segments_checked = 0
+        # servers start in parallel: JVM startup dominates
+        self._backends: List[Any] = list(self._executor.map(lambda _: self._factory(), range(self.size)))
+        for tool in self._backends:
+            self._idle.put(tool)
+
+    def check(self, text: str) -> List[Any]:
+        return self.check_many([text])[0]
+
+    def submit(self, text: str) -> "Future[List[Any]]":
+        """Queue one check; lets callers keep producing segments meanwhile."""
+        return self._executor.submit(self._check_one, text)
+
+    def check_many(self, texts: Sequence[str]) -> List[List[Any]]:
+        """Check each text on a pooled backend; results keep the input order."""
+        return list(self._executor.map(self._check_one, texts))
+
+    def check_health(self) -> Dict[str, Any]:
+        """Restart idle backends whose server is gone and report pool state."""
+        for _ in range(self._idle.qsize()):
+            try:
+                tool = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if not self._is_healthy(tool):
+                    tool = self._restart(tool, "server not running")
+            except Exception:
+                _LOGGER.exception("LanguageTool backend restart failed")
+            finally:
+                self._idle.put(tool)
+        return self.stats()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            backends = list(self._backends)
+        return {
+            "size": self.size,
+            "healthy": sum(1 for tool in backends if self._is_healthy(tool)),
+            "idle": self._idle.qsize(),
+            "restarts": self.restarts,
+            "segments_checked": self.segments_checked,
+        }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            backends, self._backends = self._backends, []
+        for tool in backends:
+            self._close_tool(tool)
+
+    def _check_one(self, text: str) -> List[Any]:
+        tool = self._idle.get()
+        try:
+            if not self._is_healthy(tool):
+                tool = self._restart(tool, "server not running")
+            try:
+                matches = tool.check(text)
+            except Exception as e:
+                if self._is_healthy(tool):
+                    raise
+                # the server crashed mid-request: replace it and retry once
+                tool = self._restart(tool, e)
+                matches = tool.check(text)
+            with self._lock:
+                self.segments_checked += 1
+            return matches
+        finally:
+            self._idle.put(tool)
+
+    def _restart(self, tool: Any, reason: Any) -> Any:
+        _LOGGER.warning("Restarting LanguageTool backend: %s", reason)
+        self._close_tool(tool)
+        fresh = self._factory()
+        with self._lock:
+            self._backends = [fresh if b is tool else b for b in self._backends]
+            self.restarts += 1
+        return fresh
+
+    @staticmethod
+    def _is_healthy(tool: Any) -> bool:
+        if getattr(tool, "_remote", False):
+            return True
+        alive = getattr(tool, "_server_is_alive", None)
+        return alive() if callable(alive) else True
+
+    @staticmethod
+    def _close_tool(tool: Any) -> None:
+        try:
+            tool.close()
+        except Exception:
+            _LOGGER.debug("Closing LanguageTool backend failed", exc_info=True)
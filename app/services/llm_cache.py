@@ -0,0 +1,131 @@
+# app/services/llm_cache.py
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.config import (
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_PATH,
+    LLM_CACHE_MEMORY_ITEMS,
+    LLM_CACHE_MAX_ROWS,
+    LLM_CACHE_TTL_SECONDS,
+)
+from app.utils.lru_cache import LRUCache
+
+_LOGGER = logging.getLogger(__name__)
+
+# prune the disk tier every N writes rather than on every insert
+_PRUNE_EVERY = 100
+
+
+def make_key(model: str, endpoint: str, prompt: str, temperature: float, max_tokens: int) -> str:
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    raw = json.dumps([model, endpoint, prompt_hash, temperature, max_tokens])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Two-tier cache of model responses: in-memory LRU over a SQLite table.
+
+    Entries expire after ``ttl`` seconds; the disk tier is trimmed to
+    ``max_rows`` by least recent access.
+    """
+
+    def __init__(self, path: Path, memory_items: int, max_rows: int, ttl: float):
+        self.path = Path(path)
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self._memory = LRUCache(max_items=memory_items)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed_at)")
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            value, created_at = entry
+            if now - created_at < self.ttl:
+                return value
+            self._memory.pop(key)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] >= self.ttl:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.disk_hits += 1
+        self._memory.set(key, (row[0], row[1]))
+        return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        self._memory.set(key, (value, now))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._writes += 1
+            if self._writes % _PRUNE_EVERY == 0:
+                self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        self._conn.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            " SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        memory = self._memory.stats()
+        with self._lock:
+            rows = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = memory["hits"] + self.disk_hits + self.misses
+        return {
+            "memory_hits": memory["hits"],
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": ((memory["hits"] + self.disk_hits) / lookups) if lookups else 0.0,
+            "memory_entries": memory["entries"],
+            "disk_entries": rows,
+        }
+
+
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[LLMResponseCache]:
+    """Process-wide cache, or None when disabled or the database cannot be opened."""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = LLMResponseCache(
+                    LLM_CACHE_PATH, LLM_CACHE_MEMORY_ITEMS, LLM_CACHE_MAX_ROWS, LLM_CACHE_TTL_SECONDS
+                )
+            except sqlite3.Error:
+                _LOGGER.exception("LLM response cache unavailable at %s", LLM_CACHE_PATH)
+                return None
+        return _cache
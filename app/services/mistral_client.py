@@ -1,12 +1,31 @@
-import os
+import asyncio
+import importlib.util
+import json
 import logging
+import random
+import threading
+import time
 import httpx
-from typing import Optional
+from typing import Any, AsyncIterator, Coroutine, List, Optional
 
-_LOGGER = logging.getLogger(__name__)
+from app.config import (
+    MISTRAL_API_KEY,
+    MISTRAL_BASE_URL,
+    MISTRAL_TIMEOUT,
+    MISTRAL_MAX_CONNECTIONS,
+    MISTRAL_MAX_KEEPALIVE,
+    MISTRAL_KEEPALIVE_EXPIRY,
+    MISTRAL_HTTP2,
+    MISTRAL_MAX_ATTEMPTS,
+    MISTRAL_BACKOFF_BASE,
+    MISTRAL_RATE_PER_MINUTE,
+    MISTRAL_BURST,
+)
+from app.services import tracing
+from app.services.llm_cache import LLMResponseCache, get_cache, make_key
+from app.services.mistral_scheduler import INTERACTIVE, RequestScheduler
 
-MISTRAL_API_KEY = os.environ.get("MISTRAL_API_KEY") or os.environ.get("OPENAI_API_KEY")
-MISTRAL_BASE_URL = os.environ.get("MISTRAL_BASE_URL", "https://api.mistral.ai")
+_LOGGER = logging.getLogger(__name__)
 
 
 def _extract_text_from_response(data: dict) -> Optional[str]:
@@ -58,100 +77,418 @@ def _extract_text_from_response(data: dict) -> Optional[str]:
     return None
 
 
-def generate_text(
-    prompt: str,
-    model: str = "mistral-medium",
-    max_tokens: int = 1000,
-    temperature: float = 0.0,
-) -> str:
-    """Call Mistral API. Try model generate endpoint first, fall back to chat/completions.
+def _sse_data(line: str) -> Optional[str]:
+    """Payload of an SSE ``data:`` line; None for comments, other fields and blank lines."""
+    if not line.startswith("data:"):
+        return None
+    return line[5:].strip()
 
-    Some Mistral models expect `/v1/models/{model}/generate` while others (chat-style)
-    use `/v1/chat/completions`. This function attempts both and returns extracted text.
+
+def _delta_text(data: dict) -> str:
+    # streamed chat completions: {"choices": [{"delta": {"content": "..."}}]}
+    choices = data.get("choices")
+    if choices and isinstance(choices, list) and isinstance(choices[0], dict):
+        delta = choices[0].get("delta") or {}
+        content = delta.get("content") if isinstance(delta, dict) else None
+        if isinstance(content, str):
+            return content
+    return ""
+
+
+class _EndpointNotFound(Exception):
+    pass
+
+
+class _RawResponse(str):
+    """A response body with no recognizable completion text; returned as-is, never cached."""
+
+
+class MistralClient:
+    """Pooled async Mistral client shared by the whole process.
+
+    The ``httpx.AsyncClient`` lives on a dedicated event-loop thread, so async
+    routes (``agenerate_text``) and background worker threads
+    (``generate_text``) share one keep-alive connection pool instead of paying
+    a TCP+TLS handshake per call. Backoff uses ``asyncio.sleep`` and never
+    blocks the caller's event loop.
     """
-    if not MISTRAL_API_KEY:
-        raise RuntimeError("Mistral API key not configured")
 
-    headers = {"Authorization": f"Bearer {MISTRAL_API_KEY}", "Content-Type": "application/json"}
+    def __init__(
+        self,
+        api_key: Optional[str],
+        base_url: str,
+        timeout: float = MISTRAL_TIMEOUT,
+        max_connections: int = MISTRAL_MAX_CONNECTIONS,
+        max_keepalive: int = MISTRAL_MAX_KEEPALIVE,
+        keepalive_expiry: float = MISTRAL_KEEPALIVE_EXPIRY,
+        http2: bool = MISTRAL_HTTP2,
+        max_attempts: int = MISTRAL_MAX_ATTEMPTS,
+        backoff_base: float = MISTRAL_BACKOFF_BASE,
+        cache: Optional[LLMResponseCache] = None,
+        scheduler: Optional[RequestScheduler] = None,
+    ):
+        self.api_key = api_key
+        self.cache = cache
+        self.scheduler = scheduler
+        self.base_url = base_url.rstrip("/")
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._timeout = timeout
+        # HTTP/2 needs the optional `h2` package; fall back to HTTP/1.1 keep-alive
+        self._http2 = http2 and importlib.util.find_spec("h2") is not None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._lock = threading.Lock()
+
+    # -- lifecycle -----------------------------------------------------
+    def start(self) -> None:
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def _run():
+                asyncio.set_event_loop(loop)
+                self._client = httpx.AsyncClient(
+                    timeout=self._timeout, limits=self._limits, http2=self._http2
+                )
+                ready.set()
+                loop.run_forever()
 
-    # First try model generate endpoint
-    gen_url = f"{MISTRAL_BASE_URL.rstrip('/')}/v1/models/{model}/generate"
-    gen_payload = {"input": prompt, "temperature": temperature, "max_new_tokens": max_tokens}
+            self._thread = threading.Thread(target=_run, name="mistral-client", daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._loop = loop
 
-    import time
-    import random
+    def close(self) -> None:
+        with self._lock:
+            loop, self._loop = self._loop, None
+            if loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join(timeout=5)
+            loop.close()
+            self._client = None
 
-    # Simple retry logic with exponential backoff for transient errors (429, 5xx)
-    max_attempts = 5
-    backoff_base = 1.0
+    def run_sync(self, coro: Coroutine[Any, Any, Any]) -> Any:
+        """Run ``coro`` on the client loop from a synchronous thread and wait for it."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
 
-    with httpx.Client(timeout=30.0) as client:
-        # Try model generate endpoint first
-        for attempt in range(1, max_attempts + 1):
+    async def run_async(self, coro: Coroutine[Any, Any, Any]) -> Any:
+        """Await ``coro`` on the client loop from any other event loop."""
+        self.start()
+        if asyncio.get_running_loop() is self._loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._loop))
+
+    # -- API -----------------------------------------------------------
+    def generate_text(self, prompt: str, **kwargs) -> str:
+        return self.run_sync(self._generate(prompt, **kwargs))
+
+    async def agenerate_text(self, prompt: str, **kwargs) -> str:
+        return await self.run_async(self._generate(prompt, **kwargs))
+
+    async def astream_text(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """Yield text deltas of a streamed chat completion as they arrive.
+
+        The request runs on the client loop; deltas are handed over to the
+        caller's loop one by one. Closing the iterator cancels the request.
+        """
+        self.start()
+        caller = asyncio.get_running_loop()
+        if caller is self._loop:
+            async for delta in self._stream(prompt, **kwargs):
+                yield delta
+            return
+
+        queue: "asyncio.Queue[tuple]" = asyncio.Queue()
+
+        def hand_over(item: tuple) -> None:
+            try:
+                caller.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                pass  # the caller's loop is gone
+
+        async def pump() -> None:
+            try:
+                async for delta in self._stream(prompt, **kwargs):
+                    hand_over(("delta", delta))
+            except BaseException as e:
+                hand_over(("error", e))
+                raise
+            hand_over(("end", None))
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind == "delta":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            future.cancel()
+
+    async def _generate(
+        self,
+        prompt: str,
+        model: str = "mistral-medium",
+        max_tokens: int = 1000,
+        temperature: float = 0.0,
+        use_cache: bool = True,
+        priority: int = INTERACTIVE,
+    ) -> str:
+        if not self.api_key:
+            raise RuntimeError("Mistral API key not configured")
+
+        # only deterministic calls are cacheable; a sampled answer is not "the" answer
+        cache_key = None
+        if use_cache and self.cache is not None and temperature == 0.0:
+            cache_key = make_key(model, self.base_url, prompt, temperature, max_tokens)
+            # SQLite reads (and the hit's bookkeeping UPDATE) stay off the shared loop
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                return cached
+        text = await self._generate_uncached(prompt, model, max_tokens, temperature, priority)
+        tracing.MISTRAL_PROMPT_CHARS.observe(len(prompt), mode="generate")
+        tracing.MISTRAL_COMPLETION_CHARS.observe(len(text), mode="generate")
+        if cache_key is not None and not isinstance(text, _RawResponse):
+            await asyncio.to_thread(self.cache.set, cache_key, text)
+        return text
+
+    async def _generate_uncached(self, prompt: str, model: str, max_tokens: int, temperature: float, priority: int) -> str:
+        # timed here rather than in generate_text so LLM-cache hits don't count as Mistral time;
+        # the client loop runs this in a copy of the caller's context, so collect() still sees it
+        with tracing.stage("mistral"):
+            # First try model generate endpoint
+            gen_url = f"{self.base_url}/v1/models/{model}/generate"
+            gen_payload = {"input": prompt, "temperature": temperature, "max_new_tokens": max_tokens}
+            try:
+                return await self._post_with_retries(gen_url, gen_payload, "generate", priority, not_found_ok=True)
+            except _EndpointNotFound:
+                tracing.MISTRAL_FALLBACKS.inc()
+                _LOGGER.debug("Generate endpoint not found for model %s, trying chat fallback", model)
+
+            # Fallback: try chat/completions endpoint
+            chat_url = f"{self.base_url}/v1/chat/completions"
+            chat_payload = {
+                "model": model,
+                "messages": [{"role": "user", "content": prompt}],
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+            }
+            return await self._post_with_retries(chat_url, chat_payload, "chat/completions", priority)
+
+    async def _post_with_retries(self, url: str, payload: dict, label: str, priority: int, not_found_ok: bool = False) -> str:
+        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        # Simple retry logic with exponential backoff for transient errors (429, 5xx);
+        # the shared scheduler gates every attempt and absorbs Retry-After pauses
+        for attempt in range(1, self.max_attempts + 1):
+            retry_after = None
             try:
-                resp = client.post(gen_url, json=gen_payload, headers=headers)
+                if self.scheduler is not None:
+                    await self.scheduler.acquire(priority)
+                t0 = time.perf_counter()
+                resp = await self._client.post(url, json=payload, headers=headers)
+                tracing.MISTRAL_REQUEST_SECONDS.observe(time.perf_counter() - t0, endpoint=label, status=resp.status_code)
+                if self.scheduler is not None:
+                    retry_after = self.scheduler.observe(resp.status_code, resp.headers)
                 resp.raise_for_status()
                 data = resp.json()
                 text = _extract_text_from_response(data)
-                return text if text is not None else str(data)
+                return text if text is not None else _RawResponse(data)
             except httpx.HTTPStatusError as e:
                 status = e.response.status_code
-                # If endpoint not found, break and try fallback
-                if status == 404:
-                    _LOGGER.debug("Generate endpoint not found for model %s, trying chat fallback", model)
-                    break
+                # If endpoint not found, let the caller try the fallback
+                if status == 404 and not_found_ok:
+                    raise _EndpointNotFound() from e
                 # Retry on rate limit or server errors
                 if status == 429 or 500 <= status < 600:
-                    if attempt == max_attempts:
-                        _LOGGER.exception("Mistral generate endpoint failed after %d attempts: %s", attempt, e)
+                    if attempt == self.max_attempts:
+                        _LOGGER.exception("Mistral %s failed after %d attempts: %s", label, attempt, e)
                         raise
-                    sleep = backoff_base * (2 ** (attempt - 1)) + random.uniform(0, 0.5)
-                    _LOGGER.warning("Mistral generate rate-limited/server error (status=%s). Retrying in %.1fs (attempt %d/%d)", status, sleep, attempt, max_attempts)
-                    time.sleep(sleep)
+                    tracing.MISTRAL_RETRIES.inc(endpoint=label, reason=status)
+                    if retry_after:
+                        # the scheduler is already holding every caller until the server's deadline
+                        _LOGGER.warning("Mistral %s rate-limited (status=%s). Server asked to retry in %.1fs (attempt %d/%d)", label, status, retry_after, attempt, self.max_attempts)
+                        continue
+                    sleep = self._backoff(attempt)
+                    tracing.MISTRAL_BACKOFF_SECONDS.inc(sleep, endpoint=label)
+                    _LOGGER.warning("Mistral %s rate-limited/server error (status=%s). Retrying in %.1fs (attempt %d/%d)", label, status, sleep, attempt, self.max_attempts)
+                    await asyncio.sleep(sleep)
                     continue
                 # Other client errors - do not retry
-                _LOGGER.exception("Mistral generate endpoint returned client error: %s", e)
+                _LOGGER.exception("Mistral %s returned client error: %s", label, e)
                 raise
             except Exception:
-                if attempt == max_attempts:
-                    _LOGGER.exception("Unexpected error calling Mistral generate endpoint (final attempt)")
+                if attempt == self.max_attempts:
+                    _LOGGER.exception("Unexpected error calling Mistral %s (final attempt)", label)
                     raise
-                sleep = backoff_base * (2 ** (attempt - 1)) + random.uniform(0, 0.5)
-                _LOGGER.warning("Unexpected error calling Mistral generate endpoint. Retrying in %.1fs (attempt %d/%d)", sleep, attempt, max_attempts)
-                time.sleep(sleep)
+                sleep = self._backoff(attempt)
+                tracing.MISTRAL_RETRIES.inc(endpoint=label, reason="error")
+                tracing.MISTRAL_BACKOFF_SECONDS.inc(sleep, endpoint=label)
+                _LOGGER.warning("Unexpected error calling Mistral %s. Retrying in %.1fs (attempt %d/%d)", label, sleep, attempt, self.max_attempts)
+                await asyncio.sleep(sleep)
 
-        # Fallback: try chat/completions endpoint
-        chat_url = f"{MISTRAL_BASE_URL.rstrip('/')}/v1/chat/completions"
-        chat_payload = {
+    async def _stream(
+        self,
+        prompt: str,
+        model: str = "mistral-medium",
+        max_tokens: int = 1000,
+        temperature: float = 0.0,
+        use_cache: bool = True,
+        priority: int = INTERACTIVE,
+    ) -> AsyncIterator[str]:
+        if not self.api_key:
+            raise RuntimeError("Mistral API key not configured")
+
+        cache_key = None
+        if use_cache and self.cache is not None and temperature == 0.0:
+            cache_key = make_key(model, self.base_url, prompt, temperature, max_tokens)
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        url = f"{self.base_url}/v1/chat/completions"
+        payload = {
             "model": model,
             "messages": [{"role": "user", "content": prompt}],
             "temperature": temperature,
             "max_tokens": max_tokens,
+            "stream": True,
         }
-
-        for attempt in range(1, max_attempts + 1):
+        headers = {"Authorization": f"Bearer {self.api_key}", "Accept": "text/event-stream"}
+        parts: List[str] = []
+        for attempt in range(1, self.max_attempts + 1):
+            retry_after = None
             try:
-                resp = client.post(chat_url, json=chat_payload, headers=headers)
-                resp.raise_for_status()
-                data = resp.json()
-                text = _extract_text_from_response(data)
-                return text if text is not None else str(data)
-            except httpx.HTTPStatusError as e:
-                status = e.response.status_code
-                if status == 429 or 500 <= status < 600:
-                    if attempt == max_attempts:
-                        _LOGGER.exception("Mistral chat/completions failed after %d attempts: %s", attempt, e)
-                        raise
-                    sleep = backoff_base * (2 ** (attempt - 1)) + random.uniform(0, 0.5)
-                    _LOGGER.warning("Mistral chat/completions rate-limited/server error (status=%s). Retrying in %.1fs (attempt %d/%d)", status, sleep, attempt, max_attempts)
-                    time.sleep(sleep)
-                    continue
-                _LOGGER.exception("Mistral chat/completions returned client error: %s", e)
-                raise
-            except Exception as e:
-                if attempt == max_attempts:
-                    _LOGGER.exception("Unexpected error calling Mistral chat/completions (final attempt): %s", e)
+                if self.scheduler is not None:
+                    await self.scheduler.acquire(priority)
+                t0 = time.perf_counter()
+                async with self._client.stream("POST", url, json=payload, headers=headers) as resp:
+                    tracing.MISTRAL_REQUEST_SECONDS.observe(time.perf_counter() - t0, endpoint="chat/completions:stream", status=resp.status_code)
+                    if self.scheduler is not None:
+                        retry_after = self.scheduler.observe(resp.status_code, resp.headers)
+                    resp.raise_for_status()
+                    async for line in resp.aiter_lines():
+                        data = _sse_data(line)
+                        if not data:
+                            continue
+                        if data == "[DONE]":
+                            break
+                        delta = _delta_text(json.loads(data))
+                        if delta:
+                            parts.append(delta)
+                            yield delta
+                break
+            except (httpx.HTTPStatusError, httpx.TransportError) as e:
+                status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+                retryable = status is None or status == 429 or 500 <= status < 600
+                # text already handed out cannot be taken back: only retry before the first delta
+                if parts or not retryable or attempt == self.max_attempts:
+                    _LOGGER.exception("Mistral chat stream failed (attempt %d/%d)", attempt, self.max_attempts)
                     raise
-                sleep = backoff_base * (2 ** (attempt - 1)) + random.uniform(0, 0.5)
-                _LOGGER.warning("Unexpected error calling Mistral chat/completions. Retrying in %.1fs (attempt %d/%d)", sleep, attempt, max_attempts)
-                time.sleep(sleep)
+                tracing.MISTRAL_RETRIES.inc(endpoint="chat/completions:stream", reason=status or "error")
+                if retry_after:
+                    _LOGGER.warning("Mistral chat stream rate-limited (status=%s). Server asked to retry in %.1fs (attempt %d/%d)", status, retry_after, attempt, self.max_attempts)
+                    continue
+                sleep = self._backoff(attempt)
+                tracing.MISTRAL_BACKOFF_SECONDS.inc(sleep, endpoint="chat/completions:stream")
+                _LOGGER.warning("Mistral chat stream failed (status=%s). Retrying in %.1fs (attempt %d/%d)", status, sleep, attempt, self.max_attempts)
+                await asyncio.sleep(sleep)
+
+        tracing.MISTRAL_PROMPT_CHARS.observe(len(prompt), mode="stream")
+        tracing.MISTRAL_COMPLETION_CHARS.observe(sum(map(len, parts)), mode="stream")
+        if cache_key is not None and parts:
+            await asyncio.to_thread(self.cache.set, cache_key, "".join(parts).strip())
+
+    def _backoff(self, attempt: int) -> float:
+        return self.backoff_base * (2 ** (attempt - 1)) + random.uniform(0, 0.5 * self.backoff_base)
+
+
+_client: Optional[MistralClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> MistralClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            scheduler = RequestScheduler(MISTRAL_RATE_PER_MINUTE, MISTRAL_BURST) if MISTRAL_RATE_PER_MINUTE > 0 else None
+            _client = MistralClient(MISTRAL_API_KEY, MISTRAL_BASE_URL, cache=get_cache(), scheduler=scheduler)
+        return _client
+
+
+def close_client() -> None:
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
+
+
+def generate_text(
+    prompt: str,
+    model: str = "mistral-medium",
+    max_tokens: int = 1000,
+    temperature: float = 0.0,
+    use_cache: bool = True,
+    priority: int = INTERACTIVE,
+) -> str:
+    """Call Mistral API. Try model generate endpoint first, fall back to chat/completions.
+
+    Some Mistral models expect `/v1/models/{model}/generate` while others (chat-style)
+    use `/v1/chat/completions`. This function attempts both and returns extracted text.
+    Deterministic (temperature 0) responses are served from the response cache
+    unless `use_cache=False`. `priority` picks the scheduler lane (INTERACTIVE
+    or BACKGROUND). Blocking wrapper for worker threads; async code
+    should use `agenerate_text`.
+    """
+    return get_client().generate_text(
+        prompt, model=model, max_tokens=max_tokens, temperature=temperature, use_cache=use_cache, priority=priority
+    )
+
+
+async def agenerate_text(
+    prompt: str,
+    model: str = "mistral-medium",
+    max_tokens: int = 1000,
+    temperature: float = 0.0,
+    use_cache: bool = True,
+    priority: int = INTERACTIVE,
+) -> str:
+    """Async variant of `generate_text` that never blocks the calling event loop."""
+    return await get_client().agenerate_text(
+        prompt, model=model, max_tokens=max_tokens, temperature=temperature, use_cache=use_cache, priority=priority
+    )
+
+
+async def astream_text(
+    prompt: str,
+    model: str = "mistral-medium",
+    max_tokens: int = 1000,
+    temperature: float = 0.0,
+    use_cache: bool = True,
+    priority: int = INTERACTIVE,
+) -> AsyncIterator[str]:
+    """Stream a chat completion (`stream: true`) as text deltas.
+
+    Retries (429/5xx/connection errors) happen only before the first delta.
+    A cached deterministic answer is yielded as a single delta.
+    """
+    async for delta in get_client().astream_text(
+        prompt, model=model, max_tokens=max_tokens, temperature=temperature, use_cache=use_cache, priority=priority
+    ):
+        yield delta
@@ -0,0 +1,139 @@
+# app/services/mistral_scheduler.py
+import asyncio
+import email.utils
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+_LOGGER = logging.getLogger(__name__)
+
+# Priority lanes: lower value is served first
+INTERACTIVE = 0
+BACKGROUND = 1
+_LANE_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+
+def _parse_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a delay header given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class RequestScheduler:
+    """Process-wide token bucket in front of every Mistral HTTP request.
+
+    Callers ``await acquire(priority)`` before each attempt. Tokens refill at
+    ``rate_per_minute`` up to ``burst``; when none are left, waiters queue by
+    priority lane (interactive before background, FIFO within a lane).
+    ``observe`` feeds ``Retry-After`` and rate-limit headers back in so one
+    429 pauses every caller instead of each retrying on its own.
+
+    Must be used from a single event loop (the Mistral client loop).
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(max(1, burst))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.granted = 0
+        self.throttled = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def acquire(self, priority: int = INTERACTIVE) -> None:
+        start = time.monotonic()
+        if not self._waiters and self._try_take():
+            self._record_wait(0.0)
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        await fut
+        self._record_wait(time.monotonic() - start)
+
+    def observe(self, status: int, headers: Mapping[str, str]) -> Optional[float]:
+        """Adapt to the server's view of our limits; returns the Retry-After delay if any."""
+        delay = _parse_seconds(headers.get("retry-after"))
+        if status == 429:
+            self.throttled += 1
+            if delay is None:
+                delay = _parse_seconds(headers.get("x-ratelimit-reset") or headers.get("ratelimit-reset"))
+        remaining = headers.get("x-ratelimit-remaining-req-minute") or headers.get("ratelimit-remaining")
+        if delay is None and remaining is not None and remaining.strip() == "0":
+            # quota for this window is spent: wait for the advertised reset or one token
+            delay = _parse_seconds(headers.get("ratelimit-reset")) or (1.0 / self.rate if self.rate > 0 else 1.0)
+        if delay:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            # the bucket starts refilling only once the pause is over
+            self._tokens = 0.0
+            self._updated = max(self._updated, self._paused_until)
+            _LOGGER.warning("Mistral rate limit reached, pausing all requests for %.1fs", delay)
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        depth = {name: 0 for name in _LANE_NAMES.values()}
+        for priority, _, fut in list(self._waiters):
+            lane = _LANE_NAMES.get(priority, str(priority))
+            if not fut.done():
+                depth[lane] = depth.get(lane, 0) + 1
+        return {
+            "queue_depth": depth,
+            "granted": self.granted,
+            "throttled": self.throttled,
+            "wait_seconds_avg": (self.wait_total / self.granted) if self.granted else 0.0,
+            "wait_seconds_max": self.wait_max,
+            "paused_for": max(0.0, self._paused_until - time.monotonic()),
+        }
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _try_take(self) -> bool:
+        if time.monotonic() < self._paused_until:
+            return False
+        self._refill()
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+    def _record_wait(self, waited: float) -> None:
+        self.granted += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+
+    async def _dispatch(self) -> None:
+        while self._waiters:
+            # drop callers that gave up (cancelled/timed out) while queued
+            while self._waiters and self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+            if not self._waiters:
+                break
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            if self._try_take():
+                _, _, fut = heapq.heappop(self._waiters)
+                fut.set_result(None)
+                continue
+            await asyncio.sleep((1.0 - self._tokens) / self.rate if self.rate > 0 else 1.0)
@@ -0,0 +1,429 @@
+# app/services/retention_service.py
+"""Background retention for everything written under ``UPLOAD_DIR``.
+
+A sweep runs these phases in order:
+
+1. documents not accessed for ``document_ttl`` are deleted; the fixed output
+   of documents not accessed for ``fixed_ttl`` is dropped
+2. jobs that finished more than ``job_ttl`` ago are purged from the job
+   store (with cached agent plans of that age), and OCR cache files older
+   than ``cache_ttl`` are removed
+3. while usage is above ``max_bytes``, whole documents are evicted, least
+   recently accessed first
+4. blobs that no remaining document refers to are removed, together with
+   the artefacts derived from them
+
+Documents that queued or running jobs refer to are never deleted, and each
+deletion re-checks that no job picked the document up and nobody read it
+since it was scanned. Work is
+done in batches of ``batch_size`` entries with a pause after each batch, on
+the sweeper's own thread, so a sweep never holds up request handling. With
+``dry_run`` a sweep only reports what it would remove.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from app.config import (
+    OCR_CACHE_DIR,
+    RETENTION_BATCH_PAUSE_SECONDS,
+    RETENTION_BATCH_SIZE,
+    RETENTION_CACHE_TTL_SECONDS,
+    RETENTION_DOCUMENT_TTL_SECONDS,
+    RETENTION_FIXED_TTL_SECONDS,
+    RETENTION_INTERVAL_SECONDS,
+    RETENTION_JOB_TTL_SECONDS,
+    RETENTION_MAX_BYTES,
+)
+from app.services import blob_store, storage_service, tracing
+from app.services.job_store import JobStore, get_store
+
+_LOGGER = logging.getLogger(__name__)
+
+# uploads younger than this may not have their manifest yet, and a new blob
+# may not be linked yet: neither is considered for deletion
+_GRACE_SECONDS = 3600.0
+# removed doc_ids listed in a report
+_REPORT_LIMIT = 100
+
+
+class _Interrupted(Exception):
+    pass
+
+
+class _DocInfo(NamedTuple):
+    doc_id: str
+    last_access: float
+    own_bytes: int  # files only this folder holds: manifest, fixed output, copied originals
+    fixed_bytes: int
+    digest: Optional[str]
+    hard_linked: bool  # the original is a hard link to its blob
+
+
+class _BlobInfo(NamedTuple):
+    paths: Tuple[Path, ...]  # the blob and its artefacts
+    size: int
+    mtime: float
+    nlink: int  # of the blob itself; 0 when only artefacts are left
+
+
+class RetentionSweeper:
+    def __init__(
+        self,
+        store: Optional[JobStore] = None,
+        document_ttl: float = RETENTION_DOCUMENT_TTL_SECONDS,
+        fixed_ttl: float = RETENTION_FIXED_TTL_SECONDS,
+        job_ttl: float = RETENTION_JOB_TTL_SECONDS,
+        cache_ttl: float = RETENTION_CACHE_TTL_SECONDS,
+        max_bytes: int = RETENTION_MAX_BYTES,
+        interval: float = RETENTION_INTERVAL_SECONDS,
+        batch_size: int = RETENTION_BATCH_SIZE,
+        pause: float = RETENTION_BATCH_PAUSE_SECONDS,
+        cache_dir: Path = OCR_CACHE_DIR,
+    ):
+        self._store = store
+        self.document_ttl = document_ttl
+        self.fixed_ttl = fixed_ttl
+        self.job_ttl = job_ttl
+        self.cache_ttl = cache_ttl
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.pause = pause
+        self.cache_dir = Path(cache_dir)
+        self._sweep_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._ops = 0
+        self._stats: Dict[str, Any] = {"sweeps": 0, "reclaimed_bytes_total": 0, "last": None}
+
+    @property
+    def store(self) -> JobStore:
+        if self._store is None:
+            self._store = get_store()
+        return self._store
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="retention-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def _loop(self) -> None:
+        # first sweep one interval after startup, not while the app is warming up
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:
+                _LOGGER.exception("Retention sweep failed")
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats)
+
+    def sweep(self, dry_run: bool = False) -> Dict[str, Any]:
+        """Run one sweep (or, with ``dry_run``, report what it would remove)."""
+        with self._sweep_lock:
+            t0 = time.perf_counter()
+            report: Dict[str, Any] = {
+                "dry_run": dry_run,
+                "started_at": time.time(),
+                "reclaimed_bytes": 0,
+                "usage_bytes": 0,
+                "quota_bytes": self.max_bytes,
+                "deleted": {"documents": 0, "fixed": 0, "jobs": 0, "plans": 0, "blobs": 0, "cache_files": 0, "tmp_files": 0},
+                "evicted_for_quota": 0,
+                "protected_active": 0,
+                "interrupted": False,
+                "documents": [],
+            }
+            try:
+                _Sweep(self, report, dry_run).run()
+            except _Interrupted:
+                report["interrupted"] = True
+            report["duration_seconds"] = time.perf_counter() - t0
+            tracing.record("retention", report["duration_seconds"])
+            if not dry_run:
+                self._stats["sweeps"] += 1
+                self._stats["reclaimed_bytes_total"] += report["reclaimed_bytes"]
+                self._stats["last"] = {k: v for k, v in report.items() if k != "documents"}
+            _LOGGER.info(
+                "Retention sweep%s: %d bytes reclaimed, %d documents, %d jobs, %d blobs in %.2fs",
+                " (dry run)" if dry_run else "",
+                report["reclaimed_bytes"],
+                report["deleted"]["documents"],
+                report["deleted"]["jobs"],
+                report["deleted"]["blobs"],
+                report["duration_seconds"],
+            )
+            return report
+
+    def _tick(self) -> None:
+        # called once per entry looked at: pause after every batch
+        self._ops += 1
+        if self._ops % self.batch_size == 0:
+            self._pause()
+
+    def _pause(self) -> None:
+        if self._stop.is_set():
+            raise _Interrupted()
+        if self.pause:
+            time.sleep(self.pause)
+
+
+class _Sweep:
+    """State of one sweep; see the module docstring for the phases."""
+
+    def __init__(self, sweeper: RetentionSweeper, report: Dict[str, Any], dry_run: bool):
+        self.s = sweeper
+        self.report = report
+        self.dry_run = dry_run
+        self.now = report["started_at"]
+        self.docs: Dict[str, _DocInfo] = {}
+        self.refs: Counter = Counter()
+        # hard links to a blob that this sweep removed (or would remove)
+        self.unlinked: Counter = Counter()
+        # a folder whose blob is unknown (fresh upload, unreadable): blobs are left alone
+        self.uncertain = False
+
+    def run(self) -> None:
+        self._scan_documents()
+        # read after the (slow) scan so jobs created meanwhile are seen
+        active = self.s.store.active_doc_ids()
+        self._expire_documents(active)
+        self._purge_jobs()
+        cache_bytes = self._expire_files(self._walk(self.s.cache_dir), self.s.cache_ttl, "cache_files")
+        blobs = self._scan_blobs()
+        jobs_bytes = sum(st.st_size for _, st in self._walk(self.s.store.path.parent))
+        usage = cache_bytes + jobs_bytes + sum(d.own_bytes for d in self.docs.values())
+        usage += sum(b.size for digest, b in blobs.items() if self.refs[digest] > 0)
+        self.report["usage_bytes"] = self._enforce_quota(usage, blobs, active)
+        self._remove_blobs(blobs)
+
+    # -- documents -----------------------------------------------------
+    def _scan_documents(self) -> None:
+        for doc_id in storage_service.iter_doc_ids():
+            self.s._tick()
+            try:
+                info = self._inspect(doc_id)
+            except FileNotFoundError:
+                continue  # deleted meanwhile
+            except Exception:
+                _LOGGER.exception("Retention: could not inspect document %s", doc_id)
+                info = None
+            if info is None:
+                self.uncertain = True
+                continue
+            self.docs[doc_id] = info
+            if info.digest:
+                self.refs[info.digest] += 1
+
+    def _inspect(self, doc_id: str) -> Optional[_DocInfo]:
+        folder = storage_service.UPLOAD_DIR / doc_id
+        # read before get_manifest: a backfill rewrites the manifest and bumps the folder mtime
+        last_access = storage_service.last_access(doc_id)
+        if not (folder / storage_service.MANIFEST_NAME).exists() and self.now - last_access < _GRACE_SECONDS:
+            return None
+        manifest = storage_service.get_manifest(doc_id) or {}
+        own = fixed = 0
+        hard_linked = False
+        for f in folder.iterdir():
+            st = f.lstat()
+            if f.is_symlink():
+                continue
+            if f.name == manifest.get("filename") and st.st_nlink > 1:
+                hard_linked = True
+                continue
+            own += st.st_size
+            if f.name == manifest.get("fixed"):
+                fixed = st.st_size
+        return _DocInfo(doc_id, last_access, own, fixed, manifest.get("sha256"), hard_linked)
+
+    def _expire_documents(self, active: Set[str]) -> None:
+        document_ttl, fixed_ttl = self.s.document_ttl, self.s.fixed_ttl
+        for doc in list(self.docs.values()):
+            self.s._tick()
+            idle = self.now - doc.last_access
+            if doc.doc_id in active:
+                self.report["protected_active"] += 1
+            elif document_ttl and idle > document_ttl:
+                self._remove_document(doc)
+            elif fixed_ttl and doc.fixed_bytes and idle > fixed_ttl and self._still_removable(doc):
+                last_access = doc.last_access
+                if not self.dry_run:
+                    storage_service.delete_fixed(doc.doc_id)
+                    # rewriting the manifest bumped the folder mtime; that was us, not a reader
+                    last_access = self._last_access(doc.doc_id) or last_access
+                self.report["deleted"]["fixed"] += 1
+                self.report["reclaimed_bytes"] += doc.fixed_bytes
+                self.docs[doc.doc_id] = doc._replace(
+                    last_access=last_access, own_bytes=doc.own_bytes - doc.fixed_bytes, fixed_bytes=0
+                )
+
+    def _still_removable(self, doc: _DocInfo) -> bool:
+        """Re-check ``doc`` right before deleting from it.
+
+        The active set and last access were read at scan time; since then a
+        job may have been queued for the document or a request may have read
+        it, and then neither the TTL nor the quota decision holds any more.
+        """
+        if self.s.store.has_active_job(doc.doc_id):
+            self.report["protected_active"] += 1
+            return False
+        last_access = self._last_access(doc.doc_id)
+        return last_access is not None and last_access <= doc.last_access
+
+    @staticmethod
+    def _last_access(doc_id: str) -> Optional[float]:
+        try:
+            return storage_service.last_access(doc_id)
+        except FileNotFoundError:
+            return None  # deleted meanwhile
+
+    def _remove_document(self, doc: _DocInfo) -> bool:
+        if not self._still_removable(doc):
+            return False
+        if not self.dry_run:
+            storage_service.delete_document(doc.doc_id)
+        del self.docs[doc.doc_id]
+        if doc.digest:
+            self.refs[doc.digest] -= 1
+            if doc.hard_linked:
+                self.unlinked[doc.digest] += 1
+        self.report["deleted"]["documents"] += 1
+        self.report["reclaimed_bytes"] += doc.own_bytes
+        if len(self.report["documents"]) < _REPORT_LIMIT:
+            self.report["documents"].append(doc.doc_id)
+        return True
+
+    def _enforce_quota(self, usage: int, blobs: Dict[str, _BlobInfo], active: Set[str]) -> int:
+        quota = self.s.max_bytes
+        if not quota or usage <= quota:
+            return usage
+        candidates = sorted((d for d in self.docs.values() if d.doc_id not in active), key=lambda d: d.last_access)
+        for doc in candidates:
+            if usage <= quota:
+                break
+            self.s._tick()
+            # the blob goes too once its last document is gone
+            blob_bytes = blobs[doc.digest].size if doc.digest in blobs and self.refs[doc.digest] == 1 else 0
+            if not self._remove_document(doc):
+                continue
+            usage -= doc.own_bytes + blob_bytes
+            self.report["evicted_for_quota"] += 1
+        if usage > quota:
+            _LOGGER.warning("Retention: %d bytes in use after eviction, above the %d byte quota", usage, quota)
+        return usage
+
+    # -- jobs and caches -----------------------------------------------
+    def _purge_jobs(self) -> None:
+        if not self.s.job_ttl:
+            return
+        before = self.now - self.s.job_ttl
+        store = self.s.store
+        if self.dry_run:
+            self.report["deleted"]["jobs"] = store.count_finished(before)
+        else:
+            while True:
+                purged = store.purge_finished(before, self.s.batch_size)
+                self.report["deleted"]["jobs"] += purged
+                if purged < self.s.batch_size:
+                    break
+                self.s._pause()
+            # cached agent plans expire with the jobs that made them
+            self.report["deleted"]["plans"] = store.purge_plans(before)
+        # job files already imported into the store by older versions
+        self._expire_files(((f, f.stat()) for f in store.path.parent.glob("*.json.migrated")), self.s.job_ttl, "jobs")
+
+    def _expire_files(self, files: Iterator[Tuple[Path, Any]], ttl: float, kind: str) -> int:
+        """Delete files older than ``ttl``; returns the bytes of those kept."""
+        kept = 0
+        for path, st in files:
+            self.s._tick()
+            if ttl and self.now - st.st_mtime > ttl:
+                self._unlink(path)
+                self.report["deleted"][kind] += 1
+                self.report["reclaimed_bytes"] += st.st_size
+            else:
+                kept += st.st_size
+        return kept
+
+    # -- blobs ---------------------------------------------------------
+    def _scan_blobs(self) -> Dict[str, _BlobInfo]:
+        root = blob_store.BLOBS_DIR
+        # abandoned partial uploads
+        tmp = root / "tmp"
+        self._expire_files(((f, f.stat()) for f in tmp.glob("*.part")) if tmp.is_dir() else iter(()), _GRACE_SECONDS, "tmp_files")
+        grouped: Dict[str, List[Tuple[Path, Any]]] = {}
+        for path, st in self._walk(root):
+            if path.parent.name == "tmp":
+                continue
+            grouped.setdefault(path.name.split(".", 1)[0], []).append((path, st))
+        blobs = {}
+        for digest, files in grouped.items():
+            base = next((st for path, st in files if path.name == digest), None)
+            blobs[digest] = _BlobInfo(
+                paths=tuple(path for path, _ in files),
+                size=sum(st.st_size for _, st in files),
+                mtime=max(st.st_mtime for _, st in files),
+                nlink=base.st_nlink if base is not None else 0,
+            )
+        return blobs
+
+    def _remove_blobs(self, blobs: Dict[str, _BlobInfo]) -> None:
+        if self.uncertain:
+            _LOGGER.info("Retention: skipping blobs this sweep, an upload is still in progress")
+            return
+        for digest, blob in blobs.items():
+            self.s._tick()
+            if self.refs[digest] > 0 or self.now - blob.mtime < _GRACE_SECONDS:
+                continue
+            # hard links this sweep does not know about (e.g. a folder it could not read)
+            if blob.nlink - self.unlinked[digest] > 1:
+                continue
+            for path in blob.paths:
+                self._unlink(path)
+            self.report["deleted"]["blobs"] += 1
+            self.report["reclaimed_bytes"] += blob.size
+
+    # -- helpers -------------------------------------------------------
+    def _walk(self, root: Path) -> Iterator[Tuple[Path, Any]]:
+        if not root.is_dir():
+            return
+        for path in root.rglob("*"):
+            self.s._tick()
+            try:
+                st = path.lstat()
+            except FileNotFoundError:
+                continue
+            if path.is_file():
+                yield path, st
+
+    def _unlink(self, path: Path) -> None:
+        if not self.dry_run:
+            path.unlink(missing_ok=True)
+
+
+_sweeper: Optional[RetentionSweeper] = None
+_sweeper_lock = threading.Lock()
+
+
+def get_sweeper() -> RetentionSweeper:
+    global _sweeper
+    with _sweeper_lock:
+        if _sweeper is None:
+            _sweeper = RetentionSweeper()
+        return _sweeper
+
+
+def stats() -> Dict[str, Any]:
+    return get_sweeper().stats()
@@ -1,24 +1,419 @@
 ﻿# app/services/rewrite_service.py
-from typing import Optional
+import asyncio
+import logging
+import re
+import time
+from bisect import bisect_right
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
 
-from .mistral_client import generate_text
+from app.config import (
+	REWRITE_CHUNK_TOKENS,
+	REWRITE_CONCURRENCY,
+	REWRITE_OVERLAP_CHARS,
+	REWRITE_CHUNK_ATTEMPTS,
+	REWRITE_TARGET_CONTEXT_CHARS,
+)
+from . import executors, tracing
+from .extraction_service import Page
+from .languagetool_pool import split_paragraphs
+from .mistral_client import agenerate_text, astream_text, get_client
+from .mistral_scheduler import INTERACTIVE
 
+_LOGGER = logging.getLogger(__name__)
 
-def rewrite_text(text: str) -> str:
-	"""Rewrite text using Mistral `mistral-medium`.
+DEFAULT_INSTRUCTIONS = (
+	"You are an expert editor. Rewrite the given text to correct grammar, improve clarity, "
+	"and follow standard English writing rules while preserving meaning."
+)
 
-	Keeps behavior similar to previous OpenAI-driven implementation: short prompt,
-	preserve meaning, correct grammar and clarity, and return only corrected text.
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# streamed /fix latency: time to first corrected paragraph is the headline number
+_STREAM_STATS = {"streams": 0, "first_paragraph_total": 0.0, "first_paragraph_max": 0.0, "total_seconds": 0.0}
+# mode=targeted: how much of each document actually goes to the LLM
+_TARGET_STATS = {"fixes": 0, "paragraphs": 0, "paragraphs_sent": 0, "document_tokens": 0, "prompt_tokens": 0}
+
+
+def estimate_tokens(text: str) -> int:
+	# ~4 characters per token for English prose; good enough for budgeting
+	return len(text) // 4 + 1
+
+
+def split_into_chunks(text: str, max_tokens: int = REWRITE_CHUNK_TOKENS) -> List[str]:
+	"""Split ``text`` into chunks of at most ``max_tokens`` on paragraph, then sentence boundaries.
+
+	Chunks keep their separators, so ``"".join(chunks) == text``.
+	"""
+	max_chars = max_tokens * 4
+	units: List[str] = []
+	for para in text.splitlines(keepends=True):
+		if len(para) <= max_chars:
+			units.append(para)
+			continue
+		for sentence in _split_keep(para, _SENTENCE_END):
+			# a single run-on "sentence" larger than the budget is cut hard
+			units.extend(sentence[i:i + max_chars] for i in range(0, len(sentence), max_chars))
+
+	chunks: List[str] = []
+	current = ""
+	for unit in units:
+		if current and len(current) + len(unit) > max_chars:
+			chunks.append(current)
+			current = ""
+		current += unit
+	if current:
+		chunks.append(current)
+	return chunks
+
+
+def _split_keep(text: str, pattern: "re.Pattern[str]") -> List[str]:
+	parts, last = [], 0
+	for m in pattern.finditer(text):
+		parts.append(text[last:m.end()])
+		last = m.end()
+	if last < len(text):
+		parts.append(text[last:])
+	return parts
+
+
+def _build_prompt(chunk: str, context: str, instructions: str, following: str = "") -> str:
+	prompt = instructions + " Return ONLY the corrected text (no commentary).\n\n"
+	if context:
+		prompt += (
+			"The passage continues from the text below. Use it only for context and do not "
+			"include it in your answer:\n<<<\n" + context + "\n>>>\n\n"
+		)
+	if following:
+		prompt += (
+			"The passage is followed by the text below. Use it only for context and do not "
+			"include it in your answer:\n<<<\n" + following + "\n>>>\n\n"
+		)
+	if context or following:
+		prompt += "Passage:\n"
+	return prompt + chunk
+
+
+async def _chunk_stream(pieces: AsyncIterator[str]) -> AsyncIterator[str]:
+	# re-split the unfinished tail as text arrives; every chunk but the last is final
+	buffer = ""
+	async for piece in pieces:
+		chunks = split_into_chunks(buffer + piece)
+		for chunk in chunks[:-1]:
+			yield chunk
+		buffer = chunks[-1] if chunks else ""
+	if buffer:
+		yield buffer
+
+
+async def _rewrite_chunk(index: int, prompt: str, max_tokens: int, sem: asyncio.Semaphore, priority: int) -> str:
+	# retried on its own so one bad chunk never restarts the whole document
+	async with sem:
+		for attempt in range(1, REWRITE_CHUNK_ATTEMPTS + 1):
+			try:
+				out = await agenerate_text(prompt, model="mistral-medium", max_tokens=max_tokens, temperature=0.0, priority=priority)
+				if not out or not out.strip():
+					raise RuntimeError("empty response")
+				return out.strip()
+			except Exception as e:
+				if attempt == REWRITE_CHUNK_ATTEMPTS:
+					raise RuntimeError(f"Rewriting chunk {index + 1} failed: {e}") from e
+				_LOGGER.warning("Chunk %d rewrite failed (%s), retrying (attempt %d/%d)", index + 1, e, attempt, REWRITE_CHUNK_ATTEMPTS)
+				await asyncio.sleep(0.5 * attempt)
+
+
+async def arewrite_text(text: str, instructions: Optional[str] = None, priority: int = INTERACTIVE) -> str:
+	"""Rewrite text using Mistral `mistral-medium`, chunk by chunk.
+
+	Long documents are split on paragraph/sentence boundaries into
+	token-budgeted chunks that are rewritten concurrently (at most
+	REWRITE_CONCURRENCY in flight) and reassembled in order. Each chunk sees
+	the tail of the previous chunk as read-only context.
+	"""
+	if not text or not text.strip():
+		return ""
+
+	async def pieces() -> AsyncIterator[str]:
+		yield text
+
+	return await _rewrite_stream(pieces(), instructions, priority)
+
+
+async def arewrite_pages(pages: Iterable[Page], instructions: Optional[str] = None, priority: int = INTERACTIVE) -> str:
+	"""Like `arewrite_text`, for a document that is still being extracted.
+
+	Pages are pulled from the blocking iterator on a worker thread and each
+	chunk is sent to Mistral as soon as it is complete, so rewriting starts
+	on the first pages while later ones are still being parsed.
+	"""
+	return await _rewrite_stream(_page_pieces(pages), instructions, priority)
+
+
+async def astream_rewrite_pages(pages: Iterable[Page], instructions: Optional[str] = None, priority: int = INTERACTIVE) -> AsyncIterator[str]:
+	"""Yield the corrected document line by line, in order, as each line completes.
+
+	Chunks are streamed from Mistral concurrently (at most
+	REWRITE_CONCURRENCY); a chunk's lines are released once every earlier
+	chunk is done, so the first lines arrive while the rest of the
+	document is still being generated. Joining the lines with newlines
+	gives the same text as `arewrite_pages`.
+	"""
+	instructions = instructions or DEFAULT_INSTRUCTIONS
+	sem = asyncio.Semaphore(REWRITE_CONCURRENCY)
+	order: "asyncio.Queue[tuple]" = asyncio.Queue()
+	tasks: List["asyncio.Future[None]"] = []
+
+	async def schedule() -> None:
+		previous = ""
+		try:
+			async for chunk in _chunk_stream(_page_pieces(pages)):
+				out: "asyncio.Queue[tuple]" = asyncio.Queue()
+				if chunk.strip():
+					context = previous[-REWRITE_OVERLAP_CHARS:] if previous and REWRITE_OVERLAP_CHARS > 0 else ""
+					max_tokens = int(estimate_tokens(chunk) * 1.5) + 100
+					prompt = _build_prompt(chunk, context, instructions)
+					tasks.append(asyncio.ensure_future(_stream_chunk(len(tasks), prompt, max_tokens, sem, priority, out)))
+				else:
+					out.put_nowait(("end", None))
+				previous = chunk
+				order.put_nowait(("chunk", chunk, out))
+			order.put_nowait(("end",))
+		except Exception as e:
+			order.put_nowait(("error", e))
+
+	scheduler = asyncio.ensure_future(schedule())
+	line = ""
+	pending = ""  # whitespace held back until more text follows (chunk/document edges are stripped)
+	started = False
+	try:
+		while True:
+			item = await order.get()
+			if item[0] == "error":
+				raise item[1]
+			if item[0] == "end":
+				break
+			_, chunk, out = item
+			produced = False
+			while True:
+				kind, value = await out.get()
+				if kind == "error":
+					raise value
+				if kind == "end":
+					break
+				if not produced:
+					value = value.lstrip()
+					if not value:
+						continue
+					produced = True
+				content = (pending if started else "") + value
+				body = content.rstrip()
+				pending = content[len(body):]
+				started = started or bool(body)
+				line += body
+				*done, line = line.split("\n")
+				for finished in done:
+					yield finished
+			# same joining rule as _rewrite_stream: stripped output + the chunk's own trailing whitespace
+			trailing = chunk[len(chunk.rstrip()):]
+			pending = trailing if produced else pending + trailing
+		if started:
+			yield line
+	finally:
+		scheduler.cancel()
+		for task in tasks:
+			task.cancel()
+
+
+async def _page_pieces(pages: Iterable[Page]) -> AsyncIterator[str]:
+	# pages come from a blocking iterator: pull each one on the I/O pool
+	page_iter = iter(pages)
+	first = True
+	while True:
+		page = await executors.io().run(next, page_iter, None)
+		if page is None:
+			return
+		if page.text:
+			yield page.text if first else "\n" + page.text
+			first = False
+
+
+async def _stream_chunk(index: int, prompt: str, max_tokens: int, sem: asyncio.Semaphore, priority: int, out: "asyncio.Queue[tuple]") -> None:
+	# deltas go to `out` as they arrive; a retry is only possible before any text was handed out
+	async with sem:
+		for attempt in range(1, REWRITE_CHUNK_ATTEMPTS + 1):
+			sent = False
+			try:
+				async for delta in astream_text(prompt, model="mistral-medium", max_tokens=max_tokens, temperature=0.0, priority=priority):
+					sent = sent or bool(delta.strip())
+					out.put_nowait(("delta", delta))
+				if not sent:
+					raise RuntimeError("empty response")
+				out.put_nowait(("end", None))
+				return
+			except Exception as e:
+				if sent or attempt == REWRITE_CHUNK_ATTEMPTS:
+					out.put_nowait(("error", RuntimeError(f"Rewriting chunk {index + 1} failed: {e}")))
+					return
+				_LOGGER.warning("Chunk %d streamed rewrite failed (%s), retrying (attempt %d/%d)", index + 1, e, attempt, REWRITE_CHUNK_ATTEMPTS)
+				await asyncio.sleep(0.5 * attempt)
+
+
+async def _rewrite_stream(pieces: AsyncIterator[str], instructions: Optional[str], priority: int) -> str:
+	instructions = instructions or DEFAULT_INSTRUCTIONS
+	sem = asyncio.Semaphore(REWRITE_CONCURRENCY)
+	chunks: List[str] = []
+	tasks: List["asyncio.Future[str]"] = []
+	t0 = time.perf_counter()
+	try:
+		async for chunk in _chunk_stream(pieces):
+			index = len(chunks)
+			context = chunks[-1][-REWRITE_OVERLAP_CHARS:] if chunks and REWRITE_OVERLAP_CHARS > 0 else ""
+			chunks.append(chunk)
+			if not chunk.strip():
+				tasks.append(asyncio.ensure_future(asyncio.sleep(0, result="")))
+				continue
+			max_tokens = int(estimate_tokens(chunk) * 1.5) + 100
+			# started right away: earlier chunks are in flight while later text is still arriving
+			tasks.append(asyncio.ensure_future(
+				_rewrite_chunk(index, _build_prompt(chunk, context, instructions), max_tokens, sem, priority)
+			))
+		results = await asyncio.gather(*tasks)
+	except BaseException:
+		for task in tasks:
+			task.cancel()
+		raise
+	finally:
+		# wall time of the whole rewrite, including waiting for pages still being extracted
+		tracing.record("rewrite", time.perf_counter() - t0)
+
+	# keep each chunk's original trailing whitespace so paragraph breaks survive
+	parts = []
+	for chunk, out in zip(chunks, results):
+		trailing = chunk[len(chunk.rstrip()):]
+		parts.append((out or chunk.strip()) + trailing)
+	return "".join(parts).strip()
+
+
+def select_targets(text: str, issues: Iterable[Dict[str, Any]], max_tokens: int = REWRITE_CHUNK_TOKENS) -> List[Tuple[int, int]]:
+	"""``(start, end)`` spans of ``text`` covering the paragraphs that contain an issue.
+
+	Issues are placed by ``offset_start``; issues without offsets are
+	ignored. Consecutive flagged paragraphs are merged into one span while
+	it stays within ``max_tokens``.
+	"""
+	paragraphs = split_paragraphs(text)
+	starts = [offset for offset, _ in paragraphs]
+	flagged = set()
+	for issue in issues:
+		pos = issue.get("offset_start")
+		if pos is None:
+			continue
+		i = bisect_right(starts, pos) - 1
+		if i >= 0 and pos <= starts[i] + len(paragraphs[i][1]):
+			flagged.add(i)
+
+	spans: List[Tuple[int, int]] = []
+	previous = None
+	for i in sorted(flagged):
+		start, para = paragraphs[i]
+		end = start + len(para)
+		if spans and previous == i - 1 and estimate_tokens(text[spans[-1][0]:end]) <= max_tokens:
+			spans[-1] = (spans[-1][0], end)
+		else:
+			spans.append((start, end))
+		previous = i
+	_TARGET_STATS["paragraphs"] += len(paragraphs)
+	_TARGET_STATS["paragraphs_sent"] += len(flagged)
+	return spans
+
+
+async def arewrite_targeted(text: str, issues: Iterable[Dict[str, Any]], instructions: Optional[str] = None, priority: int = INTERACTIVE) -> str:
+	"""Rewrite only the paragraphs LanguageTool flagged and splice them back into ``text``.
+
+	Each flagged span is sent with up to REWRITE_TARGET_CONTEXT_CHARS of
+	read-only text on either side; everything else is returned untouched.
+	A document without issues costs no Mistral call at all.
 	"""
+	parts = []
+	with tracing.stage("rewrite"):
+		async for part in _targeted_parts(text, issues, instructions, priority):
+			parts.append(part)
+	return "".join(parts)
+
+
+async def astream_rewrite_targeted(text: str, issues: Iterable[Dict[str, Any]], instructions: Optional[str] = None, priority: int = INTERACTIVE) -> AsyncIterator[str]:
+	"""`arewrite_targeted` line by line, in order; clean lines before the first pending span come out at once."""
+	line = ""
+	async for part in _targeted_parts(text, issues, instructions, priority):
+		line += part
+		*done, line = line.split("\n")
+		for finished in done:
+			yield finished
+	if text.strip():
+		yield line
+
+
+async def _targeted_parts(text: str, issues: Iterable[Dict[str, Any]], instructions: Optional[str], priority: int) -> AsyncIterator[str]:
+	# untouched gaps and rewritten spans, in document order
+	instructions = instructions or DEFAULT_INSTRUCTIONS
+	spans = select_targets(text, issues)
+	sem = asyncio.Semaphore(REWRITE_CONCURRENCY)
+	tasks: List["asyncio.Future[str]"] = []
+	prompt_tokens = 0
+	for index, (start, end) in enumerate(spans):
+		before = text[max(0, start - REWRITE_TARGET_CONTEXT_CHARS):start].strip() if REWRITE_TARGET_CONTEXT_CHARS > 0 else ""
+		after = text[end:end + REWRITE_TARGET_CONTEXT_CHARS].strip() if REWRITE_TARGET_CONTEXT_CHARS > 0 else ""
+		span = text[start:end]
+		prompt = _build_prompt(span.strip(), before, instructions, following=after)
+		prompt_tokens += estimate_tokens(prompt)
+		tasks.append(asyncio.ensure_future(
+			_rewrite_chunk(index, prompt, int(estimate_tokens(span) * 1.5) + 100, sem, priority)
+		))
+	_TARGET_STATS["fixes"] += 1
+	_TARGET_STATS["document_tokens"] += estimate_tokens(text)
+	_TARGET_STATS["prompt_tokens"] += prompt_tokens
+
+	try:
+		last = 0
+		for (start, end), task in zip(spans, tasks):
+			span = text[start:end]
+			# keep the paragraph's own indentation/trailing spaces around the stripped rewrite
+			lead = span[:len(span) - len(span.lstrip())]
+			trail = span[len(span.rstrip()):]
+			yield text[last:start]
+			yield lead + await task + trail
+			last = end
+		yield text[last:]
+	finally:
+		for task in tasks:
+			task.cancel()
+
+
+def targeted_stats() -> Dict[str, Any]:
+	stats: Dict[str, Any] = dict(_TARGET_STATS)
+	stats["token_ratio"] = stats["prompt_tokens"] / stats["document_tokens"] if stats["document_tokens"] else 0.0
+	return stats
+
+
+def rewrite_text(text: str, instructions: Optional[str] = None, priority: int = INTERACTIVE) -> str:
+	"""Blocking wrapper around `arewrite_text` for worker threads."""
 	if not text or not text.strip():
 		return ""
+	return get_client().run_sync(arewrite_text(text, instructions, priority))
+
+
+def record_stream(first_paragraph_seconds: Optional[float], total_seconds: float) -> None:
+	first = first_paragraph_seconds if first_paragraph_seconds is not None else total_seconds
+	_STREAM_STATS["streams"] += 1
+	_STREAM_STATS["first_paragraph_total"] += first
+	_STREAM_STATS["first_paragraph_max"] = max(_STREAM_STATS["first_paragraph_max"], first)
+	_STREAM_STATS["total_seconds"] += total_seconds
 
-	prompt = (
-		"You are an expert editor. Rewrite the given text to correct grammar, improve clarity, "
-		"and follow standard English writing rules while preserving meaning. Return ONLY the corrected text "
-		"(no commentary).\n\n"
-		+ text[:15000]
-	)
 
-	corrected = generate_text(prompt, model="mistral-medium", max_tokens=2000, temperature=0.0)
-	return corrected
+def stream_stats() -> dict:
+	streams = _STREAM_STATS["streams"]
+	return {
+		"streams": streams,
+		"time_to_first_paragraph_avg": _STREAM_STATS["first_paragraph_total"] / streams if streams else 0.0,
+		"time_to_first_paragraph_max": _STREAM_STATS["first_paragraph_max"],
+		"total_seconds_avg": _STREAM_STATS["total_seconds"] / streams if streams else 0.0,
+	}
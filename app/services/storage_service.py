@@ -1,20 +1,59 @@
 ﻿# app/services/storage_service.py
+import os
+import threading
+import time
 import uuid
 import logging
 from pathlib import Path
+from typing import Any, Dict, Optional
 from fastapi import UploadFile, HTTPException
-from app.config import UPLOAD_DIR, ALLOWED_EXTENSIONS, MAX_FILE_SIZE
+from app.config import UPLOAD_DIR, ALLOWED_EXTENSIONS, MAX_FILE_SIZE, UPLOAD_CHUNK_SIZE, MANIFEST_CACHE_ITEMS
+from app.services import blob_store, executors
+from app.services.extraction_service import disk_cache_path
+from app.utils.file_validation import MAGIC_SNIFF_BYTES, MIME_TYPES, matches_magic
+from app.utils.lru_cache import LRUCache
+from app.utils.security import hash_file
+import json
 import shutil
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of this process are serialized
+    fcntl = None
 
 _LOGGER = logging.getLogger(__name__)
 
+MANIFEST_NAME = ".manifest.json"
+# bump when fields are added: older manifests are rebuilt on first access
+MANIFEST_VERSION = 2
+
+# doc_id -> ((st_ino, st_mtime_ns, st_size) of the manifest file, manifest); the
+# stat check picks up writes by other processes (uvicorn workers, the process
+# pool saving fixed documents), even two within one mtime tick: every write is
+# a rename of a new file, so the inode changes
+_MANIFESTS = LRUCache(max_items=MANIFEST_CACHE_ITEMS)
+
+LOCK_NAME = ".lock"
+# read-modify-write of a manifest (and the file change it records) happens
+# under the document lock: a flock on LOCK_NAME across processes, plus one of
+# these for threads of this process
+_DOC_LOCKS = [threading.Lock() for _ in range(64)]
+# documents whose lock this thread holds; re-entering (e.g. a backfill inside an update) is a no-op
+_HELD = threading.local()
+
+# last access of a document = mtime of its folder (see `touch`); refreshed at
+# most once per interval per process so reads do not turn into writes
+_TOUCH_INTERVAL = 60.0
+_TOUCHED = LRUCache(max_items=MANIFEST_CACHE_ITEMS)
+
 
 def _secure_filename(name: str) -> str:
     # minimal sanitizer — production: use werkzeug.utils.secure_filename or similar
     return "".join(c for c in name if c.isalnum() or c in "._-").rstrip(".")
 
 
-def save_upload_file(file: UploadFile) -> dict:
+async def save_upload_file(file: UploadFile) -> dict:
     name = file.filename
     if not name:
         _LOGGER.debug("Upload rejected: missing filename (content_type=%s)", getattr(file, 'content_type', None))
@@ -23,51 +62,356 @@ def save_upload_file(file: UploadFile) -> dict:
     if ext not in ALLOWED_EXTENSIONS:
         _LOGGER.debug("Upload rejected: unsupported extension '%s' for filename=%s", ext, name)
         raise HTTPException(status_code=400, detail="Unsupported file type")
-    # Read contents in a safe way; note UploadFile also supports async read
+    # Copy to a temp blob in fixed-size chunks, hashing as we go. By now
+    # Starlette has already spooled the whole multipart body (memory, then a
+    # temp file): the request body limit in app.main (BodySizeLimitMiddleware)
+    # bounds what is received, the check below only stops the second copy early.
+    # Disk writes run on the I/O pool, not on the event loop.
+    io_pool = executors.io()
+    writer = await io_pool.run(blob_store.BlobWriter)
+    head = b""
     try:
-        contents = file.file.read()
-    except Exception as e:
-        _LOGGER.exception("Failed reading uploaded file %s", name)
-        raise HTTPException(status_code=400, detail="Failed to read uploaded file")
-    if len(contents) > MAX_FILE_SIZE:
-        _LOGGER.debug("Upload rejected: file too large (%d bytes) for filename=%s", len(contents), name)
-        raise HTTPException(status_code=413, detail="File too large")
+        while True:
+            try:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            except Exception:
+                _LOGGER.exception("Failed reading uploaded file %s", name)
+                raise HTTPException(status_code=400, detail="Failed to read uploaded file")
+            if not chunk:
+                break
+            if writer.size + len(chunk) > MAX_FILE_SIZE:
+                _LOGGER.debug("Upload rejected: file exceeds %d bytes for filename=%s", MAX_FILE_SIZE, name)
+                raise HTTPException(status_code=413, detail="File too large")
+            if len(head) < MAGIC_SNIFF_BYTES:
+                head += chunk[:MAGIC_SNIFF_BYTES - len(head)]
+                if len(head) >= MAGIC_SNIFF_BYTES and not matches_magic(head, ext):
+                    raise HTTPException(status_code=400, detail="File content does not match its extension")
+            await io_pool.run(writer.write, chunk)
+        if len(head) < MAGIC_SNIFF_BYTES and not matches_magic(head, ext):
+            raise HTTPException(status_code=400, detail="File content does not match its extension")
+        digest = await io_pool.run(writer.commit)
+    except BaseException:
+        writer.abort()
+        raise
     doc_id = str(uuid.uuid4())
+    safe = _secure_filename(name)
+    # linking, page counting (parses PDFs) and the manifest write: off the event loop
+    await io_pool.run(_store_document, doc_id, digest, safe, name)
+    return {"doc_id": doc_id, "filename": safe, "sha256": digest}
+
+
+def _store_document(doc_id: str, digest: str, filename: str, original_name: str) -> None:
     outdir = UPLOAD_DIR / doc_id
     outdir.mkdir(parents=True, exist_ok=True)
-    safe = _secure_filename(name)
-    dest = outdir / safe
-    with dest.open("wb") as f:
-        f.write(contents)
-    return {"doc_id": doc_id, "filename": safe}
+    # identical uploads share one blob; the doc folder only links to it
+    dest = blob_store.link_blob(digest, outdir / filename)
+    _write_manifest(doc_id, _build_manifest(doc_id, dest, digest, original_name))
 
 
-def get_uploaded_file_path(doc_id: str) -> Path | None:
+def _build_manifest(doc_id: str, path: Path, digest: str, original_name: str, **fields: Any) -> Dict[str, Any]:
+    ext = path.suffix.lower().lstrip(".")
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "doc_id": doc_id,
+        "filename": path.name,
+        "original_name": original_name,
+        "size": path.stat().st_size,
+        "sha256": digest,
+        "mime_type": MIME_TYPES.get(ext, "application/octet-stream"),
+        "page_count": None,
+        # where extraction caches this document's text (shared by identical uploads)
+        "extracted": _relative(disk_cache_path(path, digest)),
+        "fixed": None,
+        "created_at": time.time(),
+    }
+    manifest.update(fields)
+    return manifest
+
+
+def _count_pages(path: Path) -> Optional[int]:
+    # DOCX has no fixed pagination; it is extracted as a single page
+    if path.suffix.lower() != ".pdf":
+        return None
+    try:
+        import pdfplumber
+
+        with pdfplumber.open(path) as pdf:
+            return len(pdf.pages)
+    except Exception as e:
+        _LOGGER.warning("Could not count pages of %s: %s", path, e)
+        return None
+
+
+def _relative(path: Path) -> str:
+    try:
+        return str(path.relative_to(UPLOAD_DIR))
+    except ValueError:
+        return str(path)
+
+
+def _is_doc_id(doc_id: str) -> bool:
+    # doc folders sit directly under UPLOAD_DIR; `_blobs`, `_jobs`, `_cache` are not documents
+    return bool(doc_id) and "/" not in doc_id and "\\" not in doc_id and not doc_id.startswith((".", "_"))
+
+
+def _stat_key(st: os.stat_result) -> tuple:
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+@contextmanager
+def _document_lock(doc_id: str):
+    """Serialize manifest updates of one document across threads and processes.
+
+    Raises FileNotFoundError if the document folder does not exist.
+    """
+    held = _HELD.__dict__.setdefault("docs", set())
+    if doc_id in held:
+        yield
+        return
+    with _DOC_LOCKS[hash(doc_id) % len(_DOC_LOCKS)]:
+        fd = os.open(UPLOAD_DIR / doc_id / LOCK_NAME, os.O_RDWR | os.O_CREAT, 0o644) if fcntl else None
+        held.add(doc_id)
+        try:
+            if fd is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            held.discard(doc_id)
+            if fd is not None:
+                os.close(fd)  # releases the flock
+
+
+def _write_manifest(doc_id: str, manifest: Dict[str, Any]) -> Dict[str, Any]:
+    if manifest.get("page_count") is None:
+        manifest["page_count"] = _count_pages(UPLOAD_DIR / doc_id / manifest["filename"])
     folder = UPLOAD_DIR / doc_id
-    if not folder.exists():
+    target = folder / MANIFEST_NAME
+    tmp = folder / f".manifest.{uuid.uuid4().hex}.tmp"
+    try:
+        tmp.write_text(json.dumps(manifest), encoding="utf-8")
+        # the rename keeps inode, mtime and size; statting the target afterwards
+        # could pick up a newer write by someone else
+        key = _stat_key(tmp.stat())
+        os.replace(tmp, target)
+    finally:
+        tmp.unlink(missing_ok=True)
+    _MANIFESTS.set(doc_id, (key, manifest))
+    return manifest
+
+
+def get_manifest(doc_id: str) -> Optional[Dict[str, Any]]:
+    """The document's manifest, or None if there is no such upload.
+
+    Served from memory while the manifest file is unchanged; folders from
+    before manifests existed (or with an older version) get one on first access.
+    """
+    if not _is_doc_id(doc_id):
         return None
-    files = list(folder.iterdir())
-    return files[0] if files else None
+    manifest = _read_manifest(doc_id)
+    if manifest is not None and manifest.get("version") == MANIFEST_VERSION:
+        return manifest
+    return _backfill(doc_id)
 
 
-def save_fixed_doc(doc_id: str, corrected_text: str) -> Path:
+def _read_manifest(doc_id: str) -> Optional[Dict[str, Any]]:
+    # the manifest file as it is now (current versions cached), None if missing or unreadable
+    target = UPLOAD_DIR / doc_id / MANIFEST_NAME
+    try:
+        key = _stat_key(target.stat())
+    except FileNotFoundError:
+        return None
+    cached = _MANIFESTS.get(doc_id)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    try:
+        manifest = json.loads(target.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        _LOGGER.warning("Unreadable manifest for %s", doc_id)
+        return None
+    if manifest.get("version") == MANIFEST_VERSION:
+        _MANIFESTS.set(doc_id, (key, manifest))
+    return manifest
+
+
+def _backfill(doc_id: str) -> Optional[Dict[str, Any]]:
+    if not (UPLOAD_DIR / doc_id).is_dir():
+        return None
+    try:
+        with _document_lock(doc_id):
+            return _backfill_locked(doc_id)
+    except FileNotFoundError:
+        return None  # deleted meanwhile
+
+
+def _backfill_locked(doc_id: str) -> Optional[Dict[str, Any]]:
+    # one-off directory scan for folders written before manifests (or by an older version)
+    old = _read_manifest(doc_id) or {}
+    if old.get("version") == MANIFEST_VERSION:
+        return old  # written by someone else while we waited for the lock
     folder = UPLOAD_DIR / doc_id
-    folder.mkdir(parents=True, exist_ok=True)
-    out = folder / f"fixed_{doc_id}.docx"
-    from docx import Document
-    doc = Document()
+    original = folder / old["filename"] if old.get("filename") else None
+    if original is None or not original.is_file():
+        # skip derived artefacts (fixed output, dot-prefixed caches) living next to the original
+        files = sorted(f for f in folder.iterdir() if f.is_file() and not f.name.startswith((".", "fixed_")))
+        if not files:
+            return None
+        original = files[0]
+    fixed = next((f.name for f in sorted(folder.glob("fixed_*")) if f.is_file()), None)
+    digest = old.get("sha256") or hash_file(original)
+    manifest = _build_manifest(doc_id, original, digest, old.get("original_name", original.name), fixed=fixed)
+    _LOGGER.info("Backfilled manifest for %s", doc_id)
+    return _write_manifest(doc_id, manifest)
+
+
+def update_manifest(doc_id: str, **fields: Any) -> Optional[Dict[str, Any]]:
+    if not _is_doc_id(doc_id):
+        return None
+    try:
+        with _document_lock(doc_id):
+            return _update_manifest_locked(doc_id, **fields)
+    except FileNotFoundError:
+        return None
+
+
+def _update_manifest_locked(doc_id: str, **fields: Any) -> Optional[Dict[str, Any]]:
+    # re-read under the lock: the cached copy may predate another process's write
+    manifest = get_manifest(doc_id)
+    if manifest is None:
+        return None
+    return _write_manifest(doc_id, {**manifest, **fields})
+
+
+def iter_doc_ids():
+    for folder in UPLOAD_DIR.iterdir():
+        if _is_doc_id(folder.name) and folder.is_dir():
+            yield folder.name
+
+
+def backfill_manifests() -> int:
+    """Make sure every document folder under UPLOAD_DIR has a current manifest."""
+    count = 0
+    for doc_id in iter_doc_ids():
+        try:
+            if get_manifest(doc_id) is not None:
+                count += 1
+        except Exception:
+            _LOGGER.exception("Manifest backfill failed for %s", doc_id)
+    return count
+
+
+def start_backfill() -> threading.Thread:
+    def run():
+        _LOGGER.info("Manifests ready for %d documents", backfill_manifests())
+
+    t = threading.Thread(target=run, name="manifest-backfill", daemon=True)
+    t.start()
+    return t
+
+
+def manifest_cache_stats() -> Dict[str, Any]:
+    return _MANIFESTS.stats()
+
+
+def touch(doc_id: str) -> None:
+    """Record an access to the document (used by retention to evict least recently used)."""
+    now = time.time()
+    last = _TOUCHED.get(doc_id)
+    if last is not None and now - last < _TOUCH_INTERVAL:
+        return
+    try:
+        os.utime(UPLOAD_DIR / doc_id)
+    except FileNotFoundError:
+        return
+    _TOUCHED.set(doc_id, now)
+
+
+def last_access(doc_id: str) -> float:
+    return (UPLOAD_DIR / doc_id).stat().st_mtime
+
+
+def delete_document(doc_id: str) -> None:
+    """Remove the document folder; the blob is only freed once no folder links to it."""
+    if not _is_doc_id(doc_id):
+        raise ValueError(f"Not a document id: {doc_id!r}")
+    shutil.rmtree(UPLOAD_DIR / doc_id, ignore_errors=True)
+    _MANIFESTS.pop(doc_id)
+    _TOUCHED.pop(doc_id)
+
+
+def delete_fixed(doc_id: str) -> None:
+    if not _is_doc_id(doc_id):
+        raise ValueError(f"Not a document id: {doc_id!r}")
+    try:
+        with _document_lock(doc_id):
+            # a save that finished meanwhile recorded its own name; remove whatever is current
+            manifest = get_manifest(doc_id)
+            if manifest is None or not manifest.get("fixed"):
+                return
+            (UPLOAD_DIR / doc_id / manifest["fixed"]).unlink(missing_ok=True)
+            _update_manifest_locked(doc_id, fixed=None)
+    except FileNotFoundError:
+        pass  # the whole document is gone
+
+
+def get_uploaded_file_path(doc_id: str) -> Path | None:
+    manifest = get_manifest(doc_id)
+    if manifest is None:
+        return None
+    path = UPLOAD_DIR / doc_id / manifest["filename"]
+    if not path.exists():
+        return None
+    touch(doc_id)
+    return path
+
+
+class FixedDocWriter:
+    """Corrected DOCX assembled paragraph by paragraph as text arrives.
+
+    ``save`` writes a temporary file and renames it over ``fixed_<doc_id>.docx``,
+    so downloads never see a half-written document.
+    """
+
+    def __init__(self, doc_id: str):
+        from docx import Document
+        self.doc_id = doc_id
+        self.paragraphs = 0
+        self._doc = Document()
+
+    def append(self, line: str) -> None:
+        self._doc.add_paragraph(line)
+        self.paragraphs += 1
+
+    def save(self) -> Path:
+        folder = UPLOAD_DIR / self.doc_id
+        folder.mkdir(parents=True, exist_ok=True)
+        out = folder / f"fixed_{self.doc_id}.docx"
+        tmp = folder / f".fixed_{uuid.uuid4().hex}.tmp"
+        try:
+            self._doc.save(tmp)
+            # the file and the manifest entry change together, so a concurrent
+            # delete_fixed cannot leave the manifest pointing at a removed file
+            with _document_lock(self.doc_id):
+                os.replace(tmp, out)
+                _update_manifest_locked(self.doc_id, fixed=out.name)
+        finally:
+            tmp.unlink(missing_ok=True)
+        return out
+
+
+def save_fixed_doc(doc_id: str, corrected_text: str) -> Path:
+    writer = FixedDocWriter(doc_id)
     for line in corrected_text.splitlines():
-        doc.add_paragraph(line)
-    doc.save(out)
-    return out
+        writer.append(line)
+    return writer.save()
 
 
 def get_fixed_file_path(doc_id: str) -> Path | None:
-    folder = UPLOAD_DIR / doc_id
-    if not folder.exists():
+    manifest = get_manifest(doc_id)
+    if manifest is None or not manifest.get("fixed"):
+        return None
+    path = UPLOAD_DIR / doc_id / manifest["fixed"]
+    if not path.exists():
         return None
-    for f in folder.iterdir():
-        if f.name.startswith("fixed_"):
-            return f
-    return None
+    touch(doc_id)
+    return path
 
@@ -0,0 +1,237 @@
+# app/services/tracing.py
+"""Pipeline stage timings and process-wide metrics in Prometheus text format.
+
+``stage(name)`` times a block: the duration goes into the
+``doc_stage_duration_seconds`` histogram and, when the current request or
+agent job opened a ``collect()`` scope, into that scope's per-stage totals
+(used for ``Server-Timing`` and job logs). Stages that overlap, such as
+concurrent Mistral calls, add up, so a total can exceed wall time.
+"""
+import contextvars
+import math
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+_TIMINGS: "contextvars.ContextVar[Optional[Dict[str, float]]]" = contextvars.ContextVar("stage_timings", default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144)
+
+_LabelKey = Tuple[str, ...]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> _LabelKey:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: _LabelKey, extra: str = "") -> str:
+        parts = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[_LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{self._labels(key)} {_num(v)}" for key, v in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DURATION_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket..., +Inf count, sum]
+        self._values: Dict[_LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += 1
+            row[-1] += value
+
+    def count(self, **labels: Any) -> int:
+        with self._lock:
+            row = self._values.get(self._key(labels))
+            return int(row[-2]) if row else 0
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, row in sorted(self._values.items()):
+                for bound, n in zip(self.buckets, row):
+                    le = 'le="%s"' % _num(bound)
+                    lines.append(f"{self.name}_bucket{self._labels(key, le)} {_num(n)}")
+                inf = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{self._labels(key, inf)} {_num(row[-2])}")
+                lines.append(f"{self.name}_sum{self._labels(key)} {_num(row[-1])}")
+                lines.append(f"{self.name}_count{self._labels(key)} {_num(row[-2])}")
+        return lines
+
+
+_REGISTRY: List[_Metric] = []
+
+STAGE_SECONDS = Histogram("doc_stage_duration_seconds", "Time spent per pipeline stage.", ("stage",))
+MISTRAL_REQUEST_SECONDS = Histogram(
+    "doc_mistral_request_seconds", "Mistral HTTP attempts by endpoint and outcome.", ("endpoint", "status")
+)
+MISTRAL_RETRIES = Counter("doc_mistral_retries_total", "Mistral attempts that were retried.", ("endpoint", "reason"))
+MISTRAL_BACKOFF_SECONDS = Counter("doc_mistral_backoff_seconds_total", "Seconds slept in Mistral retry backoff.", ("endpoint",))
+MISTRAL_FALLBACKS = Counter(
+    "doc_mistral_endpoint_fallbacks_total", "Calls that fell back from /generate to /chat/completions (404)."
+)
+MISTRAL_PROMPT_CHARS = Histogram("doc_mistral_prompt_chars", "Prompt size of answered Mistral calls.", ("mode",), SIZE_BUCKETS)
+MISTRAL_COMPLETION_CHARS = Histogram("doc_mistral_completion_chars", "Completion size of answered Mistral calls.", ("mode",), SIZE_BUCKETS)
+HTTP_REQUEST_SECONDS = Histogram("doc_http_request_seconds", "HTTP request latency.", ("method", "route", "status"))
+
+
+@contextmanager
+def collect() -> Iterator[Dict[str, float]]:
+    """Collect per-stage totals (seconds) for everything run in this context."""
+    timings: Dict[str, float] = {}
+    token = _TIMINGS.set(timings)
+    try:
+        yield timings
+    finally:
+        _TIMINGS.reset(token)
+
+
+def record(name: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=name)
+    timings = _TIMINGS.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - t0)
+
+
+def timed_iter(name: str, items: Iterable[T]) -> Iterator[T]:
+    """Yield from ``items``, recording only the time spent producing them (not consuming)."""
+    spent = 0.0
+    it = iter(items)
+    try:
+        while True:
+            t0 = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                spent += time.perf_counter() - t0
+            yield item
+    finally:
+        record(name, spent)
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """``Server-Timing`` header value, durations in milliseconds."""
+    return ", ".join(f"{_token(name)};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+
+def format_timings(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name}={seconds:.2f}s" for name, seconds in sorted(timings.items(), key=lambda kv: -kv[1]))
+
+
+# /health/stats leaves that only ever grow (until restart); everything else is a gauge
+_COUNTER_KEYS = frozenset({
+    "hits", "misses", "memory_hits", "disk_hits", "evictions",
+    "granted", "throttled", "restarts", "segments_checked",
+    "completed", "failed", "cancelled", "deadline_exceeded", "client_disconnected",
+    "streams", "fixes", "paragraphs", "paragraphs_sent", "document_tokens", "prompt_tokens",
+    "applied", "overlapping", "no_suggestion", "not_allowed", "sweeps",
+})
+# sections whose values are point-in-time counts even where the key says otherwise
+# (agent_queue counts job rows, which retention purges)
+_GAUGE_SECTIONS = frozenset({"agent_queue"})
+
+
+def render(stats: Optional[Dict[str, Any]] = None) -> str:
+    """All metrics in Prometheus text format, plus ``stats`` flattened into ``doc_<path>`` samples."""
+    lines: List[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    for name, kind, value in _flatten("doc", stats or {}):
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {_num(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _flatten(prefix: str, value: Any, path: Tuple[str, ...] = ()) -> Iterator[Tuple[str, str, float]]:
+    if isinstance(value, dict):
+        for key, inner in value.items():
+            yield from _flatten(f"{prefix}_{_metric_name(str(key))}", inner, path + (str(key),))
+    elif isinstance(value, (bool, int, float)):
+        yield prefix, _kind(path), float(value)
+
+
+def _kind(path: Tuple[str, ...]) -> str:
+    if not path or path[0] in _GAUGE_SECTIONS:
+        return "gauge"
+    return "counter" if path[-1].endswith("_total") or path[-1] in _COUNTER_KEYS else "gauge"
+
+
+def _metric_name(text: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", text)
+
+
+def _token(text: str) -> str:
+    # Server-Timing metric names are HTTP tokens
+    return re.sub(r"[^A-Za-z0-9!#$%&'*+.^_`|~-]", "_", text)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
@@ -1,11 +1,11 @@
 ﻿# app/utils/file_validation.py
-import magic
 from fastapi import HTTPException
 
 
 def sniff_mime_type(stream) -> str:
     # Note: python-magic may require system package libmagic.
     try:
+        import magic
         mime = magic.from_buffer(stream.read(2048), mime=True)
         stream.seek(0)
         return mime
@@ -18,3 +18,28 @@ def ensure_allowed(ext: str):
     if ext.lower() not in allowed:
         raise HTTPException(400, "Unsupported file type")
 
+
+
+# Leading signatures per extension. PDF readers accept the header anywhere in
+# the first 1 KiB, so the check scans that window rather than offset 0 only.
+MAGIC_SNIFF_BYTES = 1024
+_SIGNATURES = {
+    "pdf": (b"%PDF-",),
+    "docx": (b"PK\x03\x04",),
+    "doc": (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", b"PK\x03\x04"),
+}
+
+MIME_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "doc": "application/msword",
+}
+
+
+def matches_magic(head: bytes, ext: str) -> bool:
+    signatures = _SIGNATURES.get(ext.lower())
+    if not signatures:
+        return False
+    if ext.lower() == "pdf":
+        return signatures[0] in head[:MAGIC_SNIFF_BYTES]
+    return head.startswith(signatures)
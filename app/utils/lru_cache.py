@@ -0,0 +1,96 @@
+# app/utils/lru_cache.py
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """Small thread-safe LRU cache bounded by entry count and/or total size.
+
+    ``sizeof`` returns the cost of a value (e.g. ``len`` for strings); when
+    ``max_bytes`` is set, least recently used entries are evicted until the
+    total cost fits. Hit/miss/eviction counters are kept for reporting.
+    """
+
+    def __init__(
+        self,
+        max_items: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        sizeof: Callable[[Any], int] = lambda _v: 1,
+    ):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._total = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        size = self._sizeof(value)
+        with self._lock:
+            if self.max_bytes is not None and size > self.max_bytes:
+                # never let a single oversized value flush the whole cache
+                self._pop(key)
+                return
+            self._pop(key)
+            self._data[key] = value
+            self._sizes[key] = size
+            self._total += size
+            self._evict()
+
+    def pop(self, key: Hashable) -> Any:
+        with self._lock:
+            return self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._total = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "size": self._total,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def _pop(self, key: Hashable) -> Any:
+        value = self._data.pop(key, None)
+        self._total -= self._sizes.pop(key, 0)
+        return value
+
+    def _evict(self) -> None:
+        while self._data and (
+            (self.max_items is not None and len(self._data) > self.max_items)
+            or (self.max_bytes is not None and self._total > self.max_bytes)
+        ):
+            key, _ = self._data.popitem(last=False)
+            self._total -= self._sizes.pop(key, 0)
+            self.evictions += 1
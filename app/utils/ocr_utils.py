@@ -1,17 +1,85 @@
 ﻿# app/utils/ocr_utils.py
+import hashlib
+import os
+import re
 from pathlib import Path
+from typing import Optional
+
 import pytesseract
-from pdf2image import convert_from_path
-import tempfile
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+from app.config import OCR_CACHE_DIR, OCR_DPI, OCR_LANG, OCR_MIN_CHARS, OCR_MIN_QUALITY
+
+# characters pdfplumber emits for glyphs it cannot map to text
+_CID = re.compile(r"\(cid:\d+\)")
+_PLAIN = set(".,;:!?'\"()[]-%$&/")
+
+
+def text_layer_quality(text: str) -> float:
+    """Share of the text layer that looks like real text (0.0 - 1.0)."""
+    stripped = text.strip()
+    if not stripped:
+        return 0.0
+    cleaned = _CID.sub("", stripped)
+    good = sum(1 for ch in cleaned if ch.isalnum() or ch.isspace() or ch in _PLAIN)
+    return good / len(stripped)
+
+
+def needs_ocr(text: str) -> bool:
+    # empty (scanned) pages, or a text layer too short or too garbled to trust
+    return len(text.strip()) < OCR_MIN_CHARS or text_layer_quality(text) < OCR_MIN_QUALITY
+
+
+def ocr_page(path: Path, page_number: int, dpi: int = OCR_DPI) -> str:
+    """OCR a single 1-based page, rendering only that page.
+
+    Results are cached on disk by a hash of the rendered page, so the same
+    scan is OCR'd once no matter which document or process it shows up in.
+    """
+    images = convert_from_path(str(path), dpi=dpi, first_page=page_number, last_page=page_number, grayscale=True)
+    if not images:
+        return ""
+    image = images[0]
+    try:
+        digest = hashlib.sha256(f"{OCR_LANG}|{image.size}|".encode("utf-8") + image.tobytes()).hexdigest()
+        cached = _read_cached(digest)
+        if cached is not None:
+            return cached
+        text = pytesseract.image_to_string(image, lang=OCR_LANG)
+        _write_cached(digest, text)
+        return text
+    finally:
+        image.close()
 
 
 def ocr_pdf_if_needed(path: Path) -> str:
-    # convert pdf to images and OCR them
-    images = convert_from_path(str(path))
+    # OCR every page, one rendered page in memory at a time
+    pages = pdfinfo_from_path(str(path)).get("Pages", 0)
     text_chunks = []
-    for im in images:
-        txt = pytesseract.image_to_string(im)
+    for number in range(1, pages + 1):
+        txt = ocr_page(path, number)
         if txt:
             text_chunks.append(txt)
     return "\n".join(text_chunks)
 
+
+def _cache_file(digest: str) -> Path:
+    return OCR_CACHE_DIR / digest[:2] / f"{digest}.txt"
+
+
+def _read_cached(digest: str) -> Optional[str]:
+    try:
+        return _cache_file(digest).read_text(encoding="utf-8")
+    except OSError:
+        return None
+
+
+def _write_cached(digest: str, text: str) -> None:
+    target = _cache_file(digest)
+    try:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, target)
+    except OSError:
+        pass
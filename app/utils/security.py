@@ -5,3 +5,12 @@ import hashlib
 def hash_file_contents(b: bytes) -> str:
     return hashlib.sha256(b).hexdigest()
 
+
+
+def hash_file(path, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file on disk, read in chunks so large files are not buffered."""
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
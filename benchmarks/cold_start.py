@@ -0,0 +1,81 @@
+# benchmarks/cold_start.py
+"""Cold-start benchmark: how long a fresh worker takes before it can serve.
+
+Each run uses a new interpreter (so nothing is cached in ``sys.modules``) and
+measures
+  * ``import_seconds``  - ``import app.main``
+  * ``startup_seconds`` - import + application lifespan + first ``/health/`` 200
+
+LanguageTool warm-up is disabled for the measurement: it runs in the
+background and is tracked separately by ``/health/ready``.
+
+    python benchmarks/cold_start.py --runs 5
+    python benchmarks/cold_start.py --max-import-seconds 2.5   # fail CI on regressions
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+_PROBE = """
+import json, time
+t0 = time.perf_counter()
+import app.main
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    assert client.get("/health/").status_code == 200
+    t2 = time.perf_counter()
+print(json.dumps({"import_seconds": t1 - t0, "startup_seconds": t2 - t0}))
+"""
+
+
+def run_once(upload_dir: str) -> dict:
+    env = dict(os.environ, UPLOAD_DIR=upload_dir, LANGUAGE_TOOL_WARMUP="0", AGENT_WORKERS="0")
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def summarize(samples: list) -> dict:
+    return {
+        "runs": len(samples),
+        "median": statistics.median(samples),
+        "min": min(samples),
+        "max": max(samples),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-seconds", type=float, default=None,
+                        help="exit 1 if the median import time exceeds this")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as upload_dir:
+        for _ in range(args.runs):
+            results.append(run_once(upload_dir))
+
+    report = {
+        "import_seconds": summarize([r["import_seconds"] for r in results]),
+        "startup_seconds": summarize([r["startup_seconds"] for r in results]),
+    }
+    print(json.dumps(report, indent=2))
+    if args.max_import_seconds is not None and report["import_seconds"]["median"] > args.max_import_seconds:
+        print(f"import time regression: median {report['import_seconds']['median']:.3f}s "
+              f"> {args.max_import_seconds:.3f}s", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
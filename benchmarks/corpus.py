@@ -0,0 +1,76 @@
+# benchmarks/corpus.py
+"""Benchmark documents: the samples under ``static/`` plus generated large files."""
+import random
+from pathlib import Path
+from typing import Dict
+
+from docx import Document
+
+ROOT = Path(__file__).resolve().parent.parent
+SAMPLE_SUFFIXES = (".pdf", ".docx")
+
+_WORDS = (
+    "the compliance report lists each issue found in teh document and suggests a fix for it "
+    "reviewers recieve the corrected file once every paragraph has been checked and rewritten "
+    "please keep seperate sections short so that they can definately be processed quickly"
+).split()
+
+
+def sample_files() -> Dict[str, Path]:
+    """One file per distinct sample name under static/ (uploads are stored as static/<doc_id>/<name>)."""
+    found: Dict[str, Path] = {}
+    for path in sorted((ROOT / "static").glob("*/*")):
+        if path.suffix.lower() in SAMPLE_SUFFIXES and not path.name.startswith("fixed_"):
+            found.setdefault(path.name, path)
+    return found
+
+
+def paragraphs(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield " ".join(rng.choice(_WORDS) for _ in range(rng.randint(20, 60))).capitalize() + "."
+
+
+def make_docx(path: Path, paragraph_count: int) -> Path:
+    doc = Document()
+    for para in paragraphs(paragraph_count):
+        doc.add_paragraph(para)
+    doc.save(path)
+    return path
+
+
+def make_pdf(path: Path, page_count: int, lines_per_page: int = 40) -> Path:
+    """A text-layer PDF with ``lines_per_page`` lines of Helvetica per page."""
+    text = iter(paragraphs(page_count * lines_per_page, seed=1))
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for _ in range(page_count):
+        lines = [next(text)[:95] for _ in range(lines_per_page)]
+        stream = "BT /F1 9 Tf 11 TL 40 760 Td " + " ".join(f"({line}) '" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    path.write_bytes(bytes(out))
+    return path
+
+
+def build(workdir: Path, large_pages: int = 60, large_paragraphs: int = 600) -> Dict[str, Path]:
+    """Samples plus a generated large PDF and DOCX, keyed by a short name."""
+    docs = dict(sample_files())
+    docs[f"generated_{large_pages}p.pdf"] = make_pdf(workdir / f"generated_{large_pages}p.pdf", large_pages)
+    docs[f"generated_{large_paragraphs}para.docx"] = make_docx(workdir / f"generated_{large_paragraphs}para.docx", large_paragraphs)
+    return docs
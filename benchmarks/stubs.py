@@ -0,0 +1,126 @@
+# benchmarks/stubs.py
+"""Offline stand-ins for Mistral and LanguageTool used by the benchmark suite."""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import List
+
+# typos the fake LanguageTool flags, with the replacement it suggests
+TYPOS = {"teh": "the", "recieve": "receive", "seperate": "separate", "definately": "definitely"}
+_TYPO_RE = re.compile(r"\b(" + "|".join(TYPOS) + r")\b")
+
+
+class _MistralHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        stub = self.server.stub
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.endswith("/generate"):
+            return self._json(404, {"detail": "not found"})
+        if stub.should_rate_limit():
+            return self._json(429, {"detail": "rate limited"}, {"Retry-After": "0"})
+
+        prompt = body["messages"][0]["content"]
+        # echo the passage back with the known typos fixed, like a well-behaved editor
+        answer = _TYPO_RE.sub(lambda m: TYPOS[m.group(1)], prompt.split("Passage:\n")[-1].split("(no commentary).\n\n")[-1])
+        time.sleep(stub.latency)
+        if body.get("stream"):
+            return self._stream(answer, stub.token_delay)
+        self._json(200, {"choices": [{"message": {"content": answer}}]})
+
+    def _json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, answer, token_delay):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        # ~4 characters per token
+        for i in range(0, len(answer), 4):
+            self._chunk(f"data: {json.dumps({'choices': [{'delta': {'content': answer[i:i + 4]}}]})}\n\n")
+            if token_delay:
+                time.sleep(token_delay)
+        self._chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+class StubMistral:
+    """Local HTTP server speaking the subset of the Mistral API the app uses.
+
+    ``latency`` is added to every completion, ``token_delay`` between streamed
+    tokens, and every ``rate_limit_every``-th request gets a 429.
+    """
+
+    def __init__(self, latency: float = 0.05, token_delay: float = 0.0, rate_limit_every: int = 0):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.rate_limit_every = rate_limit_every
+        self.requests = 0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _MistralHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def should_rate_limit(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            if self.rate_limit_every and self.requests % self.rate_limit_every == 0:
+                self.rate_limited += 1
+                return True
+            return False
+
+    def start(self) -> "StubMistral":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class FakeLanguageTool:
+    """LanguageTool backend stand-in: flags ``TYPOS`` after a fixed per-paragraph delay."""
+
+    def __init__(self, delay: float = 0.002):
+        self.delay = delay
+
+    def _server_is_alive(self) -> bool:
+        return True
+
+    def check(self, text: str) -> List[SimpleNamespace]:
+        time.sleep(self.delay)
+        return [
+            SimpleNamespace(
+                offset=m.start(), errorLength=len(m.group(1)), message="Possible spelling mistake found.",
+                replacements=[TYPOS[m.group(1)]], ruleIssueType="misspelling", context=text,
+            )
+            for m in _TYPO_RE.finditer(text)
+        ]
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,233 @@
+# benchmarks/suite.py
+"""End-to-end performance benchmark, fully offline.
+
+Mistral is replaced by a local HTTP stub (``--llm-latency``, ``--token-delay``,
+``--rate-limit-every`` for 429 injection; streaming supported) and LanguageTool
+by an in-process fake backend, so results measure this service and not the
+network. Documents are the samples under ``static/`` plus a generated large
+PDF and DOCX.
+
+Measured:
+  * ``stage.<stage>.<document>`` - median seconds of ``extract_text``,
+    ``analyze_text``, ``rewrite_text`` and ``save_fixed_doc`` per document
+  * ``e2e.<endpoint>.*``          - ``/report`` and ``/fix`` (full, streamed and
+    ``mode=fast``) throughput and p50/p95 latency under ``--clients``
+    concurrent clients
+  * ``peak_rss_mb``               - this process plus worker processes
+  * ``cold_start.*``              - see ``cold_start.py``
+
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --save-baseline benchmarks/baseline.json
+    python benchmarks/suite.py --baseline benchmarks/baseline.json --tolerance 0.25   # exit 1 on regression
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import corpus
+from cold_start import run_once as cold_start_once
+from stubs import FakeLanguageTool, StubMistral
+
+# lower is better for everything except throughput
+_HIGHER_IS_BETTER = ("requests_per_second",)
+
+
+def _median_seconds(fn: Callable[[], object], runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+def _configure_environment(stub: StubMistral, upload_dir: str) -> None:
+    # must happen before the first `import app...`: settings are read at import time
+    os.environ.update(
+        UPLOAD_DIR=upload_dir,
+        MISTRAL_API_KEY="benchmark",
+        MISTRAL_BASE_URL=stub.base_url,
+        MISTRAL_HTTP2="0",
+        MISTRAL_BACKOFF_BASE="0.01",
+        MISTRAL_RATE_PER_MINUTE="0",
+        LLM_CACHE_ENABLED="0",
+        LANGUAGE_TOOL_WARMUP="0",
+        AGENT_WORKERS="0",
+    )
+    os.environ.pop("API_KEY", None)
+
+
+def _install_fake_languagetool(delay: float) -> None:
+    from app.config import LANGUAGE_TOOL_LANG, LANGUAGE_TOOL_POOL_SIZE
+    from app.services import compliance_service
+    from app.services.languagetool_pool import LanguageToolPool
+
+    compliance_service.close_pool()
+    compliance_service._pool = LanguageToolPool(LANGUAGE_TOOL_POOL_SIZE, LANGUAGE_TOOL_LANG, factory=lambda: FakeLanguageTool(delay))
+
+
+def bench_stages(docs: Dict[str, Path], runs: int) -> Dict[str, float]:
+    from app.services import compliance_service
+    from app.services.extraction_service import extract_text
+    from app.services.rewrite_service import rewrite_text
+    from app.services.storage_service import save_fixed_doc
+
+    results = {}
+    for name, path in docs.items():
+        text = extract_text(path, use_cache=False)
+        corrected = rewrite_text(text)
+        timings = {
+            "extract_text": lambda: extract_text(path, use_cache=False),
+            # a cleared paragraph cache makes every run a first analysis
+            "analyze_text": lambda: (compliance_service._PARAGRAPH_CACHE.clear(), compliance_service.analyze_text(text)),
+            "rewrite_text": lambda: rewrite_text(text),
+            "save_fixed_doc": lambda: save_fixed_doc(f"bench-{Path(name).stem}", corrected),
+        }
+        for stage, fn in timings.items():
+            results[f"stage.{stage}.{name}"] = _median_seconds(fn, runs)
+    return results
+
+
+async def _e2e(docs: Dict[str, Path], clients: int, requests_per_client: int) -> Dict[str, float]:
+    import httpx
+
+    from app.main import app
+    from app.services import compliance_service
+
+    results: Dict[str, float] = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            doc_ids = []
+            for name, path in docs.items():
+                r = await client.post("/upload/", files={"file": (name, path.read_bytes())})
+                r.raise_for_status()
+                doc_ids.append(r.json()["doc_id"])
+
+            for endpoint, method, url in (
+                ("report", "GET", "/report/{doc_id}"),
+                ("fix", "POST", "/fix/{doc_id}"),
+                ("fix_stream", "POST", "/fix/{doc_id}?stream=true"),
+                ("fix_fast", "POST", "/fix/{doc_id}?mode=fast"),
+            ):
+                latencies: List[float] = []
+
+                async def worker(offset: int) -> None:
+                    for i in range(requests_per_client):
+                        doc_id = doc_ids[(offset + i) % len(doc_ids)]
+                        compliance_service._PARAGRAPH_CACHE.clear()
+                        t0 = time.perf_counter()
+                        r = await client.request(method, url.format(doc_id=doc_id))
+                        r.raise_for_status()
+                        latencies.append(time.perf_counter() - t0)
+
+                t0 = time.perf_counter()
+                await asyncio.gather(*(worker(c) for c in range(clients)))
+                elapsed = time.perf_counter() - t0
+                latencies.sort()
+                results[f"e2e.{endpoint}.requests_per_second"] = len(latencies) / elapsed
+                results[f"e2e.{endpoint}.p50_seconds"] = latencies[len(latencies) // 2]
+                results[f"e2e.{endpoint}.p95_seconds"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return results
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS; children = extraction worker processes
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return (own + children) / (1024 * 1024)
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    """Metrics that got worse than ``baseline`` by more than ``tolerance`` (a fraction)."""
+    regressions = []
+    for name, old in sorted(baseline.items()):
+        new = results.get(name)
+        if new is None or not old:
+            continue
+        if name.endswith(_HIGHER_IS_BETTER):
+            worse = new < old * (1 - tolerance)
+        else:
+            worse = new > old * (1 + tolerance)
+        if worse:
+            regressions.append(f"{name}: {old:.4f} -> {new:.4f} ({(new - old) / old:+.0%})")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="repetitions per stage measurement")
+    parser.add_argument("--clients", type=int, default=4, help="concurrent clients for the end-to-end runs")
+    parser.add_argument("--requests", type=int, default=3, help="requests per client and endpoint")
+    parser.add_argument("--large-pages", type=int, default=60)
+    parser.add_argument("--large-paragraphs", type=int, default=600)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds added to every stub completion")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed stub tokens")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer every Nth stub request with 429")
+    parser.add_argument("--lt-delay", type=float, default=0.002, help="seconds per paragraph in the fake LanguageTool")
+    parser.add_argument("--cold-start-runs", type=int, default=3)
+    parser.add_argument("--output", type=Path, help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", type=Path, help="compare against this results file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs the baseline (0.2 = 20%%)")
+    parser.add_argument("--save-baseline", type=Path, help="also write the results as the new baseline")
+    args = parser.parse_args()
+
+    stub = StubMistral(args.llm_latency, args.token_delay, args.rate_limit_every).start()
+    metrics: Dict[str, float] = {}
+    try:
+        with tempfile.TemporaryDirectory() as upload_dir, tempfile.TemporaryDirectory() as workdir:
+            _configure_environment(stub, upload_dir)
+            cold = [cold_start_once(upload_dir) for _ in range(args.cold_start_runs)]
+            metrics["cold_start.import_seconds"] = statistics.median(r["import_seconds"] for r in cold)
+            metrics["cold_start.startup_seconds"] = statistics.median(r["startup_seconds"] for r in cold)
+
+            sys.path.insert(0, str(corpus.ROOT))
+            _install_fake_languagetool(args.lt_delay)
+            docs = corpus.build(Path(workdir), args.large_pages, args.large_paragraphs)
+            metrics.update(bench_stages(docs, args.runs))
+            _install_fake_languagetool(args.lt_delay)
+            metrics.update(asyncio.run(_e2e(docs, args.clients, args.requests)))
+            metrics["peak_rss_mb"] = peak_rss_mb()
+    finally:
+        stub.stop()
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "documents": sorted(docs),
+            "stub_requests": stub.requests,
+            "stub_rate_limited": stub.rate_limited,
+            "args": {k: str(v) for k, v in vars(args).items()},
+        },
+        "metrics": metrics,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        args.output.write_text(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        args.save_baseline.write_text(text + "\n")
+
+    if args.baseline:
+        regressions = compare(metrics, json.loads(args.baseline.read_text())["metrics"], args.tolerance)
+        for line in regressions:
+            print(f"regression: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+# tests/test_agent_orchestrator.py
+import threading
+from pathlib import Path
+
+import pytest
+
+from app.services import agent_orchestrator
+from app.services.agent_orchestrator import SimpleAgentOrchestrator, Step, run_graph
+from app.services.job_store import JobStore
+
+
+def test_independent_steps_run_concurrently():
+    both_started = threading.Barrier(2, timeout=5)
+
+    def side(job, deps):
+        both_started.wait()  # times out unless the other side runs at the same time
+        return deps["root"] + 1
+
+    steps = [
+        Step("root", (), lambda job, deps: 1),
+        Step("left", ("root",), side),
+        Step("right", ("root",), side),
+        Step("join", ("left", "right"), lambda job, deps: deps["left"] + deps["right"]),
+    ]
+    done = []
+    results = run_graph(steps, {}, lambda name, result: done.append(name), {"id": "job"})
+    assert results["join"] == 4
+    assert done[0] == "root" and done[-1] == "join"
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    calls = {"extract": 0, "plan": 0, "rewrite": 0, "fail_rewrite": 0, "languagetool_down": False}
+
+    def extract_text(path):
+        calls["extract"] += 1
+        return "Teh first paragraph.\n\nThe second one."
+
+    def generate_text(prompt, **kwargs):
+        calls["plan"] += 1
+        return "1. Fix spelling."
+
+    def rewrite_text(text, instructions=None, priority=None):
+        calls["rewrite"] += 1
+        if calls["fail_rewrite"]:
+            calls["fail_rewrite"] -= 1
+            raise RuntimeError("Mistral unavailable")
+        assert "1. Fix spelling." in instructions
+        if not calls["languagetool_down"]:
+            assert '"Teh": Possible spelling mistake' in instructions
+        return text.replace("Teh", "The")
+
+    issue = {"offset_start": 0, "offset_end": 3, "message": "Possible spelling mistake"}
+
+    def check_text(text):
+        if calls["languagetool_down"]:
+            raise RuntimeError("Java not found")
+        return [issue]
+
+    monkeypatch.setattr(agent_orchestrator, "get_uploaded_file_path", lambda doc_id: Path(f"{doc_id}.pdf"))
+    monkeypatch.setattr(agent_orchestrator, "get_manifest", lambda doc_id: {"sha256": "content-hash"})
+    monkeypatch.setattr(agent_orchestrator, "extract_text", extract_text)
+    monkeypatch.setattr(agent_orchestrator, "check_text", check_text)
+    monkeypatch.setattr(agent_orchestrator, "generate_text", generate_text)
+    monkeypatch.setattr(agent_orchestrator, "rewrite_text", rewrite_text)
+    monkeypatch.setattr(agent_orchestrator, "save_fixed_doc", lambda doc_id, text: Path(f"fixed_{doc_id}.docx"))
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    return SimpleAgentOrchestrator(workers=0, store=store), store, calls
+
+
+def _run(orchestrator, store, job_id, doc_id, goal):
+    store.enqueue(job_id, doc_id, goal)
+    orchestrator._run_claimed(store.claim(orchestrator._owner))
+
+
+def test_plan_is_reused_for_the_same_goal_and_document(pipeline):
+    orchestrator, store, calls = pipeline
+    _run(orchestrator, store, "j1", "doc", "Fix the spelling.")
+    _run(orchestrator, store, "j2", "other-doc-same-content", "  fix THE spelling ")
+
+    assert store.get_status("j1") == store.get_status("j2") == "completed"
+    assert calls["plan"] == 1
+    assert any("Reusing cached plan" in entry["msg"] for entry in store.get_job("j2")["logs"])
+
+
+def test_retried_job_resumes_after_last_completed_step(pipeline):
+    orchestrator, store, calls = pipeline
+    calls["fail_rewrite"] = 1
+    _run(orchestrator, store, "j1", "doc", "Fix the spelling.")
+    assert store.get_status("j1") == "queued"
+    assert set(store.get_steps("j1")) == {"extract", "analyze", "plan"}
+
+    orchestrator._run_claimed(store.claim(orchestrator._owner))
+    assert store.get_status("j1") == "completed"
+    assert calls["extract"] == 1 and calls["plan"] == 1 and calls["rewrite"] == 2
+    assert store.get_steps("j1") == {}
+    logs = [entry["msg"] for entry in store.get_job("j1")["logs"]]
+    assert any(m.startswith("Resuming after completed steps") for m in logs)
+
+
+def test_job_completes_without_languagetool(pipeline):
+    orchestrator, store, calls = pipeline
+    calls["languagetool_down"] = True
+    _run(orchestrator, store, "j1", "doc", "Fix the spelling.")
+
+    assert store.get_status("j1") == "completed"
+    assert calls["rewrite"] == 1
+    logs = [entry["msg"] for entry in store.get_job("j1")["logs"]]
+    assert "LanguageTool unavailable, continuing without analysis: Java not found" in logs
@@ -1,5 +1,6 @@
 ﻿# tests/test_api.py
 import io
+import json
 import os
 from fastapi.testclient import TestClient
 from app.main import app
@@ -14,6 +15,12 @@ def test_health():
     assert r.json()["status"] == "ok"
 
 
+def test_ready_probe_reports_languagetool_state():
+    r = client.get("/health/ready")
+    assert r.status_code in (200, 503)
+    assert r.json()["status"] == "ready" if r.status_code == 200 else r.json()["status"] in ("warming", "unavailable")
+
+
 def test_upload_docx_and_report(tmp_path):
     # create sample docx
     p = tmp_path / "sample.docx"
@@ -40,3 +47,95 @@ def test_upload_unsupported_file():
     r = client.post("/upload/", files={"file": ("f.txt", io.BytesIO(b"hello"), "text/plain")})
     assert r.status_code == 400
 
+
+def test_batch_upload_reports_each_file():
+    buf = io.BytesIO()
+    doc = Document()
+    doc.add_paragraph("Batch item.")
+    doc.save(buf)
+    files = [
+        ("files", ("good.docx", buf.getvalue(), "application/vnd.openxmlformats-officedocument.wordprocessingml.document")),
+        ("files", ("bad.txt", b"hello", "text/plain")),
+    ]
+    r = client.post("/upload/batch", files=files)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = sorted((json.loads(line) for line in r.text.splitlines()), key=lambda item: item["index"])
+    assert lines[0]["status"] == "ok" and lines[0]["filename"] == "good.docx" and lines[0]["doc_id"]
+    assert lines[1]["status"] == "error" and lines[1]["status_code"] == 400
+
+
+def test_batch_report_fails_per_item():
+    r = client.post("/report/batch", json={"doc_ids": ["does-not-exist"]})
+    assert r.status_code == 200
+    [line] = [json.loads(line) for line in r.text.splitlines()]
+    assert line == {"index": 0, "doc_id": "does-not-exist", "status": "error", "status_code": 404, "detail": "Document not found"}
+
+
+def test_fix_stream_emits_paragraphs_then_done(monkeypatch):
+    from app.services import rewrite_service
+
+    async def fake_stream(prompt, **kwargs):
+        text = prompt.split("(no commentary).\n\n")[-1].upper()
+        for i in range(0, len(text), 5):
+            yield text[i:i + 5]
+
+    monkeypatch.setattr(rewrite_service, "astream_text", fake_stream)
+    buf = io.BytesIO()
+    doc = Document()
+    doc.add_paragraph("First line to fix.")
+    doc.add_paragraph("Second line to fix.")
+    doc.save(buf)
+    r = client.post("/upload/", files={"file": ("stream.docx", buf.getvalue(), "application/vnd.openxmlformats-officedocument.wordprocessingml.document")})
+    doc_id = r.json()["doc_id"]
+
+    r = client.post(f"/fix/{doc_id}?stream=true")
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = [
+        (block.split("\n")[0].removeprefix("event: "), json.loads(block.split("data: ", 1)[1]))
+        for block in r.text.strip().split("\n\n")
+    ]
+    assert [data["text"] for kind, data in events if kind == "paragraph"] == ["FIRST LINE TO FIX.", "SECOND LINE TO FIX."]
+    kind, done = events[-1]
+    assert kind == "done" and done["paragraphs"] == 2 and done["fixed_filename"] == f"fixed_{doc_id}.docx"
+    fixed = Document(io.BytesIO(client.get(f"/download/fixed/{doc_id}").content))
+    assert [p.text for p in fixed.paragraphs] == ["FIRST LINE TO FIX.", "SECOND LINE TO FIX."]
+
+
+def test_fast_fix_needs_no_llm(monkeypatch):
+    from app.api import fix
+    from app.services import compliance_service, rewrite_service
+    from app.services.languagetool_pool import LanguageToolPool
+    from tests.test_languagetool_pool import FakeTool
+
+    async def no_llm(*args, **kwargs):
+        raise AssertionError("mode=fast must not call Mistral")
+
+    pool = LanguageToolPool(1, "en-US", factory=FakeTool)
+    monkeypatch.setattr(compliance_service, "_pool", pool)
+    monkeypatch.setattr(rewrite_service, "agenerate_text", no_llm)
+    monkeypatch.setattr(fix, "MISTRAL_API_KEY", None)
+    buf = io.BytesIO()
+    doc = Document()
+    doc.add_paragraph("Fix teh typo.")
+    doc.add_paragraph("Nothing wrong here.")
+    doc.save(buf)
+    r = client.post("/upload/", files={"file": ("fast.docx", buf.getvalue(), "application/vnd.openxmlformats-officedocument.wordprocessingml.document")})
+    doc_id = r.json()["doc_id"]
+    try:
+        r = client.post(f"/fix/{doc_id}?mode=fast&escalate=true")
+    finally:
+        pool.close()
+    assert r.status_code == 200
+    fixed = Document(io.BytesIO(client.get(f"/download/fixed/{doc_id}").content))
+    assert [p.text for p in fixed.paragraphs] == ["Fix the typo.", "Nothing wrong here."]
+
+
+def test_oversized_upload_rejected_before_the_body_is_read(monkeypatch):
+    import app.main
+
+    monkeypatch.setattr(app.main, "MAX_FILE_SIZE", 1000)
+    monkeypatch.setattr(app.main, "_FORM_OVERHEAD", 100)
+    files = {"file": ("big.pdf", b"%PDF-" + b"x" * 5000, "application/pdf")}
+    r = client.post("/upload/", files=files)
+    assert r.status_code == 413
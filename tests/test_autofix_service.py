@@ -0,0 +1,67 @@
+# tests/test_autofix_service.py
+from app.services import autofix_service
+from app.services.extraction_service import _with_offsets
+from tests.test_compliance_service import compliance  # noqa: F401  (fixture)
+
+
+def issue(text, word, suggestion, severity="medium", occurrence=0, rule_type="misspelling", suggestion_count=1):
+    start = -1
+    for _ in range(occurrence + 1):
+        start = text.index(word, start + 1)
+    return {
+        "offset_start": start, "offset_end": start + len(word), "suggestion": suggestion, "severity": severity,
+        "rule_type": rule_type, "suggestion_count": suggestion_count,
+    }
+
+
+def test_suggestions_are_applied_in_one_pass_and_overlaps_resolved():
+    text = "Teh cat sit on teh mat. It were fine."
+    issues = [
+        issue(text, "Teh", "The"),
+        issue(text, "cat sit", "cat sits", severity="high", rule_type="grammar"),
+        issue(text, "sit", "sat"),  # overlaps the high-severity edit and loses
+        issue(text, "teh", "the"),
+        issue(text, "were", None),  # no suggestion: left for later
+    ]
+    fixed, unresolved = autofix_service.apply_suggestions(text, issues)
+    assert fixed == "The cat sits on the mat. It were fine."
+    assert sorted(i["suggestion"] or "" for i in unresolved) == ["", "sat"]
+    # unresolved offsets point into the fixed text
+    left = next(i for i in unresolved if i["suggestion"] is None)
+    assert fixed[left["offset_start"]:left["offset_end"]] == "were"
+
+
+def test_only_unambiguous_spelling_and_grammar_fixes_are_applied():
+    text = "We met Jhon in paris. Teh plan , it were fine. Utilize it."
+    issues = [
+        issue(text, "Jhon", "John"),  # capitalized mid-sentence: likely a name
+        issue(text, "paris", "Paris", rule_type="typographical"),
+        issue(text, "Teh", "The"),  # capitalized at a sentence start: a real typo
+        issue(text, " ,", ",", rule_type="whitespace"),
+        issue(text, "were", "was", rule_type="grammar", suggestion_count=2),
+        issue(text, "Utilize", "Use", rule_type="style"),
+    ]
+    fixed, unresolved = autofix_service.apply_suggestions(text, issues)
+    assert fixed == "We met Jhon in paris. The plan , it were fine. Utilize it."
+    assert [i["suggestion"] for i in unresolved] == ["John", "Paris", ",", "was", "Use"]
+
+
+def test_casing_only_change_is_not_applied_even_when_allowlisted():
+    text = "the end"
+    fixed, unresolved = autofix_service.apply_suggestions(text, [issue(text, "the", "The", rule_type="grammar")])
+    assert fixed == text and len(unresolved) == 1
+
+
+def test_same_severity_overlap_keeps_the_earlier_match():
+    text = "a bb c"
+    fixed, unresolved = autofix_service.apply_suggestions(
+        text, [issue(text, "bb c", "X"), issue(text, "a bb", "Y")]
+    )
+    assert fixed == "Y c"
+    assert len(unresolved) == 1
+
+
+def test_autofix_pages_uses_languagetool_only(compliance):  # noqa: F811
+    fixed, unresolved = autofix_service.autofix_pages(_with_offsets(["Page one has teh typo.", "", "Page two teh."]))
+    assert fixed == "Page one has the typo.\nPage two the."
+    assert unresolved == []
@@ -0,0 +1,126 @@
+# tests/test_compliance_service.py
+from types import SimpleNamespace
+
+import pytest
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import compliance_service
+from app.services.languagetool_pool import LanguageToolPool
+from tests.test_languagetool_pool import FakeTool
+
+
+class CountingTool(FakeTool):
+    checked = []
+
+    def check(self, text):
+        CountingTool.checked.append(text)
+        return super().check(text)
+
+
+@pytest.fixture
+def compliance(monkeypatch):
+    module = compliance_service
+    pool = LanguageToolPool(2, "en-US", factory=CountingTool)
+    monkeypatch.setattr(module, "_pool", pool)
+    monkeypatch.setattr(module, "MISTRAL_API_KEY", None)
+    module._PARAGRAPH_CACHE.clear()
+    CountingTool.checked = []
+    yield module
+    pool.close()
+
+
+def test_offsets_are_document_global(compliance):
+    text = "Clean intro.\n\nSecond has teh typo.\n\nThird teh too."
+    issues = compliance.analyze_text(text)["issues"]
+    assert [text[i["offset_start"]:i["offset_end"]] for i in issues] == ["teh", "teh"]
+
+
+def test_only_new_paragraphs_are_rechecked(compliance):
+    before = compliance.cache_stats()
+    original = "Intro paragraph.\n\nBody with teh typo.\n\nClosing words."
+    compliance.analyze_text(original)
+    assert len(CountingTool.checked) == 3
+
+    CountingTool.checked = []
+    edited = "A brand new opening line.\n\n" + original
+    issues = compliance.analyze_text(edited)["issues"]
+    assert CountingTool.checked == ["A brand new opening line."]
+    # the cached match moved along with its paragraph
+    assert [edited[i["offset_start"]:i["offset_end"]] for i in issues] == ["teh"]
+
+    stats = compliance.cache_stats()
+    assert stats["hits"] - before["hits"] == 3
+    assert stats["misses"] - before["misses"] == 4
+
+
+def test_pool_is_not_started_at_import(compliance, monkeypatch):
+    monkeypatch.setattr(compliance, "_pool", None)
+    monkeypatch.setattr(compliance, "_failure", None)
+    assert compliance.pool_stats() is None
+
+
+def test_pages_are_analyzed_with_document_offsets(compliance):
+    from app.services.extraction_service import _with_offsets, join_pages
+
+    pages = list(_with_offsets(["Page one is fine.", "", "Page teh three.\n\nMore teh."]))
+    text = join_pages(pages)
+    issues = compliance.analyze_pages(iter(pages))["issues"]
+    assert [text[i["offset_start"]:i["offset_end"]] for i in issues] == ["teh", "teh"]
+    assert issues[0]["offset_start"] == text.index("teh")
+
+
+@pytest.fixture
+def no_java(monkeypatch):
+    """Local servers fail to start, as they do on a host without Java."""
+    from app.services import languagetool_pool
+
+    state = SimpleNamespace(installed=False, attempts=0)
+
+    def local_tool(language):
+        state.attempts += 1
+        if not state.installed:
+            raise RuntimeError("No java install detected")
+        return FakeTool()
+
+    def public_api_tool():
+        raise AssertionError("document text must not go to the public API")
+
+    monkeypatch.setattr(languagetool_pool, "_local_tool", local_tool)
+    monkeypatch.setattr(compliance_service, "_public_api_tool", public_api_tool)
+    monkeypatch.setattr(compliance_service, "LANGUAGE_TOOL_POOL_SIZE", 1)
+    for name, value in (("_pool", None), ("_public_api", False), ("_failed_at", None), ("_failure", None)):
+        monkeypatch.setattr(compliance_service, name, value)
+    compliance_service._PARAGRAPH_CACHE.clear()
+    yield state
+    compliance_service.close_pool()
+
+
+def test_without_java_checks_fail_and_ready_stays_503_until_a_retry_succeeds(no_java, monkeypatch):
+    client = TestClient(app)
+    with pytest.raises(compliance_service.LanguageToolUnavailable, match="No java install detected"):
+        compliance_service.check_text("Some teh text.")
+    # within the retry interval the failure is reported without another start attempt
+    with pytest.raises(compliance_service.LanguageToolUnavailable):
+        compliance_service.check_text("Some teh text.")
+    assert no_java.attempts == 1
+    r = client.get("/health/ready")
+    assert r.status_code == 503 and r.json()["status"] == "unavailable"
+
+    no_java.installed = True
+    monkeypatch.setattr(compliance_service, "LANGUAGE_TOOL_RETRY_SECONDS", 0)
+    assert len(compliance_service.check_text("Some teh text.")) == 1
+    r = client.get("/health/ready")
+    assert r.status_code == 200 and r.json()["languagetool"]["backend"] == "local"
+
+
+def test_public_api_fallback_is_opt_in(no_java, monkeypatch):
+    monkeypatch.setattr(compliance_service, "LANGUAGE_TOOL_PUBLIC_API_FALLBACK", True)
+    monkeypatch.setattr(compliance_service, "_public_api_tool", FakeTool)
+
+    assert len(compliance_service.check_text("Some teh text.")) == 1
+    stats = compliance_service.pool_stats()
+    assert stats["backend"] == "public_api" and "No java install detected" in stats["error"]
+    r = TestClient(app).get("/health/ready")
+    assert r.status_code == 503
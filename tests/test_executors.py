@@ -0,0 +1,68 @@
+# tests/test_executors.py
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.services import executors
+
+
+def test_deadline_cancels_guarded_work():
+    stage = executors.StageExecutor("io", "thread", 1)
+    produced = []
+
+    def slow_items():
+        for n in range(100):
+            produced.append(n)
+            time.sleep(0.02)
+            yield n
+
+    async def main():
+        scope = executors.RequestScope(0.1)
+        with pytest.raises(HTTPException) as exc:
+            await scope.run(stage.run(list, scope.guard(slow_items())))
+        return exc.value.status_code
+
+    assert asyncio.run(main()) == 504
+    time.sleep(0.1)
+    # the worker thread stopped at the next item instead of running to the end
+    assert len(produced) < 20
+    stage.shutdown()
+
+
+def test_client_disconnect_cancels_request():
+    stage = executors.StageExecutor("io", "thread", 1)
+    release = threading.Event()
+    state = {"gone": False}
+
+    async def is_disconnected():
+        return state["gone"]
+
+    async def main():
+        scope = executors.RequestScope(10, is_disconnected)
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.1, state.update, {"gone": True})
+        with pytest.raises(HTTPException) as exc:
+            await scope.run(stage.run(release.wait, 5))
+        assert scope.cancelled.is_set()
+        return exc.value.status_code
+
+    assert asyncio.run(main()) == 499
+    release.set()
+    stage.shutdown()
+
+
+def test_stage_stats_report_saturation():
+    stage = executors.StageExecutor("io", "thread", 2)
+    gate = threading.Event()
+    futures = [stage.submit(gate.wait, 5) for _ in range(3)]
+    stats = stage.stats()
+    assert stats["active"] == 2 and stats["queued"] == 1 and stats["saturation"] == 1.0
+    gate.set()
+    for f in futures:
+        f.result()
+    time.sleep(0.05)
+    assert stage.stats()["completed"] == 3 and stage.stats()["active"] == 0
+    stage.shutdown()
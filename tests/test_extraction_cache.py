@@ -0,0 +1,54 @@
+# tests/test_extraction_cache.py
+from docx import Document
+
+from app.services import extraction_service
+
+
+def _make_docx(path, text):
+    doc = Document()
+    doc.add_paragraph(text)
+    doc.save(path)
+    return path
+
+
+def _count_extractions(monkeypatch):
+    calls = []
+    real = extraction_service._extract_docx
+
+    def counting(path):
+        calls.append(path)
+        return real(path)
+
+    monkeypatch.setattr(extraction_service, "_extract_docx", counting)
+    return calls
+
+
+def test_repeat_extraction_hits_memory_then_disk(tmp_path, monkeypatch):
+    calls = _count_extractions(monkeypatch)
+    p = _make_docx(tmp_path / "a.docx", "This are wrong.")
+
+    assert extraction_service.extract_text(p) == "This are wrong."
+    assert extraction_service.extract_text(p) == "This are wrong."
+    assert len(calls) == 1
+
+    # a fresh process only has the on-disk tier
+    extraction_service._TEXT_CACHE.clear()
+    assert extraction_service.extract_text(p) == "This are wrong."
+    assert len(calls) == 1
+    assert (tmp_path / extraction_service.CACHE_FILENAME).exists()
+
+
+def test_extractor_version_bump_invalidates(tmp_path, monkeypatch):
+    calls = _count_extractions(monkeypatch)
+    p = _make_docx(tmp_path / "b.docx", "Versioned text.")
+    extraction_service.extract_text(p)
+
+    extraction_service._TEXT_CACHE.clear()
+    monkeypatch.setattr(extraction_service, "EXTRACTOR_VERSION", "test-next")
+    extraction_service.extract_text(p)
+    assert len(calls) == 2
+
+
+def test_memory_budget_counts_utf8_bytes():
+    pages = ("café", "日本")
+    assert extraction_service._TEXT_CACHE._sizeof(pages) == len("café".encode()) + len("日本".encode())
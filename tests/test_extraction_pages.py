@@ -0,0 +1,67 @@
+# tests/test_extraction_pages.py
+from app.services import executors, extraction_service
+
+
+def make_pdf(path, pages):
+    """Write a minimal PDF with one line of Helvetica text per page ("" = blank page)."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET" if text else ""
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    path.write_bytes(bytes(out))
+    return path
+
+
+def test_pages_stream_in_order_with_document_offsets(tmp_path, monkeypatch):
+    monkeypatch.setattr(extraction_service, "EXTRACT_PAGES_PER_TASK", 2)
+    texts = [f"Page {n} text" for n in range(1, 6)]
+    texts[2] = ""
+    p = make_pdf(tmp_path / "doc.pdf", texts)
+
+    pages = list(extraction_service.iter_pages(p, use_cache=False))
+    assert [page.number for page in pages] == [1, 2, 3, 4, 5]
+    assert [page.text for page in pages] == texts
+
+    joined = extraction_service.extract_text(p, use_cache=False)
+    assert joined == "\n".join(t for t in texts if t)
+    for page in pages:
+        assert joined[page.offset_start:page.offset_end] == page.text
+
+
+def test_page_ranges_run_in_worker_processes(tmp_path, monkeypatch):
+    pool = executors.StageExecutor("cpu", "process", 2)
+    monkeypatch.setitem(executors._STAGES, "cpu", pool)
+    monkeypatch.setattr(extraction_service, "EXTRACT_PAGES_PER_TASK", 1)
+    texts = [f"Worker page {n} has a long enough text layer." for n in range(1, 7)]
+    p = make_pdf(tmp_path / "doc.pdf", texts)
+    try:
+        assert [page.text for page in extraction_service.iter_pages(p, use_cache=False)] == texts
+        assert pool.stats()["peak_in_flight"] > 1
+    finally:
+        pool.shutdown()
+
+
+def test_cached_pages_keep_their_numbers(tmp_path):
+    p = make_pdf(tmp_path / "doc.pdf", ["", "Second page", "Third page"])
+    first = list(extraction_service.iter_pages(p))
+    extraction_service._TEXT_CACHE.clear()
+    # served from the on-disk tier this time
+    assert list(extraction_service.iter_pages(p)) == first
+    assert first[1].number == 2 and first[1].offset_start == 0
@@ -0,0 +1,46 @@
+# tests/test_job_events.py
+import asyncio
+import threading
+
+from app.services.job_events import stream_job_events
+from app.services.job_store import JobStore
+
+
+async def _collect(store, job_id, since=0):
+    return [chunk async for chunk in stream_job_events(store, job_id, since=since, heartbeat=0.05, poll=0.05)]
+
+
+def test_stream_pushes_logs_and_status_until_job_finishes(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    store.enqueue("j1", "doc", "goal")
+
+    def worker():
+        store.claim("w")
+        for i in range(3):
+            store.append_log("j1", f"step {i}")
+        store.finish("j1", "w", "completed")
+
+    async def scenario():
+        collector = asyncio.ensure_future(_collect(store, "j1"))
+        await asyncio.sleep(0.1)
+        threading.Thread(target=worker).start()
+        return await asyncio.wait_for(collector, timeout=5)
+
+    events = asyncio.run(scenario())
+    body = "".join(events)
+    assert "event: status\ndata: {\"status\": \"queued\"}" in body
+    assert [line for line in body.splitlines() if line.startswith("id: ")] == ["id: 1", "id: 2", "id: 3"]
+    assert body.rstrip().endswith('event: end\ndata: {"status": "completed"}')
+    assert ": keep-alive" in body
+
+
+def test_stream_resumes_after_last_event_id(tmp_path):
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    store.enqueue("j1", "doc", "goal")
+    store.claim("w")
+    for i in range(4):
+        store.append_log("j1", f"step {i}")
+    store.finish("j1", "w", "failed")
+
+    body = "".join(asyncio.run(_collect(store, "j1", since=2)))
+    assert [line for line in body.splitlines() if line.startswith("id: ")] == ["id: 3", "id: 4"]
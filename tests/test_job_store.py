@@ -0,0 +1,78 @@
+# tests/test_job_store.py
+import json
+import time
+
+from app.services.job_store import JobStore
+
+
+def test_each_job_is_claimed_by_one_worker(tmp_path):
+    q = JobStore(tmp_path / "jobs.sqlite3")
+    q.enqueue("j1", "doc", "goal")
+    q.enqueue("j2", "doc", "goal")
+
+    first = q.claim("worker-a")
+    second = q.claim("worker-b")
+    assert {first["id"], second["id"]} == {"j1", "j2"}
+    assert q.claim("worker-c") is None
+
+    q.finish(first["id"], "worker-a", "completed")
+    stats = q.stats()
+    assert stats["depth"] == 0 and stats["running"] == 1 and stats["completed"] == 1
+
+
+def test_expired_lease_is_requeued_then_failed_after_max_attempts(tmp_path):
+    q = JobStore(tmp_path / "jobs.sqlite3", lease_seconds=0.05, max_attempts=2)
+    q.enqueue("j1", "doc", "goal")
+
+    assert q.claim("crashed-worker")["attempts"] == 1
+    time.sleep(0.1)
+    assert not q.heartbeat("j1", "crashed-worker")
+    assert q.requeue_expired() == 1
+    claimed = q.claim("next-worker")
+    assert claimed["id"] == "j1" and claimed["attempts"] == 2
+
+    time.sleep(0.1)
+    q.requeue_expired()
+    assert q.claim("another-worker") is None
+    assert q.stats()["failed"] == 1
+
+
+def test_logs_are_appended_and_read_incrementally(tmp_path):
+    q = JobStore(tmp_path / "jobs.sqlite3")
+    q.enqueue("j1", "doc", "goal")
+    for i in range(5):
+        q.append_log("j1", f"line {i}")
+
+    assert [e["msg"] for e in q.get_job("j1")["logs"]] == [f"line {i}" for i in range(5)]
+    assert [e["seq"] for e in q.get_job("j1", since=3)["logs"]] == [4, 5]
+
+
+def test_listing_is_paginated_and_filtered(tmp_path):
+    q = JobStore(tmp_path / "jobs.sqlite3")
+    for i in range(7):
+        q.enqueue(f"j{i}", "doc-a" if i % 2 else "doc-b", "goal")
+    q.claim("w")  # j0 -> running
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = q.list_jobs(limit=3, cursor=cursor)
+        seen.extend(j["id"] for j in page)
+        if cursor is None:
+            break
+    assert seen == [f"j{i}" for i in reversed(range(7))]
+
+    assert {j["id"] for j in q.list_jobs(doc_id="doc-a")[0]} == {"j1", "j3", "j5"}
+    assert [j["id"] for j in q.list_jobs(status="running")[0]] == ["j0"]
+
+
+def test_legacy_json_jobs_are_imported(tmp_path):
+    legacy = {"id": "old", "doc_id": "d", "goal": "g", "status": "running",
+              "logs": [{"ts": 1.0, "msg": "Extracting text from document"}]}
+    (tmp_path / "old.json").write_text(json.dumps(legacy))
+    q = JobStore(tmp_path / "jobs.sqlite3")
+
+    assert q.import_legacy_json(tmp_path) == 1
+    job = q.get_job("old")
+    assert job["status"] == "queued"
+    assert job["logs"][0]["msg"] == "Extracting text from document"
+    assert not (tmp_path / "old.json").exists()
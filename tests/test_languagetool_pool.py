@@ -0,0 +1,108 @@
+# tests/test_languagetool_pool.py
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.languagetool_pool import LanguageToolPool, split_paragraphs
+
+
+class FakeTool:
+    """Stands in for a LanguageTool server: flags every occurrence of "teh"."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.alive = True
+        self.closed = False
+
+    def _server_is_alive(self):
+        return self.alive
+
+    def check(self, text):
+        if not self.alive:
+            raise ConnectionError("server gone")
+        time.sleep(self.delay)
+        start = text.find("teh")
+        if start < 0:
+            return []
+        return [SimpleNamespace(offset=start, errorLength=3, message="typo", replacements=["the"], ruleIssueType="misspelling")]
+
+    def close(self):
+        self.closed = True
+
+
+def test_split_paragraphs_offsets_point_into_document():
+    text = "First teh line.\n\n  \r\nSecond para teh.\r\nlast\n\nThird."
+    segments = split_paragraphs(text)
+    assert [s for _, s in segments] == ["First teh line.", "Second para teh.\r\nlast", "Third."]
+    for offset, segment in segments:
+        assert text[offset:offset + len(segment)] == segment
+
+
+def test_sentence_wrapped_across_lines_stays_in_one_paragraph():
+    text = "It is hard to\nunderstand clearly what the writer\ntrying say.\n\nNext paragraph."
+    segments = split_paragraphs(text)
+    assert [s for _, s in segments] == [
+        "It is hard to\nunderstand clearly what the writer\ntrying say.",
+        "Next paragraph.",
+    ]
+
+
+def test_long_paragraphs_are_cut_after_a_sentence_end():
+    text = "One two.\nthree four\nfive six.\nseven"
+    segments = split_paragraphs(text, max_chars=25)
+    assert [s for _, s in segments] == ["One two.", "three four\nfive six.", "seven"]
+    for offset, segment in segments:
+        assert text[offset:offset + len(segment)] == segment
+
+
+def test_segments_are_checked_in_parallel_and_keep_order():
+    tools = []
+
+    def factory():
+        tools.append(FakeTool(delay=0.2))
+        return tools[-1]
+
+    pool = LanguageToolPool(4, "en-US", factory=factory)
+    try:
+        texts = [f"para {i} teh" if i % 2 else f"para {i}" for i in range(4)]
+        started = time.monotonic()
+        results = pool.check_many(texts)
+        assert time.monotonic() - started < 0.6
+        assert [len(r) for r in results] == [0, 1, 0, 1]
+        assert results[1][0].offset == texts[1].find("teh")
+        assert pool.stats()["segments_checked"] == 4
+    finally:
+        pool.close()
+    assert all(t.closed for t in tools)
+
+
+def test_crashed_backend_is_restarted():
+    tools = []
+
+    def factory():
+        tools.append(FakeTool())
+        return tools[-1]
+
+    pool = LanguageToolPool(1, "en-US", factory=factory)
+    tools[0].alive = False
+    assert pool.check("fix teh typo")[0].offset == 4
+    assert pool.stats() == {"size": 1, "healthy": 1, "idle": 1, "restarts": 1, "segments_checked": 1}
+    assert tools[0].closed and len(tools) == 2
+
+    tools[1].alive = False
+    assert pool.check_health()["healthy"] == 1
+    assert pool.restarts == 2
+    pool.close()
+
+
+def test_check_errors_on_a_healthy_backend_propagate():
+    class Broken(FakeTool):
+        def check(self, text):
+            raise ValueError("bad input")
+
+    pool = LanguageToolPool(1, "en-US", factory=Broken)
+    with pytest.raises(ValueError):
+        pool.check("anything")
+    assert pool.restarts == 0 and pool.stats()["idle"] == 1
+    pool.close()
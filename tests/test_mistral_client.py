@@ -0,0 +1,178 @@
+# tests/test_mistral_client.py
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.services.llm_cache import LLMResponseCache
+from app.services.mistral_client import MistralClient
+from app.services.mistral_scheduler import BACKGROUND, INTERACTIVE, RequestScheduler
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is observable
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server.requests.append((self.path, json.loads(body), self.client_address[1]))
+        if self.path.endswith("/generate"):
+            return self._reply(404, {"detail": "not found"})
+        if server.fail_next > 0:
+            server.fail_next -= 1
+            return self._reply(429, {"detail": "rate limited"}, server.retry_headers)
+        payload = json.loads(body)
+        prompt = payload["messages"][0]["content"]
+        if prompt == "no text":
+            return self._reply(200, {"unexpected": "shape"})
+        if payload.get("stream"):
+            return self._reply_stream([f"echo: {prompt}"[i:i + 3] for i in range(0, len(prompt) + 6, 3)])
+        self._reply(200, {"choices": [{"message": {"content": f"echo: {prompt}"}}]})
+
+    def _reply_stream(self, deltas):
+        events = [": keep-alive"] + [f"data: {json.dumps({'choices': [{'delta': {'content': d}}]})}" for d in deltas]
+        data = ("\n\n".join(events + ["data: [DONE]"]) + "\n\n").encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _reply(self, status, payload, extra_headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.requests = []
+    server.fail_next = 0
+    server.retry_headers = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(stub_server):
+    c = MistralClient("test-key", f"http://127.0.0.1:{stub_server.server_port}", backoff_base=0.01, http2=False)
+    yield c
+    c.close()
+
+
+def test_falls_back_to_chat_and_retries_429(stub_server, client):
+    stub_server.fail_next = 1
+    assert client.generate_text("hello", model="m") == "echo: hello"
+    paths = [p for p, _, _ in stub_server.requests]
+    assert paths == ["/v1/models/m/generate", "/v1/chat/completions", "/v1/chat/completions"]
+
+
+def test_connections_are_pooled_across_sync_and_async_calls(stub_server, client):
+    client.generate_text("one")
+    assert asyncio.run(client.agenerate_text("two")) == "echo: two"
+    client.generate_text("three")
+    ports = {port for _, _, port in stub_server.requests}
+    assert len(ports) == 1
+
+
+def test_response_cache_serves_repeats_and_honours_bypass(stub_server, tmp_path):
+    cache = LLMResponseCache(tmp_path / "llm.sqlite3", memory_items=8, max_rows=100, ttl=60)
+    c = MistralClient("test-key", f"http://127.0.0.1:{stub_server.server_port}", backoff_base=0.01, http2=False, cache=cache)
+    try:
+        assert c.generate_text("same") == "echo: same"
+        sent = len(stub_server.requests)
+        assert c.generate_text("same") == "echo: same"
+        assert len(stub_server.requests) == sent
+
+        c.generate_text("same", use_cache=False)
+        assert len(stub_server.requests) > sent
+    finally:
+        c.close()
+
+    # a new process starts with an empty memory tier but keeps the disk tier
+    reopened = LLMResponseCache(tmp_path / "llm.sqlite3", memory_items=8, max_rows=100, ttl=60)
+    key = reopened._conn.execute("SELECT key FROM responses").fetchone()[0]
+    assert reopened.get(key) == "echo: same"
+    assert reopened.stats()["disk_hits"] == 1
+
+
+def test_responses_without_text_are_not_cached(stub_server, tmp_path):
+    cache = LLMResponseCache(tmp_path / "llm.sqlite3", memory_items=8, max_rows=100, ttl=60)
+    c = MistralClient("test-key", f"http://127.0.0.1:{stub_server.server_port}", backoff_base=0.01, http2=False, cache=cache)
+    try:
+        assert c.generate_text("no text") == str({"unexpected": "shape"})
+        sent = len(stub_server.requests)
+        c.generate_text("no text")
+        assert len(stub_server.requests) > sent
+    finally:
+        c.close()
+    assert cache.stats()["disk_entries"] == 0
+
+
+def test_retry_after_pauses_the_shared_scheduler(stub_server):
+    stub_server.fail_next = 1
+    stub_server.retry_headers = {"Retry-After": "0.3"}
+    scheduler = RequestScheduler(rate_per_minute=6000, burst=5)
+    c = MistralClient("test-key", f"http://127.0.0.1:{stub_server.server_port}", backoff_base=5, http2=False, scheduler=scheduler)
+    try:
+        assert c.generate_text("hi") == "echo: hi"
+    finally:
+        c.close()
+    stats = scheduler.stats()
+    assert stats["throttled"] == 1
+    # waited for the server's 0.3s, not the 5s exponential backoff
+    assert 0.25 <= stats["wait_seconds_max"] < 2
+
+
+def test_interactive_lane_is_served_before_background():
+    async def scenario():
+        scheduler = RequestScheduler(rate_per_minute=600, burst=1)
+        await scheduler.acquire()  # drain the bucket
+        order = []
+
+        async def caller(name, priority):
+            await scheduler.acquire(priority)
+            order.append(name)
+
+        background = asyncio.ensure_future(caller("background", BACKGROUND))
+        await asyncio.sleep(0)
+        interactive = asyncio.ensure_future(caller("interactive", INTERACTIVE))
+        await asyncio.gather(background, interactive)
+        return order
+
+    assert asyncio.run(scenario()) == ["interactive", "background"]
+
+
+def test_stream_yields_deltas_retries_before_first_and_caches(stub_server, tmp_path):
+    c = MistralClient(
+        "test-key", f"http://127.0.0.1:{stub_server.server_port}", backoff_base=0.01, http2=False,
+        cache=LLMResponseCache(tmp_path / "llm.sqlite3", memory_items=8, max_rows=100, ttl=60),
+    )
+
+    async def collect():
+        return [d async for d in c.astream_text("stream me")]
+
+    try:
+        stub_server.fail_next = 1
+        deltas = asyncio.run(collect())
+        assert len(deltas) > 1
+        assert "".join(deltas) == "echo: stream me"
+        assert len(stub_server.requests) == 2
+        # deterministic answer is cached and replayed as one delta
+        assert asyncio.run(collect()) == ["echo: stream me"]
+        assert len(stub_server.requests) == 2
+    finally:
+        c.close()
@@ -0,0 +1,51 @@
+# tests/test_ocr.py
+from PIL import Image
+
+from app.services import extraction_service
+from app.utils import ocr_utils
+from tests.test_extraction_pages import make_pdf
+
+
+def test_only_empty_or_garbled_text_layers_need_ocr():
+    assert ocr_utils.needs_ocr("")
+    assert ocr_utils.needs_ocr("  \n ")
+    assert ocr_utils.needs_ocr("(cid:12)(cid:7)(cid:44)(cid:3) (cid:9)(cid:10)(cid:11)")
+    assert not ocr_utils.needs_ocr("A normal page of extracted text, long enough to trust.")
+
+
+def test_ocr_renders_one_page_and_caches_by_image(tmp_path, monkeypatch):
+    rendered, recognized = [], []
+
+    def fake_convert(path, dpi, first_page, last_page, grayscale):
+        rendered.append((first_page, last_page, dpi))
+        return [Image.new("L", (40, 20), color=first_page % 2 * 255)]
+
+    def fake_tesseract(image, lang):
+        recognized.append(image.size)
+        return "scanned words"
+
+    monkeypatch.setattr(ocr_utils, "OCR_CACHE_DIR", tmp_path / "ocr")
+    monkeypatch.setattr(ocr_utils, "convert_from_path", fake_convert)
+    monkeypatch.setattr(ocr_utils.pytesseract, "image_to_string", fake_tesseract)
+
+    assert ocr_utils.ocr_page(tmp_path / "a.pdf", 3, dpi=150) == "scanned words"
+    # page 5 renders identically to page 3: served from the cache
+    assert ocr_utils.ocr_page(tmp_path / "b.pdf", 5, dpi=150) == "scanned words"
+    assert rendered == [(3, 3, 150), (5, 5, 150)]
+    assert len(recognized) == 1
+
+
+def test_mixed_pdf_only_ocrs_pages_without_text(tmp_path, monkeypatch):
+    ocr_calls = []
+
+    def fake_ocr(path, page_number):
+        ocr_calls.append(page_number)
+        return f"ocr text for page {page_number}"
+
+    monkeypatch.setattr(extraction_service, "ocr_page", fake_ocr)
+    body = "This page has a real text layer that is long enough."
+    p = make_pdf(tmp_path / "mixed.pdf", [body, "", body])
+
+    texts = [page.text for page in extraction_service.iter_pages(p, use_cache=False)]
+    assert ocr_calls == [2]
+    assert texts == [body, "ocr text for page 2", body]
@@ -0,0 +1,121 @@
+# tests/test_retention.py
+import asyncio
+import io
+import os
+import time
+
+import pytest
+from fastapi import UploadFile
+
+from app.services import blob_store, storage_service
+from app.services.job_store import JobStore
+from app.services.retention_service import RetentionSweeper
+
+DAY = 24 * 3600
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_service, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(blob_store, "BLOBS_DIR", tmp_path / "_blobs")
+    return tmp_path
+
+
+@pytest.fixture
+def store(upload_dir):
+    return JobStore(upload_dir / "_jobs" / "jobs.sqlite3")
+
+
+def _sweeper(store, upload_dir, **kwargs):
+    options = dict(document_ttl=30 * DAY, fixed_ttl=7 * DAY, job_ttl=30 * DAY, cache_ttl=0, max_bytes=0, pause=0)
+    options.update(kwargs)
+    return RetentionSweeper(store, cache_dir=upload_dir / "_cache" / "ocr", **options)
+
+
+def _upload(name, data, age_days=0.0):
+    saved = asyncio.run(storage_service.save_upload_file(UploadFile(file=io.BytesIO(data), filename=name)))
+    digest = saved["sha256"]
+    if age_days:
+        then = time.time() - age_days * DAY
+        os.utime(blob_store.blob_path(digest), (then, then))
+        os.utime(storage_service.UPLOAD_DIR / saved["doc_id"], (then, then))
+    return saved["doc_id"], digest
+
+
+def test_dry_run_reports_then_sweep_removes_expired_document_and_blob(upload_dir, store):
+    old, old_digest = _upload("old.pdf", b"%PDF-1.4 old", age_days=40)
+    fresh, _ = _upload("fresh.pdf", b"%PDF-1.4 fresh")
+    sweeper = _sweeper(store, upload_dir)
+
+    report = sweeper.sweep(dry_run=True)
+    assert report["documents"] == [old]
+    assert report["deleted"]["documents"] == 1 and report["deleted"]["blobs"] == 1
+    assert report["reclaimed_bytes"] > 0
+    assert (upload_dir / old).exists() and blob_store.has_blob(old_digest)
+
+    report = sweeper.sweep()
+    assert report["deleted"]["documents"] == 1 and report["deleted"]["blobs"] == 1
+    assert not (upload_dir / old).exists()
+    assert not blob_store.has_blob(old_digest)
+    assert storage_service.get_uploaded_file_path(fresh) is not None
+    assert sweeper.stats()["sweeps"] == 1
+
+
+def test_documents_of_active_jobs_are_kept(upload_dir, store):
+    doc_id, digest = _upload("busy.pdf", b"%PDF-1.4 busy", age_days=40)
+    store.enqueue("j1", doc_id, "goal")
+
+    report = _sweeper(store, upload_dir, max_bytes=1).sweep()
+    assert report["protected_active"] == 1
+    assert report["deleted"]["documents"] == 0
+    assert blob_store.has_blob(digest)
+
+
+def test_quota_evicts_least_recently_accessed_first(upload_dir, store):
+    older, _ = _upload("a.pdf", b"%PDF-1.4 " + b"a" * 4000, age_days=2)
+    newer, _ = _upload("b.pdf", b"%PDF-1.4 " + b"b" * 4000, age_days=1)
+    usage = _sweeper(store, upload_dir).sweep(dry_run=True)["usage_bytes"]
+
+    report = _sweeper(store, upload_dir, max_bytes=usage - 1000).sweep()
+    assert report["evicted_for_quota"] == 1
+    assert report["documents"] == [older]
+    assert report["usage_bytes"] <= usage - 1000
+    assert storage_service.get_uploaded_file_path(newer) is not None
+
+
+def test_expired_fixed_output_and_finished_jobs_are_purged(upload_dir, store):
+    doc_id, _ = _upload("doc.pdf", b"%PDF-1.4 doc")
+    storage_service.save_fixed_doc(doc_id, "fixed text")
+    then = time.time() - 10 * DAY
+    os.utime(upload_dir / doc_id, (then, then))
+    store.enqueue("done", doc_id, "goal")
+    store.claim("w")
+    store.finish("done", "w", "completed")
+    time.sleep(0.05)
+
+    report = _sweeper(store, upload_dir, job_ttl=0.01).sweep()
+    assert report["deleted"]["fixed"] == 1 and report["deleted"]["documents"] == 0
+    assert storage_service.get_fixed_file_path(doc_id) is None
+    assert storage_service.get_manifest(doc_id)["fixed"] is None
+    assert report["deleted"]["jobs"] == 1
+    assert store.get_job("done") is None
+
+
+def test_documents_picked_up_after_the_scan_are_kept(upload_dir, store, monkeypatch):
+    queued, queued_digest = _upload("queued.pdf", b"%PDF-1.4 queued", age_days=40)
+    read, _ = _upload("read.pdf", b"%PDF-1.4 read", age_days=40)
+    scanned = store.active_doc_ids
+
+    def active_doc_ids():
+        # both happen after the scan saw the documents as idle and unused
+        active = scanned()
+        store.enqueue("late", queued, "goal")
+        os.utime(upload_dir / read)
+        return active
+
+    monkeypatch.setattr(store, "active_doc_ids", active_doc_ids)
+    report = _sweeper(store, upload_dir).sweep()
+    assert report["deleted"]["documents"] == 0 and report["deleted"]["blobs"] == 0
+    assert report["protected_active"] == 1
+    assert (upload_dir / queued).exists() and (upload_dir / read).exists()
+    assert blob_store.has_blob(queued_digest)
@@ -0,0 +1,132 @@
+# tests/test_rewrite_service.py
+import asyncio
+import time
+
+from app.services import rewrite_service
+
+
+def test_chunks_respect_budget_and_rejoin_to_original():
+    paras = [f"Paragraph {i} has a few sentences. It goes on a bit. Then it stops." for i in range(40)]
+    text = "\n".join(paras)
+    chunks = rewrite_service.split_into_chunks(text, max_tokens=50)
+    assert len(chunks) > 1
+    assert "".join(chunks) == text
+    assert all(len(c) <= 200 for c in chunks)
+
+
+def test_failed_chunk_is_retried_alone_and_order_is_kept(monkeypatch):
+    calls = []
+    failed = set()
+
+    async def fake_generate(prompt, **kwargs):
+        passage = prompt.split("Passage:\n")[-1].split("(no commentary).\n\n")[-1]
+        calls.append(passage)
+        await asyncio.sleep(0.01 * (len(calls) % 3))
+        if passage.startswith("Second") and passage not in failed:
+            failed.add(passage)
+            raise RuntimeError("boom")
+        return passage.upper()
+
+    monkeypatch.setattr(rewrite_service, "agenerate_text", fake_generate)
+    text = "First paragraph is here.\nSecond paragraph is here.\nThird paragraph is here."
+    monkeypatch.setattr(rewrite_service, "split_into_chunks", lambda t: t.splitlines(keepends=True))
+
+    out = asyncio.run(rewrite_service.arewrite_text(text))
+    assert out == text.upper()
+    assert len(calls) == 4
+
+
+def test_rewrite_starts_before_extraction_finishes(monkeypatch):
+    from app.services.extraction_service import _with_offsets
+
+    events = []
+
+    async def fake_generate(prompt, **kwargs):
+        events.append("rewrite")
+        return prompt.split("Passage:\n")[-1].split("(no commentary).\n\n")[-1].upper()
+
+    def slow_pages():
+        for page in _with_offsets([f"Page {n} body." for n in range(1, 4)]):
+            events.append(f"page {page.number}")
+            yield page
+            time.sleep(0.05)
+
+    monkeypatch.setattr(rewrite_service, "agenerate_text", fake_generate)
+    # one page per chunk
+    monkeypatch.setattr(rewrite_service, "split_into_chunks", lambda t: t.splitlines(keepends=True))
+
+    out = asyncio.run(rewrite_service.arewrite_pages(slow_pages()))
+    assert out == "PAGE 1 BODY.\nPAGE 2 BODY.\nPAGE 3 BODY."
+    assert events.index("rewrite") < events.index("page 3")
+
+
+def test_streamed_lines_match_batch_rewrite(monkeypatch):
+    from app.services.extraction_service import _with_offsets
+
+    def passage(prompt):
+        return prompt.split("Passage:\n")[-1].split("(no commentary).\n\n")[-1].upper()
+
+    async def fake_generate(prompt, **kwargs):
+        return passage(prompt).strip()
+
+    async def fake_stream(prompt, **kwargs):
+        text = passage(prompt)
+        for i in range(0, len(text), 4):
+            await asyncio.sleep(0)
+            yield text[i:i + 4]
+
+    monkeypatch.setattr(rewrite_service, "agenerate_text", fake_generate)
+    monkeypatch.setattr(rewrite_service, "astream_text", fake_stream)
+    monkeypatch.setattr(rewrite_service, "split_into_chunks", lambda t: t.splitlines(keepends=True))
+    texts = ["First page line one.\nline two.", "Second page.", "Third page\nwith two lines."]
+
+    async def collect():
+        return [line async for line in rewrite_service.astream_rewrite_pages(_with_offsets(texts))]
+
+    lines = asyncio.run(collect())
+    assert "\n".join(lines) == asyncio.run(rewrite_service.arewrite_pages(_with_offsets(texts)))
+    assert lines[0] == "FIRST PAGE LINE ONE."
+
+
+def test_targeted_rewrite_only_sends_flagged_paragraphs(monkeypatch):
+    prompts = []
+
+    async def fake_generate(prompt, **kwargs):
+        prompts.append(prompt)
+        return prompt.split("Passage:\n")[-1].upper()
+
+    monkeypatch.setattr(rewrite_service, "agenerate_text", fake_generate)
+    monkeypatch.setattr(rewrite_service, "REWRITE_TARGET_CONTEXT_CHARS", 30)
+    paras = [f"Clean paragraph number {i}." for i in range(20)]
+    paras[3] = "  Teh third one."
+    paras[4] = "Teh fourth one."
+    paras[15] = "Teh fifteenth."
+    text = "\n\n".join(paras) + "\n"
+    issues = [{"offset_start": text.index(p) + p.index("Teh"), "offset_end": 0} for p in (paras[3], paras[4], paras[15])]
+    issues.append({"offset_start": None, "offset_end": None})
+
+    assert len(rewrite_service.select_targets(text, issues)) == 2
+    out = asyncio.run(rewrite_service.arewrite_targeted(text, issues))
+
+    expected = list(paras)
+    expected[3] = "  TEH THIRD ONE."
+    expected[4] = "TEH FOURTH ONE."
+    expected[15] = "TEH FIFTEENTH."
+    assert out == "\n\n".join(expected) + "\n"
+    assert len(prompts) == 2
+    # the neighbours are read-only context, not part of the passage
+    assert "number 2." in prompts[0] and "number 5" in prompts[0]
+    assert "Clean" not in prompts[0].split("Passage:\n")[-1]
+
+    async def collect():
+        return [line async for line in rewrite_service.astream_rewrite_targeted(text, issues)]
+
+    assert "\n".join(asyncio.run(collect())) == out
+
+
+def test_targeted_rewrite_without_issues_skips_the_llm(monkeypatch):
+    async def fail(prompt, **kwargs):
+        raise AssertionError("no LLM call expected")
+
+    monkeypatch.setattr(rewrite_service, "agenerate_text", fail)
+    assert asyncio.run(rewrite_service.arewrite_targeted("Already clean.\nNothing to do.", [])) == "Already clean.\nNothing to do."
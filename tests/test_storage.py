@@ -0,0 +1,153 @@
+# tests/test_storage.py
+import asyncio
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.services import blob_store, storage_service
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_service, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(blob_store, "BLOBS_DIR", tmp_path / "_blobs")
+    return tmp_path
+
+
+def _upload(name, data):
+    return UploadFile(file=io.BytesIO(data), filename=name)
+
+
+def _save(upload):
+    return asyncio.run(storage_service.save_upload_file(upload))
+
+
+def test_identical_uploads_share_one_blob(upload_dir):
+    data = b"%PDF-1.4 same bytes"
+    first = _save(_upload("a.pdf", data))
+    second = _save(_upload("b.pdf", data))
+
+    assert first["doc_id"] != second["doc_id"]
+    assert first["sha256"] == second["sha256"]
+    blobs = [p for p in (upload_dir / "_blobs").rglob("*") if p.is_file()]
+    assert len(blobs) == 1
+
+    path = storage_service.get_uploaded_file_path(second["doc_id"])
+    assert path.name == "b.pdf"
+    assert path.read_bytes() == data
+
+
+def test_oversized_upload_rejected_before_fully_read(upload_dir, monkeypatch):
+    monkeypatch.setattr(storage_service, "MAX_FILE_SIZE", 100)
+    monkeypatch.setattr(storage_service, "UPLOAD_CHUNK_SIZE", 10)
+    stream = io.BytesIO(b"%PDF-" + b"x" * 10_000)
+    with pytest.raises(HTTPException) as exc:
+        _save(UploadFile(file=stream, filename="big.pdf"))
+    assert exc.value.status_code == 413
+    assert stream.tell() <= 110
+    assert not any(p.is_file() for p in (upload_dir / "_blobs").rglob("*"))
+
+
+def test_content_must_match_extension(upload_dir):
+    with pytest.raises(HTTPException) as exc:
+        _save(_upload("fake.pdf", b"not a pdf at all"))
+    assert exc.value.status_code == 400
+
+
+def test_manifest_written_at_upload(upload_dir):
+    saved = _save(_upload("My Report.pdf", b"%PDF-1.4 manifest bytes"))
+    manifest = storage_service.get_manifest(saved["doc_id"])
+
+    assert manifest["filename"] == saved["filename"]
+    assert manifest["original_name"] == "My Report.pdf"
+    assert manifest["size"] == len(b"%PDF-1.4 manifest bytes")
+    assert manifest["sha256"] == saved["sha256"]
+    assert manifest["mime_type"] == "application/pdf"
+    # not a parseable PDF: the page count is unknown rather than an error
+    assert manifest["page_count"] is None
+    assert manifest["extracted"].startswith("_blobs/")
+    assert manifest["fixed"] is None
+
+
+def test_lookups_resolve_through_manifest(upload_dir):
+    doc_id = _save(_upload("a.pdf", b"%PDF-1.4 lookup"))["doc_id"]
+    assert storage_service.get_fixed_file_path(doc_id) is None
+
+    out = storage_service.save_fixed_doc(doc_id, "corrected line")
+    assert storage_service.get_manifest(doc_id)["fixed"] == out.name
+    assert storage_service.get_fixed_file_path(doc_id) == out
+    assert storage_service.get_uploaded_file_path(doc_id).name == "a.pdf"
+    assert storage_service.get_manifest("../etc") is None
+    assert storage_service.get_manifest("_blobs") is None
+
+
+def test_legacy_folder_is_backfilled(upload_dir):
+    legacy = upload_dir / "legacy-doc"
+    legacy.mkdir()
+    (legacy / "old.pdf").write_bytes(b"%PDF-1.4 legacy")
+    (legacy / "fixed_legacy-doc.docx").write_bytes(b"PK")
+
+    assert storage_service.backfill_manifests() == 1
+    manifest = storage_service.get_manifest("legacy-doc")
+    assert manifest["filename"] == "old.pdf"
+    assert manifest["fixed"] == "fixed_legacy-doc.docx"
+    assert manifest["extracted"] == "legacy-doc/.extracted.json"
+    assert (legacy / storage_service.MANIFEST_NAME).exists()
+
+
+def test_backfill_waits_for_the_document_lock(upload_dir):
+    legacy = upload_dir / "legacy-doc"
+    legacy.mkdir()
+    (legacy / "old.pdf").write_bytes(b"%PDF-1.4 legacy")
+    started = threading.Event()
+
+    with ThreadPoolExecutor(1) as pool:
+        with storage_service._document_lock("legacy-doc"):
+            pending = pool.submit(lambda: (started.set(), storage_service.get_manifest("legacy-doc"))[1])
+            started.wait()
+            time.sleep(0.1)
+            assert not pending.done()
+            # a backfill inside an update (same thread) does not deadlock on the held lock
+            assert storage_service.update_manifest("legacy-doc", fixed="x.docx")["filename"] == "old.pdf"
+        assert pending.result(timeout=5)["fixed"] == "x.docx"
+
+
+def test_manifest_rewritten_within_one_mtime_tick_is_reread(upload_dir):
+    doc_id = _save(_upload("a.pdf", b"%PDF-1.4 tick"))["doc_id"]
+    target = upload_dir / doc_id / storage_service.MANIFEST_NAME
+    before = target.stat()
+    assert storage_service.get_manifest(doc_id)["fixed"] is None
+
+    # another process swaps in a same-size manifest and the mtime does not move
+    other = json.loads(target.read_text(encoding="utf-8"))
+    other["fixed"] = "ab"  # '"ab"' is as long as 'null'
+    tmp = target.with_name("other.tmp")
+    tmp.write_text(json.dumps(other), encoding="utf-8")
+    os.utime(tmp, ns=(before.st_atime_ns, before.st_mtime_ns))
+    os.replace(tmp, target)
+    assert target.stat().st_size == before.st_size
+
+    assert storage_service.get_manifest(doc_id)["fixed"] == other["fixed"]
+
+
+def test_concurrent_saves_and_deletes_keep_manifest_consistent(upload_dir):
+    doc_id = _save(_upload("a.pdf", b"%PDF-1.4 race"))["doc_id"]
+
+    def churn(i):
+        if i % 2:
+            storage_service.save_fixed_doc(doc_id, f"version {i}")
+        else:
+            storage_service.delete_fixed(doc_id)
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(churn, range(40)))
+
+    fixed = storage_service.get_manifest(doc_id)["fixed"]
+    assert (fixed is None) or (upload_dir / doc_id / fixed).is_file()
+    assert storage_service.get_fixed_file_path(doc_id) == (upload_dir / doc_id / fixed if fixed else None)
@@ -0,0 +1,90 @@
+# tests/test_tracing.py
+from fastapi.testclient import TestClient
+
+from app.services import executors, tracing
+from app.services.llm_cache import LLMResponseCache
+from app.services.mistral_client import MistralClient
+from tests.test_mistral_client import stub_server  # noqa: F401  (fixture)
+
+
+def test_stage_timings_reach_the_collecting_scope_across_threads():
+    pool = executors.StageExecutor("trace-test", "thread", 2)
+
+    def work():
+        with tracing.stage("inner"):
+            return sum(tracing.timed_iter("produce", range(10)))
+
+    try:
+        with tracing.collect() as timings:
+            assert pool.submit(work).result() == 45
+        assert set(timings) == {"inner", "produce"}
+        # outside any scope only the histogram sees it
+        before = tracing.STAGE_SECONDS.count(stage="inner")
+        pool.submit(work).result()
+        assert tracing.STAGE_SECONDS.count(stage="inner") == before + 1
+    finally:
+        pool.shutdown()
+
+
+def test_render_is_prometheus_text():
+    hist = tracing.Histogram("doc_test_seconds", "Test histogram.", ("stage",), buckets=(0.1, 1.0))
+    hist.observe(0.5, stage="a")
+    text = tracing.render({
+        "caches": {"llm": {"hits": 3, "hit_ratio": 0.25}, "disabled": None},
+        "retention": {"reclaimed_bytes_total": 10},
+        "agent_queue": {"completed": 2},
+    })
+    assert "# TYPE doc_test_seconds histogram" in text
+    assert 'doc_test_seconds_bucket{stage="a",le="0.1"} 0' in text
+    assert 'doc_test_seconds_bucket{stage="a",le="1"} 1' in text
+    assert 'doc_test_seconds_bucket{stage="a",le="+Inf"} 1' in text
+    assert 'doc_test_seconds_sum{stage="a"} 0.5' in text
+    assert "doc_caches_llm_hits 3" in text and "doc_caches_llm_hit_ratio 0.25" in text
+    assert "# TYPE doc_caches_llm_hits counter" in text and "# TYPE doc_caches_llm_hit_ratio gauge" in text
+    assert "# TYPE doc_retention_reclaimed_bytes_total counter" in text
+    assert "# TYPE doc_agent_queue_completed gauge" in text  # row count; shrinks when jobs are purged
+    assert tracing.server_timing({"extract": 0.0123, "total": 1}) == "extract;dur=12.3, total;dur=1000.0"
+
+
+def test_mistral_fallback_and_retries_are_counted(stub_server):  # noqa: F811
+    c = MistralClient("test-key", f"http://127.0.0.1:{stub_server.server_port}", backoff_base=0.01, http2=False)
+    fallbacks = tracing.MISTRAL_FALLBACKS.value()
+    retries = tracing.MISTRAL_RETRIES.value(endpoint="chat/completions", reason=429)
+    try:
+        stub_server.fail_next = 1
+        with tracing.collect() as timings:
+            c.generate_text("hello", model="m")
+    finally:
+        c.close()
+    assert tracing.MISTRAL_FALLBACKS.value() == fallbacks + 1
+    assert tracing.MISTRAL_RETRIES.value(endpoint="chat/completions", reason=429) == retries + 1
+    assert "mistral" in timings
+
+
+def test_llm_cache_hits_are_not_timed_as_mistral_calls(stub_server, tmp_path):  # noqa: F811
+    c = MistralClient(
+        "test-key", f"http://127.0.0.1:{stub_server.server_port}", backoff_base=0.01, http2=False,
+        cache=LLMResponseCache(tmp_path / "llm.sqlite3", memory_items=8, max_rows=100, ttl=60),
+    )
+    try:
+        c.generate_text("hello", model="m")
+        with tracing.collect() as timings:
+            c.generate_text("hello", model="m")
+    finally:
+        c.close()
+    assert "mistral" not in timings
+
+
+def test_metrics_endpoint_and_server_timing(monkeypatch):
+    import app.main
+
+    monkeypatch.setattr(app.main, "SERVER_TIMING", True)
+    client = TestClient(app.main.app)
+    r = client.get("/health/")
+    assert "total;dur=" in r.headers["server-timing"]
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    assert 'doc_http_request_seconds_count{method="GET",route="/health/",status="200"}' in r.text
+    assert "doc_executors_io_max_workers" in r.text